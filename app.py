@@ -1,14 +1,26 @@
-from flask import Flask, request, jsonify, render_template
-import joblib
+from flask import Flask, Response, g, request, jsonify, render_template
 import os
 import logging
 from dotenv import load_dotenv
 from flask_restx import Api, Resource, fields
-import pandas as pd
-import json
-import matplotlib.pyplot as plt
-import io
-import base64
+import numpy as np
+import threading
+import time
+from datetime import datetime
+from batching import MicroBatcher
+from prediction_labels import label_predictions, model_threshold
+from prediction_cache import PredictionCache
+from model_manager import ModelManager
+from model_registry import DEFAULT_CACHE_SIZE, ModelCache, ModelRegistry
+from hashing import file_fingerprint
+from prediction_stats import compute_prediction_range, load_model_metadata
+from dashboard_utils import (load_metrics, load_model_comparison, render_metrics_plot, tail_prediction_records,
+                             metrics_timeseries)
+from audit_log import PredictionAuditLog
+from metrics_store import MetricsStore
+from metrics import MetricsRegistry
+from profiler import SamplingProfiler
+from auth import AdmissionController, require_api_key
 
 load_dotenv()
 
@@ -25,21 +37,176 @@ api = Api(app, version='1.0', title='Screen Time Wellness API',
           doc='/api/docs',
           prefix='/api')  # Add this line to restrict API routes to /api
 
+# Behind TRUSTED_PROXIES reverse proxies, request.remote_addr is taken from X-Forwarded-For, so
+# anonymous clients are rate limited by their own address instead of sharing the proxy's
+TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES > 0:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
+# Model feature columns, in training order
+FEATURE_COLUMNS = ['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']
+
+# Upper bound on points per series returned by /api/monitoring/timeseries
+MAX_TIMESERIES_POINTS = 5000
+
+# Batch prediction settings
+MAX_BATCH_ROWS = int(os.getenv('MAX_BATCH_ROWS', 10000))
+
+# Input fields in model feature order, with the same ranges Predict.post enforces
+BATCH_INPUT_FIELDS = ['notifications', 'times_opened', 'day_of_week', 'month']
+BATCH_INPUT_RANGES = [
+    ('day_of_week', 0, 6),
+    ('month', 1, 12),
+    ('notifications', 0, 100),
+    ('times_opened', 0, 50),
+]
+
 # Create models directory if it doesn't exist
 os.makedirs(os.path.join(BASE_DIR, 'models'), exist_ok=True)
 
-# Load model with error handling
+# Load model with error handling; the manager hot-swaps it when the file changes
+model_path = os.getenv('MODEL_PATH', os.path.join(BASE_DIR, 'models', 'model.pkl'))
+# The current model is the registry's production version; models/model.pkl is the fallback before
+# anything has been registered, and an explicit MODEL_PATH always wins
+REGISTRY_PATH = os.path.join(BASE_DIR, 'models', 'registry.json')
+model_registry = ModelRegistry(REGISTRY_PATH, os.path.join(BASE_DIR, 'models', 'versions'))
+MODEL_METADATA_PATH = os.path.join(BASE_DIR, 'models', 'model_meta.json')
+DATA_PATH = os.path.join(BASE_DIR, 'data', 'processed_data.csv')
+# Partitioned output of generate_predictions.py, with the single CSV of older runs as a fallback
+PREDICTIONS_DIR = os.path.join(BASE_DIR, 'data', 'predictions')
+PREDICTIONS_PATH = os.path.join(BASE_DIR, 'data', 'predictions.csv')
+# Written by scripts/compare_models.py
+COMPARISON_PATH = os.path.join(BASE_DIR, 'models', 'model_comparison.json')
+METRICS_PATH = os.path.join(BASE_DIR, 'monitoring', 'model_metrics.jsonl')
+# Most recent monitoring runs shown in the dashboard chart
+DASHBOARD_PLOT_POINTS = int(os.getenv('DASHBOARD_PLOT_POINTS', 100))
+metrics_store = MetricsStore(METRICS_PATH)
 try:
-    model_path = os.path.join(BASE_DIR, 'models', 'model.pkl')
-    if os.path.exists(model_path):
-        model = joblib.load(model_path)
-        logger.info("Model loaded successfully")
-    else:
-        logger.error(f"Model file not found at {model_path}")
-        model = None
+    metrics_store.migrate_json(os.path.join(BASE_DIR, 'monitoring', 'model_metrics.json'))
 except Exception as e:
-    logger.error(f"Error loading model: {str(e)}")
-    model = None
+    logger.error(f"Error migrating monitoring history: {str(e)}")
+COMPILED_INFERENCE = os.getenv('COMPILED_INFERENCE', 'true').lower() in ('1', 'true', 'yes')
+model_manager = ModelManager(model_path, compile_model=COMPILED_INFERENCE,
+                             resolve_path=None if 'MODEL_PATH' in os.environ
+                             else lambda: model_registry.production_path() or model_path)
+if model_manager.reload():
+    logger.info("Model loaded successfully")
+model_manager.start_watcher(float(os.getenv('MODEL_WATCH_INTERVAL', 5)))
+
+def _load_registered_version(path, entry):
+    # Loaded like the serving model: compiled arrays, bundled feature transform, warmed up
+    manager = ModelManager(path, compile_model=COMPILED_INFERENCE, warmup_rounds=1)
+    if not manager.reload():
+        raise RuntimeError(manager.last_error or f"Could not load {path}")
+    return manager.current
+
+# Other registered versions requested with ?version=, loaded on first use and kept in a small LRU
+version_cache = ModelCache(model_registry, max_models=int(os.getenv('MODEL_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+                           loader=_load_registered_version)
+
+def predict_features(X, active=None):
+    """Predict a (n_rows, 5) feature matrix with `active` or the current model (compiled engine when available)"""
+    active = active or model_manager.current
+    return active.predict(X)
+
+# Optional micro-batching of concurrent single-row predictions
+if os.getenv('MICRO_BATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+    batcher = MicroBatcher(predict_features,
+                           max_batch_size=int(os.getenv('MICRO_BATCH_MAX_SIZE', 32)),
+                           max_wait_ms=float(os.getenv('MICRO_BATCH_WAIT_MS', 2)))
+    logger.info(f"Micro-batching enabled (max {batcher.max_batch_size} rows, {batcher.max_wait * 1000:.1f} ms window)")
+else:
+    batcher = None
+
+# Cache of single-row predictions, keyed on the model version and dropped when a new model is swapped in
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 10000))
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(max_size=PREDICTION_CACHE_SIZE,
+                                       ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', 3600)))
+else:
+    prediction_cache = None
+
+def prewarm_prediction_cache(data_path=DATA_PATH):
+    """Fill the prediction cache with the distinct historical feature rows, scored in one batch"""
+    from feature_store import load_features
+
+    active = model_manager.current
+    if prediction_cache is None or active is None or not os.path.exists(data_path):
+        return 0
+    X = load_features(data_path).X
+    # First occurrence of each distinct row, in dataset order
+    _, first = np.unique(X, axis=0, return_index=True)
+    rows = X[np.sort(first)[:prediction_cache.max_size]].astype(np.float64)
+    prediction_cache.put_many(active.version, rows, predict_features(rows, active))
+    logger.info(f"Pre-warmed prediction cache with {len(rows)} rows from {data_path}")
+    return len(rows)
+
+def _on_model_swap(new, old):
+    # Entries are keyed on the model version, so old ones would only waste space
+    if prediction_cache is not None and old is not None:
+        prediction_cache.clear()
+
+model_manager.add_listener(_on_model_swap)
+
+if os.getenv('PREDICTION_CACHE_PREWARM', 'false').lower() in ('1', 'true', 'yes'):
+    try:
+        prewarm_prediction_cache()
+    except Exception as e:
+        logger.error(f"Error pre-warming prediction cache: {str(e)}")
+
+# Asynchronous audit log of every prediction, the input for drift checks in monitoring.py
+AUDIT_LOG_PATH = os.getenv('AUDIT_LOG_PATH', os.path.join(BASE_DIR, 'monitoring', 'prediction_log.jsonl'))
+if os.getenv('AUDIT_LOG_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+    audit_log = PredictionAuditLog(AUDIT_LOG_PATH,
+                                   capacity=int(os.getenv('AUDIT_LOG_CAPACITY', 10000)),
+                                   max_rows=int(os.getenv('AUDIT_LOG_MAX_ROWS', 100000)),
+                                   max_bytes=int(os.getenv('AUDIT_LOG_MAX_BYTES', 50 * 1024 * 1024)),
+                                   backup_count=int(os.getenv('AUDIT_LOG_BACKUPS', 5)))
+else:
+    audit_log = None
+
+# Request and per-stage latency metrics, served in the Prometheus text format at /api/metrics;
+# under gunicorn every worker shares its totals through METRICS_DIR
+metrics = MetricsRegistry(enabled=os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+                          shared_dir=os.getenv('METRICS_DIR') or None)
+
+# Per-client rate limits and a global in-flight cap for the prediction routes
+admission = AdmissionController.from_env()
+admission.listener = lambda endpoint, outcome: metrics.inc('app_admission_total', endpoint=endpoint, outcome=outcome)
+
+# Sampling profiler, toggled at runtime through /api/admin/profiler
+profiler = SamplingProfiler(interval=float(os.getenv('PROFILER_INTERVAL_MS', 5)) / 1000)
+if os.getenv('PROFILER_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+    profiler.start()
+
+def stage_timer(route):
+    """Per-stage timer for the current request; the final 'serialize' stage is recorded in after_request"""
+    timer = metrics.timer(route)
+    if metrics.enabled:
+        g.stage_timer = timer
+    return timer
+
+@app.before_request
+def _start_request_timer():
+    if metrics.enabled:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        timer = g.pop('stage_timer', None)
+        if timer is not None:
+            timer.mark('serialize')
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.record_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+# Prediction range per (model version, dataset fingerprint), see get_model_prediction_range
+_range_cache = {}
+_range_lock = threading.Lock()
 
 # Define namespaces
 ns = api.namespace('', description='Wellness predictions')
@@ -57,6 +224,31 @@ prediction_output = api.model('PredictionOutput', {
     'notification': fields.String(description='Wellness recommendation')
 })
 
+batch_prediction_input = api.model('BatchPredictionInput', {
+    'instances': fields.List(fields.Nested(prediction_input),
+                             description='Row-oriented input: a list of prediction inputs'),
+    'columns': fields.Raw(description='Column-oriented input: {"notifications": [...], "times_opened": [...], '
+                                      '"day_of_week": [...], "month": [...]}')
+})
+
+batch_prediction_row = api.model('BatchPredictionRow', {
+    'predicted_usage_minutes': fields.Float(description='Predicted usage time in minutes'),
+    'notification': fields.String(description='Wellness recommendation')
+})
+
+batch_prediction_error = api.model('BatchPredictionError', {
+    'index': fields.Integer(description='Position of the rejected row in the request'),
+    'error': fields.String(description='Validation error for the row')
+})
+
+batch_prediction_output = api.model('BatchPredictionOutput', {
+    'predictions': fields.List(fields.Nested(batch_prediction_row, allow_null=True),
+                               description='One entry per input row, null for rejected rows'),
+    'errors': fields.List(fields.Nested(batch_prediction_error)),
+    'count': fields.Integer(description='Number of input rows'),
+    'valid': fields.Integer(description='Number of rows that were scored')
+})
+
 error_model = api.model('ErrorModel', {
     'error': fields.String(description='Error message')
 })
@@ -68,8 +260,9 @@ class Health(Resource):
     @api.response(503, 'Service Unavailable', error_model)
     def get(self):
         """Health check endpoint"""
-        if model is not None:
-            return {"status": "healthy", "model_loaded": True}
+        active = model_manager.current
+        if active is not None:
+            return {"status": "healthy", "model_loaded": True, "model": active.info()}
         else:
             return {"status": "unhealthy", "model_loaded": False}, 503
 
@@ -79,10 +272,16 @@ class Predict(Resource):
     @api.expect(prediction_input)
     @api.response(200, 'Success', prediction_output)
     @api.response(400, 'Validation Error', error_model)
-    @api.response(503, 'Model Not Loaded', error_model)
+    @api.response(401, 'Unauthorized', error_model)
+    @api.response(429, 'Rate Limit Exceeded', error_model)
+    @api.response(503, 'Model Not Loaded or Overloaded', error_model)
+    @admission.admit('predict')
     def post(self):
         """Prediction endpoint"""
-        if model is None:
+        started = time.perf_counter()
+        timer = stage_timer('predict')
+        active = model_manager.current
+        if active is None:
             return {"error": "Model not loaded. Please train the model first."}, 503
         
         try:
@@ -90,6 +289,7 @@ class Predict(Resource):
             data = request.json
             if not data:
                 return {"error": "No data provided"}, 400
+            timer.mark('parse')
             
             # Extract and validate features
             notifications = float(data['notifications'])
@@ -105,15 +305,39 @@ class Predict(Resource):
                 return {"error": "notifications must be between 0 and 100"}, 400
             if not (0 <= times_opened <= 50):
                 return {"error": "times_opened must be between 0 and 50"}, 400
+            timer.mark('validate')
             
-            # Make prediction
-            notifications_x_times_opened = notifications * times_opened
-            X = [[notifications, times_opened, day_of_week, month, notifications_x_times_opened]]
-            prediction = model.predict(X)[0]
-            threshold = float(os.getenv('MODEL_THRESHOLD', 60))
-            notification = "Take a break!" if prediction > threshold else "All good!"
+            # Scale and build the interaction with the transform bundled with the model. The trees
+            # compare float32 values, so rounding to float32 changes no prediction and makes the
+            # cache key match rows pre-warmed from the float32 feature store
+            row = active.features([[notifications, times_opened, day_of_week, month]])[0].astype(np.float32)
+            timer.mark('features')
+            prediction = prediction_cache.get(active.version, row) if prediction_cache is not None else None
+            if prediction is None:
+                if batcher is not None:
+                    # Scored by the snapshot the row's features were built with, even if a new model is swapped in
+                    prediction = batcher.predict(row, model=active)
+                else:
+                    prediction = predict_features([row], active)[0]
+                if prediction_cache is not None:
+                    prediction_cache.put(active.version, row, prediction)
+            timer.mark('predict')
+            notification = "Take a break!" if prediction > model_threshold() else "All good!"
+
+            if audit_log is not None:
+                audit_log.record({
+                    "timestamp": datetime.now().isoformat(timespec='milliseconds'),
+                    "endpoint": "predict",
+                    "model_version": active.version,
+                    "inputs": {"notifications": notifications, "times_opened": times_opened,
+                               "day_of_week": day_of_week, "month": month},
+                    "features": row.tolist(),
+                    "prediction": prediction,
+                    "latency_ms": (time.perf_counter() - started) * 1000,
+                })
             
             logger.info(f"Prediction successful: {prediction} minutes")
+            timer.mark('postprocess')
             return {
                 "predicted_usage_minutes": round(prediction, 2),
                 "notification": notification
@@ -126,102 +350,412 @@ class Predict(Resource):
             logger.error(f"Prediction error: {str(e)}")
             return {"error": "Failed to make prediction"}, 500
 
+@ns.route('/predict/batch')
+class PredictBatch(Resource):
+    @api.doc(description='Score many rows with a single model call. Accepts a JSON array of inputs, '
+                         '{"instances": [...]} or the columnar form {"columns": {...}}',
+             params={'version': 'Score with this registered model version instead of the production one'})
+    @api.expect(batch_prediction_input)
+    @api.response(200, 'Success', batch_prediction_output)
+    @api.response(400, 'Validation Error', error_model)
+    @api.response(404, 'Unknown Version', error_model)
+    @api.response(413, 'Batch Too Large', error_model)
+    @api.response(401, 'Unauthorized', error_model)
+    @api.response(429, 'Rate Limit Exceeded', error_model)
+    @api.response(503, 'Model Not Loaded or Overloaded', error_model)
+    @admission.admit('predict/batch')
+    def post(self):
+        """Batch prediction endpoint"""
+        started = time.perf_counter()
+        timer = stage_timer('predict/batch')
+        active = model_manager.current
+        version = request.args.get('version')
+        if version:
+            entry = model_registry.get(version)
+            if entry is None:
+                return {"error": f"Unknown model version {version}"}, 404
+            if active is None or entry['sha256'] != active.sha256:
+                try:
+                    active = version_cache.get(version)
+                except Exception as e:
+                    logger.error(f"Error loading model version {version}: {str(e)}")
+                    return {"error": f"Could not load model version {version}"}, 503
+        if active is None:
+            return {"error": "Model not loaded. Please train the model first."}, 503
+
+        try:
+            columns = parse_batch_request(request.get_json(silent=True))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        timer.mark('parse')
+
+        n_rows = len(columns['notifications'])
+        if n_rows > MAX_BATCH_ROWS:
+            return {"error": f"Batch size {n_rows} exceeds the limit of {MAX_BATCH_ROWS} rows"}, 413
+
+        try:
+            raw, valid, errors = validate_batch(columns)
+            predictions = [None] * n_rows
+            timer.mark('validate')
+
+            if valid.any():
+                X = active.features(raw[valid])
+                y = predict_features(X, active)
+                timer.mark('predict')
+                notifications = label_predictions(y, model_threshold())
+                rounded = np.round(y, 2)
+                for row, value, notification in zip(np.flatnonzero(valid).tolist(), rounded.tolist(),
+                                                     notifications.tolist()):
+                    predictions[row] = {
+                        "predicted_usage_minutes": value,
+                        "notification": notification
+                    }
+
+                if audit_log is not None:
+                    # One entry per request; the writer thread converts the arrays to JSON
+                    audit_log.record({
+                        "timestamp": datetime.now().isoformat(timespec='milliseconds'),
+                        "endpoint": "predict/batch",
+                        "model_version": active.version,
+                        "rows": X,
+                        "predictions": y,
+                        "latency_ms": (time.perf_counter() - started) * 1000,
+                    })
+
+            n_valid = int(valid.sum())
+            logger.info(f"Batch prediction successful: {n_valid}/{n_rows} rows scored")
+            timer.mark('postprocess')
+            return {
+                "predictions": predictions,
+                "errors": errors,
+                "count": n_rows,
+                "valid": n_valid
+            }
+
+        except Exception as e:
+            logger.error(f"Batch prediction error: {str(e)}")
+            return {"error": "Failed to make batch prediction"}, 500
+
+@ns.route('/models')
+class Models(Resource):
+    @api.doc(description='Registered model versions and their metadata, read from the registry index '
+                         'without loading any model')
+    @api.response(200, 'Success')
+    def get(self):
+        """List model versions"""
+        production = model_registry.production()
+        return {
+            "production": production['version'] if production is not None else None,
+            "versions": model_registry.list_versions(),
+            "loaded_versions": version_cache.stats(),
+        }
+
+@ns.route('/models/<string:version>')
+class ModelVersion(Resource):
+    @api.doc(description='Metadata of one registered model version')
+    @api.response(200, 'Success')
+    @api.response(404, 'Unknown Version', error_model)
+    def get(self, version):
+        """Get a model version"""
+        entry = model_registry.get(version)
+        if entry is None:
+            return {"error": f"Unknown model version {version}"}, 404
+        return entry
+
+@ns.route('/predict/batcher-stats')
+class BatcherStats(Resource):
+    @api.doc(description='Queue depth and batch-size statistics of the single-row micro-batcher')
+    @api.response(200, 'Success')
+    def get(self):
+        """Micro-batcher statistics"""
+        if batcher is None:
+            return {"enabled": False}
+        return batcher.stats()
+
+@ns.route('/cache')
+class CacheStats(Resource):
+    @api.doc(description='Prediction cache hit/miss/eviction counters')
+    @api.response(200, 'Success')
+    def get(self):
+        """Prediction cache statistics"""
+        if prediction_cache is None:
+            return {"enabled": False}
+        return prediction_cache.stats()
+
+    @api.doc(description='Drop all cached predictions', security='apikey')
+    @api.response(200, 'Success')
+    @api.response(401, 'Unauthorized', error_model)
+    @require_api_key
+    def delete(self):
+        """Clear the prediction cache"""
+        if prediction_cache is not None:
+            prediction_cache.clear()
+        return {"cleared": prediction_cache is not None}
+
+@ns.route('/admin/reload')
+class ReloadModel(Resource):
+    @api.doc(description='Load the current model (the registry\'s production version, or models/model.pkl) if it '
+                         'changed (or always with ?force=true), warm it up and swap it in without dropping requests',
+             security='apikey')
+    @api.response(200, 'Success')
+    @api.response(401, 'Unauthorized', error_model)
+    @require_api_key
+    def post(self):
+        """Hot-reload the model"""
+        force = request.args.get('force', 'false').lower() in ('1', 'true', 'yes')
+        reloaded = model_manager.reload(force=force)
+        return {"reloaded": reloaded, **model_manager.status()}
+
+@ns.route('/monitoring/timeseries')
+class MetricsTimeseries(Resource):
+    @api.doc(description='Monitoring metric history, downsampled server-side with LTTB',
+             params={'metrics': 'Comma-separated metric names (default: mae,r2)',
+                     'points': f'Maximum points per series (default 500, at most {MAX_TIMESERIES_POINTS})',
+                     'start': 'Earliest timestamp to include, e.g. 2025-03-01 00:00:00',
+                     'end': 'Latest timestamp to include'})
+    @api.response(200, 'Success')
+    @api.response(400, 'Validation Error', error_model)
+    def get(self):
+        """Metric time series for client-side charts"""
+        try:
+            points = int(request.args.get('points', 500))
+        except ValueError:
+            return {"error": "points must be an integer"}, 400
+        points = max(3, min(points, MAX_TIMESERIES_POINTS))
+        names = [name.strip() for name in request.args.get('metrics', 'mae,r2').split(',') if name.strip()]
+        start, end = request.args.get('start'), request.args.get('end')
+        if start or end:
+            # Range queries seek through the store's index instead of loading the full history
+            history = metrics_store.read(start=start, end=end)
+        else:
+            history = load_metrics(METRICS_PATH)
+        return metrics_timeseries(history, names, points)
+
+@ns.route('/admission')
+class AdmissionStats(Resource):
+    @api.doc(description='Admitted and rejected request counts per endpoint, in-flight requests and queue state')
+    @api.response(200, 'Success')
+    def get(self):
+        """Admission control statistics"""
+        return admission.stats()
+
+@ns.route('/audit-log')
+class AuditLogStats(Resource):
+    @api.doc(description='Prediction audit log buffer and writer statistics')
+    @api.response(200, 'Success')
+    def get(self):
+        """Audit log statistics"""
+        if audit_log is None:
+            return {"enabled": False}
+        return audit_log.stats()
+
 @ns.route('/model-range')
 class ModelRange(Resource):
-    @api.doc(description='Get the model prediction range (min, max, avg)')
+    @api.doc(description='Get the model prediction range (min, max, avg and percentiles)')
     @api.response(200, 'Success')
     @api.response(503, 'Model Not Loaded', error_model)
     def get(self):
         """Get model prediction range"""
-        if model is None:
+        active = model_manager.current
+        if active is None:
             return {"error": "Model not loaded. Please train the model first."}, 503
         
         try:
-            range_data = get_model_prediction_range()
+            timer = stage_timer('model-range')
+            range_data = get_model_prediction_range(active)
+            timer.mark('compute')
             return range_data
         
         except Exception as e:
             logger.error(f"Error getting model range: {str(e)}")
             return {"error": "Failed to get model range"}, 500
 
-def get_model_prediction_range():
-    """Calculate the min and max possible predictions from the model"""
+def parse_batch_request(payload):
+    """Normalize a row- or column-oriented batch payload into one list per input field"""
+    if isinstance(payload, dict) and 'columns' in payload:
+        columns = payload['columns']
+        if not isinstance(columns, dict):
+            raise ValueError("'columns' must be an object mapping field names to lists")
+        missing = [name for name in BATCH_INPUT_FIELDS if name not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        if not all(isinstance(columns[name], list) for name in BATCH_INPUT_FIELDS):
+            raise ValueError("Every column must be a list")
+        lengths = {len(columns[name]) for name in BATCH_INPUT_FIELDS}
+        if len(lengths) != 1:
+            raise ValueError("All columns must have the same length")
+        return {name: columns[name] for name in BATCH_INPUT_FIELDS}
+
+    rows = payload.get('instances') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of inputs, {'instances': [...]} or {'columns': {...}}")
+    if not rows:
+        raise ValueError("No data provided")
+
+    return {name: [row.get(name) if isinstance(row, dict) else None for row in rows]
+            for name in BATCH_INPUT_FIELDS}
+
+def _to_float_array(values):
+    """Convert a list of JSON values to float64, using NaN for missing or non-numeric entries"""
     try:
-        # Load data to understand feature ranges
-        data = pd.read_csv('data/processed_data.csv')
-        
-        # Make predictions with the model
-        X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
-        predictions = model.predict(X)
-        
-        return {
-            "min": float(round(predictions.min(), 2)),
-            "max": float(round(predictions.max(), 2)),
-            "avg": float(round(predictions.mean(), 2))
-        }
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        converted = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                converted[i] = float(value)
+            except (TypeError, ValueError):
+                converted[i] = np.nan
+        return converted
+
+def validate_batch(columns):
+    """Validate a batch with NumPy masks and stack the raw inputs the feature transform expects
+
+    Returns the (n_rows, 4) raw input matrix, a boolean mask of valid rows and a
+    list of {"index", "error"} dicts for the rejected rows. The checks and
+    messages mirror Predict.post, and the first failing check wins.
+    """
+    values = {name: _to_float_array(columns[name]) for name in BATCH_INPUT_FIELDS}
+    # int() truncates in Predict.post, so do the same for the integer fields
+    values['day_of_week'] = np.trunc(values['day_of_week'])
+    values['month'] = np.trunc(values['month'])
+
+    checks = []
+    for name in BATCH_INPUT_FIELDS:
+        checks.append((np.isnan(values[name]), f"Invalid input data: {name} is missing or not a number"))
+    for name, low, high in BATCH_INPUT_RANGES:
+        column = values[name]
+        with np.errstate(invalid='ignore'):
+            checks.append(((column < low) | (column > high), f"{name} must be between {low} and {high}"))
+
+    # Record the index (1-based) of the first failing check per row, 0 means valid
+    n_rows = len(values['notifications'])
+    error_codes = np.zeros(n_rows, dtype=np.int16)
+    for code, (failed, _) in reversed(list(enumerate(checks, start=1))):
+        error_codes[failed] = code
+    valid = error_codes == 0
+
+    errors = [{"index": int(i), "error": checks[error_codes[i] - 1][1]} for i in np.flatnonzero(~valid)]
+
+    raw = np.column_stack([
+        values['notifications'],
+        values['times_opened'],
+        values['day_of_week'],
+        values['month'],
+    ])
+    return raw, valid, errors
+
+def get_model_prediction_range(active=None):
+    """Calculate the min and max possible predictions from the model
+
+    The range is computed once per (model, dataset) fingerprint: it comes from
+    the metadata train.py stores next to the model when that metadata matches
+    the served model and dataset, otherwise the dataset is scored chunk by chunk.
+    """
+    active = active or model_manager.current
+    try:
+        dataset_fingerprint = file_fingerprint(DATA_PATH)
+        key = (active.version, dataset_fingerprint)
+        range_data = _range_cache.get(key)
+        if range_data is not None:
+            return range_data
+
+        with _range_lock:
+            range_data = _range_cache.get(key)
+            if range_data is not None:
+                return range_data
+
+            stored = load_model_metadata(MODEL_METADATA_PATH)
+            stored_range = stored.get('prediction_range') or {}
+            if (active.sha256 is not None and stored.get('model_sha256') == active.sha256
+                    and stored_range.get('dataset_fingerprint') == dataset_fingerprint):
+                range_data = {k: v for k, v in stored_range.items() if k not in ('dataset_path', 'dataset_fingerprint')}
+                range_data['source'] = 'metadata'
+            else:
+                range_data = compute_prediction_range(lambda X: predict_features(X, active), DATA_PATH)
+                range_data['source'] = 'computed'
+
+            # Only the latest (model, dataset) pair is ever requested again
+            _range_cache.clear()
+            _range_cache[key] = range_data
+            return range_data
     except Exception as e:
         logger.error(f"Error calculating prediction range: {str(e)}")
         return {"min": 0, "max": 0, "avg": 0}
 
+@ns.route('/admin/profiler')
+class Profiler(Resource):
+    @api.doc(description='Sampling profiler status and the most frequent stacks '
+                         '(?format=collapsed returns all stacks for flame graph tools)', security='apikey')
+    @api.response(200, 'Success')
+    @api.response(401, 'Unauthorized', error_model)
+    @require_api_key
+    def get(self):
+        """Sampling profiler results"""
+        if request.args.get('format') == 'collapsed':
+            return Response(profiler.collapsed(), mimetype='text/plain')
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return {"error": "limit must be an integer"}, 400
+        return profiler.stats(limit)
+
+    @api.doc(description='Start or stop the sampling profiler: {"enabled": true, "interval_ms": 5, "reset": false}',
+             security='apikey')
+    @api.response(200, 'Success')
+    @api.response(400, 'Validation Error', error_model)
+    @api.response(401, 'Unauthorized', error_model)
+    @require_api_key
+    def post(self):
+        """Toggle the sampling profiler"""
+        data = request.get_json(silent=True) or {}
+        try:
+            interval_ms = float(data['interval_ms']) if 'interval_ms' in data else None
+        except (TypeError, ValueError):
+            return {"error": "interval_ms must be a number"}, 400
+        if interval_ms is not None and interval_ms <= 0:
+            return {"error": "interval_ms must be positive"}, 400
+        if data.get('reset'):
+            profiler.reset()
+        if data.get('enabled', True):
+            profiler.start(interval_ms / 1000 if interval_ms is not None else None)
+        else:
+            profiler.stop()
+        return profiler.stats(limit=0)
+
+# Prometheus scrapes plain text, so this is a Flask route rather than a JSON resource
+@app.route('/api/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # ======= DASHBOARD ROUTES (Integrated from dashboard.py) =======
 
 
 @app.route('/')
 def dashboard():
-    # Load monitoring data
-    metrics = []
-    if os.path.exists('monitoring/model_metrics.json'):
-        with open('monitoring/model_metrics.json', 'r') as f:
-            metrics = json.load(f)
-    
-    # Generate metrics plot
-    plot_url = None
-    if metrics:
-        df = pd.DataFrame(metrics)
-        
-        # Create figure with two subplots (separate graphs for each metric)
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
-        
-        # Plot MAE
-        ax1.plot(df['timestamp'], df['mae'], marker='o', color='blue', linewidth=2)
-        ax1.set_title('Mean Absolute Error Over Time')
-        ax1.set_ylabel('MAE')
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        
-        # Add value labels
-        for i, v in enumerate(df['mae']):
-            ax1.text(i, v, f"{v:.3f}", ha='center', va='bottom', fontweight='bold')
-        
-        # Plot R²
-        ax2.plot(df['timestamp'], df['r2'], marker='o', color='green', linewidth=2)
-        ax2.set_title('R² Score Over Time')
-        ax2.set_ylabel('R²')
-        ax2.set_xlabel('Timestamp')
-        ax2.grid(True, linestyle='--', alpha=0.7)
-        ax2.set_ylim(0, 1.0)  # R² is typically between 0 and 1
-        
-        # Add value labels
-        for i, v in enumerate(df['r2']):
-            ax2.text(i, v, f"{v:.3f}", ha='center', va='bottom', fontweight='bold')
-        
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Convert plot to base64 string
-        img = io.BytesIO()
-        plt.savefig(img, format='png')
-        img.seek(0)
-        plot_url = base64.b64encode(img.getvalue()).decode()
+    timer = stage_timer('dashboard')
+    # Load monitoring data and the chart, both cached until the metrics file changes
+    metrics_history = load_metrics(METRICS_PATH, limit=DASHBOARD_PLOT_POINTS)
+    timer.mark('load_metrics')
+    plot_url = render_metrics_plot(METRICS_PATH, limit=DASHBOARD_PLOT_POINTS) if metrics_history else None
+    timer.mark('render_plot')
     
-    # Load recent predictions if available
+    # Load recent predictions if available, reading only the end of the file
     predictions = None
-    if os.path.exists('data/predictions.csv'):
-        predictions = pd.read_csv('data/predictions.csv').tail(10).to_dict('records')
+    for path in (PREDICTIONS_DIR, PREDICTIONS_PATH):
+        if os.path.exists(path):
+            predictions = tail_prediction_records(path, 10)
+            break
+    timer.mark('read_predictions')
+    comparison = load_model_comparison(COMPARISON_PATH)
     
-    return render_template('index.html', 
-                          metrics=metrics, 
-                          plot_url=plot_url,
-                          predictions=predictions)
+    html = render_template('index.html', 
+                           metrics=metrics_history, 
+                           plot_url=plot_url,
+                           predictions=predictions,
+                           comparison=comparison)
+    timer.mark('render_template')
+    return html
 
 # Add a menu route to navigate between dashboard and API docs
 @app.route('/menu')
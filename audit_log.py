@@ -0,0 +1,229 @@
+import os
+import json
+import atexit
+import threading
+import logging
+from collections import deque
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is only safe with a single writer process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class PredictionAuditLog:
+    """Buffered, rotating JSONL log of predictions written by a background thread
+
+    `record` only appends to an in-memory ring buffer and never blocks on I/O.
+    When the buffer holds `capacity` entries or `max_rows` prediction rows (a
+    batch entry counts all of its rows) the oldest entries are dropped (and
+    counted), so a slow disk sheds audit entries instead of adding request
+    latency or memory. The writer thread serializes and appends entries in
+    batches, and rotates the file to `path.1` ... `path.<backup_count>` once it
+    exceeds `max_bytes`. Every worker process of the API appends to the same
+    file, so appends and rotation hold an exclusive lock on `path.lock`.
+    """
+
+    def __init__(self, path, capacity=10000, batch_size=500, flush_interval=1.0,
+                 max_bytes=50 * 1024 * 1024, backup_count=5, max_rows=100000):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.capacity = int(capacity)
+        self.max_rows = int(max_rows)
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.max_bytes = int(max_bytes)
+        self.backup_count = int(backup_count)
+        self._buffer = deque()
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flushed = threading.Condition()
+        self._stopped = False
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.rotations = 0
+        self._processed = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, entry):
+        """Queue one entry (a JSON-serializable dict; NumPy values are converted by the writer)"""
+        rows = len(entry['rows']) if 'rows' in entry else 1
+        with self._lock:
+            while self._buffer and (len(self._buffer) >= self.capacity or self._buffered_rows + rows > self.max_rows):
+                _, dropped_rows = self._buffer.popleft()
+                self._buffered_rows -= dropped_rows
+                self.dropped += 1
+            self._buffer.append((entry, rows))
+            self._buffered_rows += rows
+            self.recorded += 1
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _drain(self):
+        with self._lock:
+            batch = [entry for entry, _ in self._buffer]
+            self._buffer.clear()
+            self._buffered_rows = 0
+        return batch
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def _write(self, batch):
+        lines = []
+        for entry in batch:
+            try:
+                lines.append(json.dumps(entry, default=_to_json))
+            except (TypeError, ValueError) as e:
+                self.write_errors += 1
+                logger.error(f"Skipping unserializable audit entry: {str(e)}")
+        if not lines:
+            return
+        try:
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Checked under the lock, so only one worker rotates a full file
+                    if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                        self._rotate()
+                    with open(self.path, 'a') as f:
+                        f.write('\n'.join(lines) + '\n')
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self.written += len(lines)
+        except OSError as e:
+            self.write_errors += len(lines)
+            logger.error(f"Error writing prediction audit log: {str(e)}")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            batch = self._drain()
+            if batch:
+                self._write(batch)
+            with self._flushed:
+                self._processed += len(batch)
+                self._flushed.notify_all()
+            if self._stopped:
+                break
+
+    def flush(self, timeout=5.0):
+        """Ask the writer to write everything recorded so far and wait for it; returns False on timeout"""
+        with self._lock:
+            target = self.recorded
+        with self._flushed:
+            self._wakeup.set()
+            # Dropped entries were recorded but will never reach the writer
+            return self._flushed.wait_for(lambda: self._processed + self.dropped >= target or self._stopped,
+                                          timeout)
+
+    def close(self, timeout=5.0):
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._writer.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+            buffered_rows = self._buffered_rows
+        return {
+            "enabled": True,
+            "path": self.path,
+            "buffered": buffered,
+            "buffered_rows": buffered_rows,
+            "capacity": self.capacity,
+            "max_rows": self.max_rows,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "write_errors": self.write_errors,
+            "rotations": self.rotations,
+        }
+
+
+def audit_entry_rows(entry):
+    """Feature rows and predictions of a single-prediction or batch audit entry"""
+    if 'rows' in entry:
+        return entry['rows'], entry['predictions']
+    if 'features' in entry:
+        return [entry['features']], [entry['prediction']]
+    return [], []
+
+
+class AuditLogReader:
+    """Iterate over the audit entries appended since a saved position
+
+    `position` is the {"inode", "offset"} dict left in `reader.position` by a
+    previous pass, or None to read every file. If the log has rotated since,
+    the remainder of the rotated file and every newer file are read. Lines
+    still being written (without a trailing newline) are left for the next pass.
+    """
+
+    def __init__(self, path, position=None, backup_count=5):
+        self.path = path
+        self.backup_count = backup_count
+        self.start = position
+        self.position = position
+
+    def _plan(self):
+        # Oldest file first; rotation renames files, so inodes identify them across passes
+        files = []
+        for file_path in [f"{self.path}.{i}" for i in range(self.backup_count, 0, -1)] + [self.path]:
+            try:
+                files.append((file_path, os.stat(file_path).st_ino))
+            except OSError:
+                continue
+        if self.start is not None:
+            for i, (_, inode) in enumerate(files):
+                if inode == self.start.get('inode'):
+                    return files[i:], self.start.get('offset', 0)
+        return files, 0
+
+    def __iter__(self):
+        files, offset = self._plan()
+        for file_path, inode in files:
+            with open(file_path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+            self.position = {"inode": inode, "offset": offset}
+            offset = 0
+
@@ -1,14 +1,269 @@
 import functools
-from flask import request, jsonify
+import hashlib
+import math
 import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+DEFAULT_API_KEY = 'default_dev_key'
+
+# Parsed API keys, loaded on first use (after the app has read .env) instead of on every request
+_api_keys = None
+_api_keys_lock = threading.Lock()
+
+
+class ApiKey:
+    """A configured API key with its own rate limit; `name` is a short hash safe to put in logs and metrics"""
+
+    __slots__ = ('name', 'rate', 'burst')
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+
+def load_api_keys(keys_spec=None, default_key=None, default_rate=None, default_burst=None):
+    """Parse API_KEYS and the single legacy API_KEY into {key: ApiKey}
+
+    API_KEYS is a comma-separated list of `key[:rate[:burst]]` entries, where
+    rate is in requests per second. Keys without their own limits use
+    RATE_LIMIT_PER_SECOND and RATE_LIMIT_BURST.
+    """
+    keys_spec = os.getenv('API_KEYS', '') if keys_spec is None else keys_spec
+    default_key = os.getenv('API_KEY', DEFAULT_API_KEY) if default_key is None else default_key
+    default_rate = float(os.getenv('RATE_LIMIT_PER_SECOND', 50)) if default_rate is None else default_rate
+    default_burst = float(os.getenv('RATE_LIMIT_BURST', 100)) if default_burst is None else default_burst
+
+    entries = [entry.strip() for entry in keys_spec.split(',') if entry.strip()]
+    if default_key:
+        entries.append(default_key)
+
+    keys = {}
+    for entry in entries:
+        key, *limits = entry.split(':')
+        if key in keys:
+            continue
+        rate = float(limits[0]) if len(limits) > 0 and limits[0] else default_rate
+        burst = float(limits[1]) if len(limits) > 1 and limits[1] else max(default_burst, rate)
+        keys[key] = ApiKey(hashlib.sha256(key.encode()).hexdigest()[:8], rate, burst)
+    return keys
+
+
+def get_api_keys():
+    global _api_keys
+    if _api_keys is None:
+        with _api_keys_lock:
+            if _api_keys is None:
+                _api_keys = load_api_keys()
+    return _api_keys
+
+
+def reset_api_keys():
+    """Forget the loaded keys so the next request re-reads the environment"""
+    global _api_keys
+    with _api_keys_lock:
+        _api_keys = None
+
 
 # A simple API key validation function
 def require_api_key(view_function):
     @functools.wraps(view_function)
     def decorated_function(*args, **kwargs):
         api_key = request.headers.get('X-API-Key')
-        if api_key and api_key == os.getenv('API_KEY', 'default_dev_key'):
+        if api_key and api_key in get_api_keys():
             return view_function(*args, **kwargs)
         else:
             return {'error': 'Invalid or missing API key'}, 401
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second with bursts of up to `burst`"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', '_lock')
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, cost=1.0):
+        """Take `cost` tokens; returns 0 when admitted, otherwise the seconds until enough tokens are available"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return 0.0
+            return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Admission control for the prediction routes
+
+    A request passes three checks, cheapest first:
+    - authentication: an X-API-Key header must name a configured key (401 otherwise). Requests without
+      the header are allowed unless `require_key` is set and are rate limited per client address.
+    - rate limiting: a token bucket per key or address (429 with Retry-After when empty).
+    - load shedding: at most `max_in_flight` requests run at once. A request that would have to queue
+      waits only if the expected wait, estimated from the queue length and a moving average of
+      service times, fits the `queue_budget` latency budget; otherwise it is rejected at once with 503.
+    Rejections cost a few dictionary lookups, so overload does not slow down admitted requests.
+
+    State is per process. Under a pre-fork server with `processes` workers each
+    bucket gets 1/`processes` of the configured rate and burst, so the server as
+    a whole admits the configured rate when requests spread across workers.
+    """
+
+    OUTCOMES = ('admitted', 'unauthorized', 'rate_limited', 'shed')
+
+    def __init__(self, max_in_flight=32, queue_budget=0.1, anonymous_rate=50.0, anonymous_burst=100.0,
+                 api_keys=None, max_clients=10000, processes=1):
+        self.max_in_flight = int(max_in_flight)
+        self.processes = max(1, int(processes))
+        self.queue_budget = float(queue_budget)
+        self.anonymous_rate = float(anonymous_rate)
+        self.anonymous_burst = float(anonymous_burst)
+        self.max_clients = int(max_clients)
+        self._api_keys = api_keys
+        self._buckets = OrderedDict()
+        self._buckets_lock = threading.Lock()
+        self._slots = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_time = 0.0
+        self.counters = {}
+        self._counters_lock = threading.Lock()
+        # Called with (endpoint, outcome) for every decision, e.g. to export counters as metrics
+        self.listener = None
+
+    @classmethod
+    def from_env(cls):
+        """Limits from the environment; gunicorn.conf.py sets the in-flight cap and worker count it serves with"""
+        return cls(max_in_flight=int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 32)),
+                   queue_budget=float(os.getenv('ADMISSION_QUEUE_BUDGET_MS', 100)) / 1000,
+                   anonymous_rate=float(os.getenv('ANONYMOUS_RATE_LIMIT_PER_SECOND', 50)),
+                   anonymous_burst=float(os.getenv('ANONYMOUS_RATE_LIMIT_BURST', 100)),
+                   processes=int(os.getenv('ADMISSION_PROCESSES', 1)))
+
+    @property
+    def api_keys(self):
+        return self._api_keys if self._api_keys is not None else get_api_keys()
+
+    def _record(self, endpoint, outcome):
+        with self._counters_lock:
+            key = (endpoint, outcome)
+            self.counters[key] = self.counters.get(key, 0) + 1
+        if self.listener is not None:
+            self.listener(endpoint, outcome)
+
+    def _bucket(self, client, rate, burst):
+        with self._buckets_lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                # This process's share of the limit; a burst below one token would never admit anything
+                bucket = self._buckets[client] = TokenBucket(rate / self.processes,
+                                                             max(1.0, burst / self.processes))
+                # Bound memory when many distinct addresses show up; idle buckets are full anyway
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket
+
+    def acquire_slot(self):
+        """Take an in-flight slot, waiting within the latency budget; returns False to shed the request"""
+        with self._slots:
+            if self.max_in_flight <= 0 or self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return True
+            # Expected wait if every request ahead of this one takes the average service time
+            expected_wait = (self.waiting + 1) * self.service_time / self.max_in_flight
+            if expected_wait > self.queue_budget:
+                return False
+            deadline = time.monotonic() + self.queue_budget
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._slots.wait(remaining)
+                self.in_flight += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release_slot(self, service_time):
+        with self._slots:
+            self.in_flight -= 1
+            self.service_time = service_time if self.service_time == 0 else 0.9 * self.service_time + 0.1 * service_time
+            self._slots.notify()
+
+    def admit(self, endpoint, require_key=False, cost=1.0):
+        """Decorator applying authentication, rate limiting and load shedding to a view"""
+        def decorator(view_function):
+            @functools.wraps(view_function)
+            def decorated_function(*args, **kwargs):
+                api_key = request.headers.get('X-API-Key')
+                if api_key or require_key:
+                    key = self.api_keys.get(api_key) if api_key else None
+                    if key is None:
+                        self._record(endpoint, 'unauthorized')
+                        return {'error': 'Invalid or missing API key'}, 401
+                    bucket = self._bucket(f"key:{key.name}", key.rate, key.burst)
+                else:
+                    # remote_addr is the client's address only if ProxyFix is set up for the proxies in front
+                    bucket = self._bucket(f"addr:{request.remote_addr}", self.anonymous_rate, self.anonymous_burst)
+
+                retry_after = bucket.try_acquire(cost)
+                if retry_after:
+                    self._record(endpoint, 'rate_limited')
+                    return ({'error': 'Rate limit exceeded'}, 429,
+                            {'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+                if not self.acquire_slot():
+                    self._record(endpoint, 'shed')
+                    return {'error': 'Server is overloaded, please retry later'}, 503, {'Retry-After': '1'}
+
+                self._record(endpoint, 'admitted')
+                started = time.perf_counter()
+                try:
+                    return view_function(*args, **kwargs)
+                finally:
+                    self.release_slot(time.perf_counter() - started)
+            return decorated_function
+        return decorator
+
+    def reset(self):
+        """Drop all rate-limit state and counters"""
+        with self._buckets_lock:
+            self._buckets.clear()
+        with self._counters_lock:
+            self.counters.clear()
+
+    def stats(self):
+        with self._counters_lock:
+            endpoints = {}
+            for (endpoint, outcome), count in self.counters.items():
+                endpoints.setdefault(endpoint, dict.fromkeys(self.OUTCOMES, 0))[outcome] = count
+        with self._slots:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_in_flight": self.max_in_flight,
+                "processes": self.processes,
+                "queue_budget_ms": self.queue_budget * 1000,
+                "avg_service_ms": self.service_time * 1000,
+                "tracked_clients": len(self._buckets),
+                "endpoints": endpoints,
+            }
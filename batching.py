@@ -0,0 +1,159 @@
+import threading
+import queue
+import time
+import logging
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into batched model calls
+
+    Requests are queued and a background worker collects them for up to
+    `max_wait_ms` (or until `max_batch_size` rows are waiting), runs one
+    `predict_fn` call on the stacked rows and hands each caller its own result.
+    Rows queued with a `model` (e.g. the snapshot a request started with)
+    are only batched with rows for the same model, and are predicted with
+    `predict_fn(X, model)`, so a model swap never changes which model
+    scores a queued row.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0, name='micro-batcher'):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._stopping = False
+        self._reset_stats()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def _reset_stats(self):
+        self._requests = 0
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+        self._max_batch_seen = 0
+        self._batch_size_counts = {}
+        self._total_wait = 0.0
+        self._total_predict = 0.0
+
+    def predict(self, row, timeout=None, model=None):
+        """Queue one feature row and block until its prediction (by `model`, when given) is ready"""
+        future = Future()
+        # Checked and queued under the lock, so nothing can be queued behind the stop sentinel
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("Micro-batcher has been stopped")
+            self._queue.put((row, future, time.perf_counter(), model))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(block=remaining > 0, timeout=remaining if remaining > 0 else None)
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop requested: finish this batch, then exit
+                self._stopped.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch is None:
+                break
+            # One model call per model the rows were queued for
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[3]), (item[3], []))[1].append(item)
+            for model, group in groups.values():
+                self._predict_group(model, group)
+        self._fail_queued()
+
+    def _predict_group(self, model, group):
+        started = time.perf_counter()
+        X = np.asarray([item[0] for item in group], dtype=np.float64)
+        try:
+            predictions = self.predict_fn(X) if model is None else self.predict_fn(X, model)
+            if len(predictions) != len(group):
+                raise ValueError(f"predict_fn returned {len(predictions)} predictions for {len(group)} rows")
+            for item, prediction in zip(group, predictions):
+                item[1].set_result(prediction)
+            failed = False
+        except Exception as e:
+            logger.error(f"Micro-batch prediction failed: {str(e)}")
+            for item in group:
+                item[1].set_exception(e)
+            failed = True
+        finished = time.perf_counter()
+
+        with self._lock:
+            size = len(group)
+            self._requests += size
+            self._batches += 1
+            self._rows += size
+            self._errors += size if failed else 0
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+            self._total_wait += sum(started - item[2] for item in group)
+            self._total_predict += finished - started
+
+    def _fail_queued(self):
+        """Fail every request still queued, so no caller waits on a worker that has exited"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("Micro-batcher has been stopped"))
+
+    def stats(self):
+        """Queue depth and batch-size statistics for tuning the window"""
+        with self._lock:
+            batches = self._batches or 1
+            requests = self._requests or 1
+            return {
+                "enabled": True,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "errors": self._errors,
+                "avg_batch_size": self._rows / batches,
+                "max_batch_size_seen": self._max_batch_seen,
+                "batch_size_counts": {str(size): count for size, count in sorted(self._batch_size_counts.items())},
+                "avg_queue_wait_ms": self._total_wait / requests * 1000.0,
+                "avg_predict_ms": self._total_predict / batches * 1000.0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._reset_stats()
+
+    def stop(self, timeout=1.0):
+        """Flush queued requests, stop the worker thread and reject any later request"""
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._queue.put(None)
+        self._worker.join(timeout)
+        self._stopped.set()
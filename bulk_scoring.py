@@ -0,0 +1,299 @@
+import glob
+import io
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+
+from feature_store import FEATURE_COLUMNS
+from hashing import file_fingerprint
+from model_manager import ModelManager
+from prediction_labels import label_predictions, model_threshold
+from prediction_stats import load_model_metadata, save_model_metadata
+from preprocessing import DEFAULT_CHUNK_SIZE, ByteRange
+
+OUTPUT_DIR = 'data/predictions'
+MANIFEST_NAME = '_manifest.json'
+DEFAULT_SHARD_MB = 32
+# Rows used to pick one dtype per column, so every part file has the same schema
+_DTYPE_SAMPLE_ROWS = 10000
+
+# Set in each worker by _init_worker, so the model is mapped once per process instead of once per shard
+_worker_state = None
+
+
+def shard_ranges(path, shard_bytes):
+    """Byte ranges [start, end) of about `shard_bytes` each, covering the rows after the header
+
+    Every boundary is moved to the next line start, so each range holds
+    whole rows. Only a line per boundary is read, and the same file always
+    gives the same ranges, which is what makes an interrupted run resumable.
+    """
+    ranges = []
+    with open(path, 'rb') as f:
+        start = len(f.readline())
+        size = f.seek(0, os.SEEK_END)
+        while start < size:
+            end = start + shard_bytes
+            if end < size:
+                f.seek(end - 1)
+                f.readline()
+                end = f.tell()
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _column_dtypes(path):
+    import pandas as pd
+
+    sample = pd.read_csv(path, nrows=_DTYPE_SAMPLE_ROWS)
+    dtypes = {}
+    for column, dtype in sample.dtypes.items():
+        # Only the sample was seen, so each type must also hold a missing value further down the file:
+        # integers and booleans use pandas' nullable types, which stay int64 and bool in the parquet schema
+        if dtype.kind == 'f':
+            dtypes[column] = 'float64'
+        elif dtype.kind in 'iu':
+            dtypes[column] = 'Int64'
+        elif dtype.kind == 'b':
+            dtypes[column] = 'boolean'
+        else:
+            dtypes[column] = 'str'
+    return list(sample.columns), dtypes
+
+
+def _part_path(output_dir, index):
+    return os.path.join(output_dir, f'part-{index:05d}.parquet')
+
+
+def _init_worker(input_path, columns, dtypes, model_path, model_sha256, output_dir, threshold, chunksize):
+    global _worker_state
+    # Workers map the compiled arrays the parent published, so the forest is in memory once
+    manager = ModelManager(model_path, warmup_rounds=0)
+    manager.reload()
+    if manager.current is None or manager.current.sha256 != model_sha256:
+        raise RuntimeError(f"{model_path} changed while scoring; restart the run")
+    _worker_state = {
+        'input_path': input_path, 'columns': columns, 'dtypes': dtypes, 'model': manager.current,
+        'output_dir': output_dir, 'threshold': threshold, 'chunksize': chunksize,
+    }
+
+
+def _score_shard(index, start, end):
+    """Score the rows in bytes [start, end) of the input and write them to this shard's part file
+
+    The shard is parsed and written one row group of `chunksize` rows at a
+    time, so memory does not grow with the shard size. The part is written
+    under a temporary name and renamed into place once complete.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    state = _worker_state
+    path = _part_path(state['output_dir'], index)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    writer = None
+    rows = 0
+    try:
+        with io.BufferedReader(ByteRange(state['input_path'], start, end)) as f:
+            for chunk in pd.read_csv(f, header=None, names=state['columns'], dtype=state['dtypes'],
+                                     chunksize=state['chunksize']):
+                predictions = state['model'].predict(chunk[FEATURE_COLUMNS].to_numpy(np.float64))
+                chunk['Predicted_Usage'] = predictions
+                chunk['Notification'] = label_predictions(predictions, state['threshold'])
+                # Without pandas' metadata the nullable dtypes read back as plain ints and bools when a part has
+                # no missing values, as for score_frame; casting keeps a chunk with an all-missing column in schema
+                table = pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata(None)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if writer is not None:
+        writer.close()
+        os.replace(tmp_path, path)
+    return index, rows
+
+
+def _run_key(input_path, model_sha256, threshold, shard_bytes):
+    return {
+        'input': os.path.abspath(input_path),
+        'input_fingerprint': file_fingerprint(input_path),
+        'model_sha256': model_sha256,
+        'threshold': threshold,
+        'shard_bytes': shard_bytes,
+    }
+
+
+def _clear_parts(output_dir):
+    for path in glob.glob(os.path.join(output_dir, 'part-*.parquet*')):
+        os.remove(path)
+
+
+def score_file(input_path='data/processed_data.csv', model_path='models/model.pkl', output_dir=OUTPUT_DIR,
+               threshold=None, shard_mb=DEFAULT_SHARD_MB, n_jobs=None, chunksize=DEFAULT_CHUNK_SIZE,
+               resume=True, on_shard=None):
+    """Score every row of the processed CSV into Parquet parts under `output_dir`; returns a run summary
+
+    The input is split into newline-aligned byte ranges of about `shard_mb`
+    MB, and each one is parsed, predicted with the compiled forest, labelled
+    against `threshold` (MODEL_THRESHOLD when None) and written to its own
+    part-NNNNN.parquet by a pool of `n_jobs` processes (every core when None
+    or <= 0). Only a couple of shards per worker are in flight at a time.
+
+    `_manifest.json` records the input fingerprint, model hash, threshold
+    and the rows of every finished part. With `resume`, a run over the same
+    input, model and threshold skips the parts that are already written;
+    anything else starts over. `on_shard(summary)` is called after each
+    shard, e.g. to print progress.
+    """
+    started = time.perf_counter()
+    threshold = model_threshold() if threshold is None else float(threshold)
+    shard_bytes = max(1, int(shard_mb * (1 << 20)))
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = os.cpu_count() or 1
+
+    # Load (and publish the compiled arrays of) the model once here, so workers only map them
+    manager = ModelManager(model_path, warmup_rounds=0)
+    if not manager.reload():
+        raise FileNotFoundError(f"Could not load a model from {model_path}")
+    model_sha256 = manager.current.sha256
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    key = _run_key(input_path, model_sha256, threshold, shard_bytes)
+    manifest = load_model_metadata(manifest_path)
+    if resume and manifest.get('key') == key:
+        shards = manifest['shards']
+    else:
+        _clear_parts(output_dir)
+        shards = [{'part': os.path.basename(_part_path(output_dir, i)), 'start': start, 'end': end, 'rows': None}
+                  for i, (start, end) in enumerate(shard_ranges(input_path, shard_bytes))]
+        manifest = {'key': key, 'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'complete': False,
+                    'shards': shards}
+        save_model_metadata(manifest_path, manifest)
+
+    pending = [i for i, shard in enumerate(shards)
+               if shard['rows'] is None or not os.path.exists(os.path.join(output_dir, shard['part']))]
+    resumed_rows = sum(shards[i]['rows'] for i in set(range(len(shards))) - set(pending))
+    columns, dtypes = _column_dtypes(input_path)
+    initargs = (input_path, columns, dtypes, model_path, model_sha256, output_dir, threshold, chunksize)
+    scored_rows = 0
+
+    def finish(index, rows):
+        nonlocal scored_rows
+        shards[index]['rows'] = rows
+        scored_rows += rows
+        save_model_metadata(manifest_path, manifest)
+        if on_shard is not None:
+            elapsed = time.perf_counter() - started
+            on_shard({'shard': index, 'shards': len(shards), 'rows': rows, 'scored_rows': scored_rows,
+                      'rows_per_second': scored_rows / elapsed if elapsed > 0 else 0.0})
+
+    n_jobs = min(n_jobs, len(pending))
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        for index in pending:
+            finish(*_score_shard(index, shards[index]['start'], shards[index]['end']))
+    elif n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as pool:
+            queue, running = list(pending), set()
+            while queue or running:
+                # Keep two shards per worker queued, so input is read as fast as it is scored
+                while queue and len(running) < 2 * n_jobs:
+                    index = queue.pop(0)
+                    running.add(pool.submit(_score_shard, index, shards[index]['start'], shards[index]['end']))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(*future.result())
+
+    seconds = time.perf_counter() - started
+    summary = {
+        'rows': resumed_rows + scored_rows,
+        'scored_rows': scored_rows,
+        'resumed_rows': resumed_rows,
+        'shards': len(shards),
+        'resumed_shards': len(shards) - len(pending),
+        'seconds': seconds,
+        'rows_per_second': scored_rows / seconds if seconds > 0 else 0.0,
+        'threshold': threshold,
+        'output': output_dir,
+    }
+    manifest.update(complete=True, finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), summary=summary)
+    save_model_metadata(manifest_path, manifest)
+    return summary
+
+
+def score_frame(model, data, output_dir=OUTPUT_DIR, threshold=None, rows_per_part=10 * DEFAULT_CHUNK_SIZE):
+    """Score an in-memory processed DataFrame with an in-memory model into the same layout as score_file
+
+    For pipelines that just built both, so nothing is re-read from disk.
+    Parts of `rows_per_part` rows replace any earlier output; the manifest
+    is marked as coming from a frame, so a later score_file run starts over
+    instead of resuming from it. Returns the run summary.
+    """
+    from tree_engine import make_predict_fn
+
+    started = time.perf_counter()
+    threshold = model_threshold() if threshold is None else float(threshold)
+    predict = make_predict_fn(model)
+    os.makedirs(output_dir, exist_ok=True)
+    _clear_parts(output_dir)
+
+    shards = []
+    for index, start in enumerate(range(0, len(data), rows_per_part)):
+        part = data.iloc[start:start + rows_per_part].copy()
+        predictions = predict(part[FEATURE_COLUMNS].to_numpy(np.float64))
+        part['Predicted_Usage'] = predictions
+        part['Notification'] = label_predictions(predictions, threshold)
+        path = _part_path(output_dir, index)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        part.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        shards.append({'part': os.path.basename(path), 'rows': len(part)})
+
+    seconds = time.perf_counter() - started
+    summary = {
+        'rows': len(data),
+        'scored_rows': len(data),
+        'resumed_rows': 0,
+        'shards': len(shards),
+        'resumed_shards': 0,
+        'seconds': seconds,
+        'rows_per_second': len(data) / seconds if seconds > 0 else 0.0,
+        'threshold': threshold,
+        'output': output_dir,
+    }
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    save_model_metadata(os.path.join(output_dir, MANIFEST_NAME), {
+        'key': {'source': 'frame', 'threshold': threshold}, 'started_at': now, 'finished_at': now,
+        'complete': True, 'shards': shards, 'summary': summary,
+    })
+    return summary
+
+
+def part_paths(output_dir=OUTPUT_DIR):
+    """The finished part files of a scoring run, in input order"""
+    return sorted(glob.glob(os.path.join(output_dir, 'part-*.parquet')))
+
+
+def read_predictions(output_dir=OUTPUT_DIR, columns=None):
+    """All scored rows of a run as one DataFrame"""
+    import pandas as pd
+
+    paths = part_paths(output_dir)
+    if not paths:
+        return pd.DataFrame(columns=columns)
+    return pd.concat([pd.read_parquet(path, columns=columns) for path in paths], ignore_index=True)
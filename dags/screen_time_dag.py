@@ -1,48 +1,141 @@
 from prefect import flow, task
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
-import joblib
+import os
+import sys
+from datetime import datetime
+
+# Add the project root to the path so we can import the shared modules
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from feature_store import load_features
+from feature_transform import attach_transform
+from hashing import content_key, file_sha256, sources_sha256
+
+RAW_PATH = 'data/screentime_analysis.csv'
+PROCESSED_PATH = 'data/processed_data.csv'
+STATE_PATH = 'data/preprocess_state.json'
+MODEL_PATH = 'models/model.pkl'
+MODELS_DIR = 'models/versions'
+TRAIN_PARAMS = {'random_state': 42}
+
+# The code the cached training stage runs: editing any of these files invalidates its cached models
+TRAIN_SOURCES = [os.path.abspath(__file__)] + [
+    os.path.join(PROJECT_ROOT, name) for name in ('feature_transform.py', 'feature_store.py', 'model_comparison.py')]
+
+
+def train_cache_key(context, parameters):
+    import sklearn
+
+    return content_key('train', parameters['data_key'], parameters['params'], sources_sha256(TRAIN_SOURCES),
+                       sklearn.__version__)
+
 
 @task
 def preprocess_data():
-    data = pd.read_csv('data/screentime_analysis.csv')
-    data['Date'] = pd.to_datetime(data['Date'])
-    data['DayOfWeek'] = data['Date'].dt.dayofweek
-    data['Month'] = data['Date'].dt.month
-    data = data.groupby(['Date', 'App']).mean().reset_index()
-    scaler = MinMaxScaler()
-    data[['Notifications', 'Times Opened']] = scaler.fit_transform(data[['Notifications', 'Times Opened']])
-    joblib.dump(scaler, 'models/scaler.pkl')
-    data['Notifications_x_TimesOpened'] = data['Notifications'] * data['Times Opened']
-    data.to_csv('data/processed_data.csv', index=False)
-    return data
+    """Run the same incremental preprocessing as scripts/preprocess.py; returns (dataset content hash, transform)
+
+    The processed CSV, its feature store and data/preprocess_state.json stay
+    in one schema whichever tool ran last, and unchanged raw data only costs
+    a watermark check, so this stage needs no cache of its own.
+    """
+    from preprocessing import load_transform, run_preprocessing
+
+    summary = run_preprocessing(RAW_PATH, PROCESSED_PATH, STATE_PATH)
+    print(f"Preprocessing ({summary['mode']}): {summary['rows_added']} new rows")
+    return load_features(PROCESSED_PATH).content_hash, load_transform(STATE_PATH)
+
+
+@task(cache_key_fn=train_cache_key, persist_result=True)
+def train_model(transform, data_key, params):
+    """Fit the model on the processed data's non-holdout rows
+
+    Cached on the content hash of the data it reads, so the cache can only
+    hit for exactly that data. Publishing is left to an uncached task.
+    """
+    from model_comparison import holdout_mask
+
+    features = load_features(PROCESSED_PATH)
+    if features.content_hash != data_key:
+        raise RuntimeError(f"{PROCESSED_PATH} changed since preprocessing; run the flow again")
+    X = features.frame()
+    # Never fit the fixed holdout, the same rows scripts/train.py tests on
+    train = ~holdout_mask(X.index.to_numpy())
+    model = RandomForestRegressor(**params)
+    model.fit(X[train], features.y[train])
+    attach_transform(model, transform)
+    return model
+
 
 @task
-def train_model(data):
-    X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
-    y = data['Usage (minutes)']
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    model = RandomForestRegressor(random_state=42)
-    model.fit(X_train, y_train)
-    joblib.dump(model, 'models/model.pkl')
+def publish_trained_model(model, params):
+    """Serve `model` unless it already is; returns its pickle's SHA-256
+
+    A cached training result is published again when models/model.pkl or
+    the registry's production version has changed since (e.g. after
+    scripts/train.py or a retraining job), so a cache hit never leaves
+    another model in place.
+    """
+    import tempfile
+    import joblib
+    from model_manager import publish_model
+    from model_registry import ModelRegistry, publish_version
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.pkl')
+        joblib.dump(model, path)
+        sha256 = file_sha256(path)
+    production = ModelRegistry(models_dir=MODELS_DIR).production()
+    if (os.path.exists(MODEL_PATH) and file_sha256(MODEL_PATH) == sha256
+            and production is not None and production['sha256'] == sha256):
+        return sha256
+    publish_model(model, MODEL_PATH)
+    # Registered as the production version (served by the API) and scored by the comparison stage
+    publish_version(model, datetime.now().strftime('%Y%m%d_%H%M%S'), models_dir=MODELS_DIR, params=params,
+                    source='prefect')
+    return sha256
+
+
+@task
+def predict_and_log(data, model):
+    from bulk_scoring import score_frame
+
+    # Scores the frame and model handed over from the previous tasks instead of re-reading them
+    summary = score_frame(model, data)
+    print(f"Scored {summary['rows']} rows ({summary['rows_per_second']:,.0f} rows/s) into {summary['output']}")
+    return summary
+
 
 @task
-def predict_and_log():
-    data = pd.read_csv('data/processed_data.csv')
-    model = joblib.load('models/model.pkl')
-    X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
-    predictions = model.predict(X)
-    data['Predicted_Usage'] = predictions
-    data['Notification'] = data['Predicted_Usage'].apply(lambda x: "Take a break!" if x > 60 else "All good!")
-    data.to_csv('data/predictions.csv', index=False)
+def monitor_model(model):
+    from monitoring import ModelMonitor
+
+    return ModelMonitor(model_path=MODEL_PATH, data_path=PROCESSED_PATH).run_monitoring(model=model)
+
+
+@task
+def compare_model_versions():
+    from model_comparison import compare_versions
+
+    # Only versions not yet scored on this dataset are evaluated; the rest come from its cache
+    return compare_versions(PROCESSED_PATH, MODELS_DIR)
+
 
 @flow(name="screen_time_pipeline")
-def screen_time_flow():
-    data = preprocess_data()
-    train_model(data)
-    predict_and_log()
+def screen_time_flow(params=None):
+    params = {**TRAIN_PARAMS, **(params or {})}
+    # Training is keyed on the processed data's content hash, the parameters and its code, so an
+    # unchanged stage returns its stored model; publishing checks what is actually served every run
+    data_key, transform = preprocess_data()
+    model = train_model(transform, data_key, params)
+    publish_trained_model(model, params)
+
+    # Independent stages run concurrently on the memory-mapped data and the model already in memory
+    data = load_features(PROCESSED_PATH).frame(include_target=True, include_date=True)
+    scoring = predict_and_log.submit(data, model)
+    monitoring = monitor_model.submit(model)
+    comparison = compare_model_versions.submit()
+    return scoring.result(), monitoring.result(), comparison.result()
 
 if __name__ == "__main__":
-    screen_time_flow()
\ No newline at end of file
+    screen_time_flow()
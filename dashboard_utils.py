@@ -0,0 +1,225 @@
+import io
+import os
+import json
+import base64
+import threading
+
+import numpy as np
+
+from hashing import file_fingerprint
+from metrics_store import MetricsStore
+
+# Rendered charts and parsed files, keyed on (path, fingerprint) so they are rebuilt only when the file changes
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(kind, path, build):
+    fingerprint = file_fingerprint(path)
+    if fingerprint is None:
+        return None
+    key = (kind, path)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+    value = build(path)
+    with _cache_lock:
+        _cache[key] = (fingerprint, value)
+    return value
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _read_metrics(path, limit=None):
+    # .jsonl paths are MetricsStore logs; the tail is read without loading the rest of the history
+    if path.endswith('.jsonl'):
+        store = MetricsStore(path)
+        return store.tail(limit) if limit else store.read()
+    with open(path, 'r') as f:
+        metrics = json.load(f)
+    return metrics[-limit:] if limit else metrics
+
+
+def load_metrics(path, limit=None):
+    """Parsed metrics history (the last `limit` records if given), re-read only when the file changes"""
+    return _cached(('metrics', limit), path, lambda p: _read_metrics(p, limit)) or []
+
+
+def _read_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_model_comparison(path):
+    """The report scripts/compare_models.py writes, re-read only when the file changes"""
+    return _cached('comparison', path, _read_json)
+
+
+def _render_metrics_plot(path, limit=None):
+    metrics = _read_metrics(path, limit)
+    if not metrics:
+        return None
+
+    # Use the object-oriented API so rendering does not touch pyplot's global state
+    from matplotlib.figure import Figure
+
+    timestamps = [m['timestamp'] for m in metrics]
+    mae = [m['mae'] for m in metrics]
+    r2 = [m['r2'] for m in metrics]
+
+    # Create figure with two subplots (separate graphs for each metric)
+    fig = Figure(figsize=(10, 8))
+    ax1, ax2 = fig.subplots(2, 1, sharex=True)
+
+    # Plot MAE
+    ax1.plot(timestamps, mae, marker='o', color='blue', linewidth=2)
+    ax1.set_title('Mean Absolute Error Over Time')
+    ax1.set_ylabel('MAE')
+    ax1.grid(True, linestyle='--', alpha=0.7)
+
+    # Add value labels
+    for i, v in enumerate(mae):
+        ax1.text(i, v, f"{v:.3f}", ha='center', va='bottom', fontweight='bold')
+
+    # Plot R²
+    ax2.plot(timestamps, r2, marker='o', color='green', linewidth=2)
+    ax2.set_title('R² Score Over Time')
+    ax2.set_ylabel('R²')
+    ax2.set_xlabel('Timestamp')
+    ax2.grid(True, linestyle='--', alpha=0.7)
+    ax2.set_ylim(0, 1.0)  # R² is typically between 0 and 1
+
+    # Add value labels
+    for i, v in enumerate(r2):
+        ax2.text(i, v, f"{v:.3f}", ha='center', va='bottom', fontweight='bold')
+
+    ax2.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+
+    # Convert plot to base64 string
+    img = io.BytesIO()
+    fig.savefig(img, format='png')
+    return base64.b64encode(img.getvalue()).decode()
+
+
+def render_metrics_plot(path, limit=None):
+    """Base64 PNG of the MAE/R² history, rendered once per version of the metrics file"""
+    return _cached(('plot', limit), path, lambda p: _render_metrics_plot(p, limit))
+
+
+def read_tail_lines(path, n, block_size=8192):
+    """Return the header line and the last `n` lines of a text file by seeking from the end
+
+    Only the header and the trailing blocks are read, so the cost does not grow
+    with the file size. Fields must not contain embedded newlines.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        header_end = f.tell()
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        # Read backwards until we have n complete lines (n + 1 newlines, allowing for a trailing newline)
+        while position > header_end and data.count(b'\n') <= n:
+            read_size = min(block_size, position - header_end)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = [line for line in data.splitlines() if line.strip()]
+    return header.decode(), [line.decode() for line in lines[-n:]] if n > 0 else []
+
+
+def tail_csv_records(path, n=10):
+    """The last `n` rows of a CSV as records, like pd.read_csv(path).tail(n).to_dict('records')"""
+    import pandas as pd
+
+    header, lines = read_tail_lines(path, n)
+    if not lines:
+        return []
+    return pd.read_csv(io.StringIO(header + '\n'.join(lines) + '\n')).to_dict('records')
+
+
+def tail_prediction_records(path, n=10):
+    """The last `n` scored rows of a generate_predictions.py output directory, or of a predictions CSV
+
+    Only the trailing part files are read, newest rows last.
+    """
+    import glob
+    import pandas as pd
+
+    if not os.path.isdir(path):
+        return tail_csv_records(path, n)
+    frames, rows = [], 0
+    for part in reversed(sorted(glob.glob(os.path.join(path, 'part-*.parquet')))):
+        if rows >= n:
+            break
+        frame = pd.read_parquet(part)
+        frames.insert(0, frame)
+        rows += len(frame)
+    if not frames or n <= 0:
+        return []
+    return pd.concat(frames, ignore_index=True).tail(n).to_dict('records')
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling
+
+    Returns the indices of at most `threshold` points that preserve the visual
+    shape of the series. The first and last points are always kept.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n - 2 interior points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def metrics_timeseries(metrics, names, max_points):
+    """Downsample each metric series with LTTB for client-side charts"""
+    import pandas as pd
+
+    if not metrics:
+        return {"total": 0, "series": {}}
+
+    timestamps = [m.get('timestamp') for m in metrics]
+    parsed = pd.to_datetime(pd.Series(timestamps), errors='coerce')
+    if parsed.notna().all():
+        x = parsed.astype('int64').to_numpy() / 1e9
+    else:
+        x = np.arange(len(metrics), dtype=np.float64)
+
+    series = {}
+    for name in names:
+        values = np.array([m.get(name, np.nan) for m in metrics], dtype=np.float64)
+        present = np.flatnonzero(~np.isnan(values))
+        keep = present[lttb(x[present], values[present], max_points)]
+        series[name] = {
+            "timestamps": [timestamps[i] for i in keep],
+            "values": values[keep].tolist(),
+        }
+    return {"total": len(metrics), "series": series}
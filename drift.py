@@ -0,0 +1,295 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from prediction_stats import FEATURE_COLUMNS
+
+# Columns profiled at training time; the target is only compared when the current data has it
+DRIFT_COLUMNS = FEATURE_COLUMNS + ['Usage (minutes)']
+DEFAULT_BINS = 20
+# Population Stability Index above 0.2 is the usual "significant shift" threshold
+PSI_THRESHOLD = 0.2
+KS_THRESHOLD = 0.1
+MIN_CURRENT_ROWS = 100
+_EPSILON = 1e-4
+
+
+def bin_edges(values, bins=DEFAULT_BINS):
+    """Inner bin edges: midpoints between values for discrete columns, quantiles otherwise
+
+    `k` edges define `k + 1` bins, (-inf, e0], (e0, e1], ..., (e[k-1], inf), so
+    values outside the reference range still land in the outer bins.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.array([], dtype=np.float64)
+    unique = np.unique(values)
+    if unique.size <= bins:
+        return (unique[:-1] + unique[1:]) / 2
+    return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+
+
+class FeatureSketch:
+    """Mergeable summary of one column: Welford moments, min/max and fixed-bin counts
+
+    Memory does not depend on how many values have been seen, and two sketches
+    with the same edges merge exactly (Chan et al.'s parallel variance update).
+    """
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(self.edges.size + 1, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.missing = 0
+
+    def _merge_moments(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        present = ~np.isnan(values)
+        self.missing += int(values.size - present.sum())
+        values = values[present]
+        if values.size == 0:
+            return
+        self.counts += np.bincount(np.searchsorted(self.edges, values, side='left'), minlength=self.counts.size)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        mean = float(values.mean())
+        self._merge_moments(values.size, mean, float(((values - mean) ** 2).sum()))
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge sketches with different bin edges")
+        self.counts += other.counts
+        self.missing += other.missing
+        if other.count:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._merge_moments(other.count, other.mean, other.m2)
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {
+            "edges": self.edges.tolist(),
+            "counts": self.counts.tolist(),
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "missing": self.missing,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['edges'])
+        sketch.counts = np.asarray(data['counts'], dtype=np.int64)
+        sketch.count = data['count']
+        sketch.mean = data['mean']
+        sketch.m2 = data['m2']
+        sketch.min = data['min'] if data['min'] is not None else np.inf
+        sketch.max = data['max'] if data['max'] is not None else -np.inf
+        sketch.missing = data.get('missing', 0)
+        return sketch
+
+
+def population_stability_index(reference_counts, current_counts):
+    reference = np.maximum(reference_counts / max(reference_counts.sum(), 1), _EPSILON)
+    current = np.maximum(current_counts / max(current_counts.sum(), 1), _EPSILON)
+    return float(np.sum((current - reference) * np.log(current / reference)))
+
+
+def binned_ks_statistic(reference_counts, current_counts):
+    """Largest gap between the two empirical CDFs, evaluated at the bin edges"""
+    reference = np.cumsum(reference_counts) / max(reference_counts.sum(), 1)
+    current = np.cumsum(current_counts) / max(current_counts.sum(), 1)
+    return float(np.max(np.abs(reference - current)))
+
+
+class DriftProfile:
+    """Per-column sketches of a dataset; the reference profile is stored next to the model"""
+
+    def __init__(self, sketches, metadata=None):
+        self.sketches = sketches
+        self.metadata = metadata or {}
+
+    @classmethod
+    def fit(cls, data, columns=DRIFT_COLUMNS, bins=DEFAULT_BINS, metadata=None):
+        """Choose bin edges from `data` (a DataFrame or dict of arrays) and sketch it"""
+        columns = [column for column in columns if column in data]
+        profile = cls({column: FeatureSketch(bin_edges(data[column], bins)) for column in columns}, metadata)
+        profile.update(data)
+        return profile
+
+    def empty_like(self):
+        """A profile with the same bin edges and no data, for sketching new data comparably"""
+        return DriftProfile({column: FeatureSketch(sketch.edges) for column, sketch in self.sketches.items()})
+
+    @property
+    def columns(self):
+        return list(self.sketches)
+
+    def update(self, data):
+        for column, sketch in self.sketches.items():
+            if column in data:
+                sketch.update(data[column])
+
+    def update_rows(self, rows, columns):
+        """Sketch a 2-D array whose columns are named by `columns`"""
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.size == 0:
+            return
+        for i, column in enumerate(columns):
+            if column in self.sketches:
+                self.sketches[column].update(rows[:, i])
+
+    def merge(self, other):
+        for column, sketch in other.sketches.items():
+            if column in self.sketches:
+                self.sketches[column].merge(sketch)
+        return self
+
+    @property
+    def count(self):
+        return max((sketch.count for sketch in self.sketches.values()), default=0)
+
+    def to_dict(self):
+        return {"metadata": self.metadata,
+                "columns": {column: sketch.to_dict() for column, sketch in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({column: FeatureSketch.from_dict(sketch) for column, sketch in data['columns'].items()},
+                   data.get('metadata'))
+
+    def save(self, path):
+        """Atomically write the profile as JSON"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved profile, or return None if there is none"""
+        try:
+            with open(path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def profile_features(features, reference=None, columns=DRIFT_COLUMNS, chunksize=100000, bins=DEFAULT_BINS):
+    """Sketch a FeatureSet from the feature store chunk by chunk
+
+    With a `reference` profile its bin edges are reused; otherwise edges come
+    from the first chunk. Chunks are views of the memory-mapped arrays.
+    """
+    profile = None
+    for chunk in features.chunks(chunksize):
+        if profile is None:
+            if reference is not None:
+                profile = reference.empty_like()
+            else:
+                profile = DriftProfile.fit(chunk, [column for column in columns if column in chunk], bins)
+                continue
+        profile.update(chunk)
+    return profile
+
+
+def compare_profiles(reference, current, psi_threshold=PSI_THRESHOLD, ks_threshold=KS_THRESHOLD):
+    """PSI, binned KS and moment shifts for every column both profiles have data for"""
+    details = {}
+    for column, ref in reference.sketches.items():
+        cur = current.sketches.get(column)
+        if cur is None or cur.count == 0 or ref.count == 0:
+            continue
+        psi = population_stability_index(ref.counts, cur.counts)
+        ks = binned_ks_statistic(ref.counts, cur.counts)
+        details[column] = {
+            'psi': psi,
+            'ks': ks,
+            'reference_mean': ref.mean,
+            'current_mean': cur.mean,
+            'reference_std': ref.std,
+            'current_std': cur.std,
+            'mean_shift_std': abs(cur.mean - ref.mean) / ref.std if ref.std else 0.0,
+            'current_count': cur.count,
+            'drift_detected': psi > psi_threshold or ks > ks_threshold,
+        }
+    return details
+
+
+class DriftWindow:
+    """Daily sketches of recent data plus the audit log position they cover
+
+    Each check folds only the audit entries written since the previous check
+    into per-day profiles and merges the last `window_days` days, so memory
+    and work do not grow with the amount of traffic. The window is rebuilt
+    from scratch when the reference profile (and therefore the bin edges) changes.
+    """
+
+    def __init__(self, reference_id, position=None, days=None):
+        self.reference_id = reference_id
+        self.position = position
+        self.days = days or {}
+
+    @staticmethod
+    def reference_id_of(reference):
+        return reference.metadata.get('created_at') or json.dumps(
+            {column: sketch.edges.tolist() for column, sketch in reference.sketches.items()})
+
+    @classmethod
+    def load(cls, path, reference):
+        reference_id = cls.reference_id_of(reference)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if not data or data.get('reference_id') != reference_id:
+            return cls(reference_id)
+        return cls(reference_id, data.get('position'),
+                   {day: DriftProfile.from_dict(profile) for day, profile in data.get('days', {}).items()})
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"reference_id": self.reference_id, "position": self.position,
+                       "days": {day: profile.to_dict() for day, profile in self.days.items()}}, f)
+        os.replace(tmp_path, path)
+
+    def update(self, reference, day, rows, columns):
+        profile = self.days.get(day)
+        if profile is None:
+            profile = self.days[day] = reference.empty_like()
+        profile.update_rows(rows, columns)
+
+    def current(self, reference, window_days, today=None):
+        """Merge the last `window_days` days (dropping older ones) into one profile"""
+        today = today or datetime.now().date()
+        cutoff = today.toordinal() - window_days + 1
+        for day in list(self.days):
+            if datetime.strptime(day, '%Y-%m-%d').toordinal() < cutoff:
+                del self.days[day]
+        merged = reference.empty_like()
+        for profile in self.days.values():
+            merged.merge(profile)
+        return merged
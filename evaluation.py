@@ -0,0 +1,163 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 100000
+SEGMENT_COLUMNS = ('DayOfWeek', 'Month')
+
+
+class RunningRegressionMetrics:
+    """MAE, MSE and R² accumulated from running sums, mergeable across chunks
+
+    The target's mean and sum of squared deviations are merged with Chan et
+    al.'s parallel update, so R² matches a single pass over all rows up to
+    floating-point rounding without keeping any rows around.
+    """
+
+    __slots__ = ('count', 'abs_error', 'squared_error', 'y_mean', 'y_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.abs_error = 0.0
+        self.squared_error = 0.0
+        self.y_mean = 0.0
+        self.y_m2 = 0.0
+
+    def add_sums(self, count, abs_error, squared_error, y_mean, y_m2):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = y_mean - self.y_mean
+        self.y_mean += delta * count / total
+        self.y_m2 += y_m2 + delta * delta * self.count * count / total
+        self.abs_error += abs_error
+        self.squared_error += squared_error
+        self.count = total
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64)
+        errors = y_true - np.asarray(y_pred, dtype=np.float64)
+        if y_true.size == 0:
+            return
+        y_mean = float(y_true.mean())
+        self.add_sums(y_true.size, float(np.abs(errors).sum()), float(np.square(errors).sum()),
+                      y_mean, float(np.square(y_true - y_mean).sum()))
+
+    def merge(self, other):
+        self.add_sums(other.count, other.abs_error, other.squared_error, other.y_mean, other.y_m2)
+        return self
+
+    def result(self):
+        if self.count == 0:
+            return {'mae': None, 'mse': None, 'r2': None, 'count': 0}
+        if self.y_m2 > 0:
+            r2 = 1.0 - self.squared_error / self.y_m2
+        else:
+            # Constant target, same convention as sklearn's r2_score
+            r2 = 1.0 if self.squared_error == 0 else 0.0
+        return {
+            'mae': self.abs_error / self.count,
+            'mse': self.squared_error / self.count,
+            'r2': r2,
+            'count': self.count,
+        }
+
+
+class SegmentedRegressionMetrics:
+    """Overall running metrics plus one RunningRegressionMetrics per value of each segment column"""
+
+    def __init__(self, segment_columns=SEGMENT_COLUMNS):
+        self.segment_columns = list(segment_columns)
+        self.overall = RunningRegressionMetrics()
+        self.segments = {column: {} for column in self.segment_columns}
+
+    def update(self, y_true, y_pred, segment_values):
+        """`segment_values` maps each segment column to the chunk's values for it"""
+        y_true = np.asarray(y_true, dtype=np.float64)
+        errors = y_true - np.asarray(y_pred, dtype=np.float64)
+        self.overall.update(y_true, y_pred)
+        abs_errors, squared_errors = np.abs(errors), np.square(errors)
+
+        for column in self.segment_columns:
+            if column not in segment_values:
+                continue
+            keys, inverse = np.unique(np.asarray(segment_values[column]), return_inverse=True)
+            # Per-segment sums in one pass each with bincount instead of a Python-level group-by
+            counts = np.bincount(inverse, minlength=keys.size)
+            means = np.bincount(inverse, weights=y_true, minlength=keys.size) / counts
+            m2 = np.bincount(inverse, weights=np.square(y_true - means[inverse]), minlength=keys.size)
+            abs_sums = np.bincount(inverse, weights=abs_errors, minlength=keys.size)
+            squared_sums = np.bincount(inverse, weights=squared_errors, minlength=keys.size)
+            segment = self.segments[column]
+            for i, key in enumerate(keys.tolist()):
+                running = segment.get(key)
+                if running is None:
+                    running = segment[key] = RunningRegressionMetrics()
+                running.add_sums(int(counts[i]), float(abs_sums[i]), float(squared_sums[i]),
+                                 float(means[i]), float(m2[i]))
+
+    def result(self):
+        return {
+            **self.overall.result(),
+            'segments': {
+                column: {str(key): running.result() for key, running in sorted(segment.items())}
+                for column, segment in self.segments.items() if segment
+            },
+        }
+
+
+def _segment_values(values):
+    # Integral floats (e.g. a month column read back with NaNs elsewhere) are reported as "3", not "3.0"
+    values = np.asarray(values)
+    if values.dtype.kind == 'f' and np.all(np.isfinite(values)) and np.all(values == np.floor(values)):
+        return values.astype(np.int64)
+    return values
+
+
+def _evaluate_chunks(predict_fn, chunks, segment_columns, n_jobs):
+    """Accumulate metrics over (X, y, segment values) chunks, predicting up to `n_jobs` chunks at once"""
+    metrics = SegmentedRegressionMetrics(segment_columns)
+
+    def score(chunk):
+        return chunk, predict_fn(chunk[0])
+
+    def accumulate(chunk, predictions):
+        _, y, segments = chunk
+        metrics.update(y, predictions, segments)
+
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        for chunk in chunks:
+            accumulate(*score(chunk))
+        return metrics.result()
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(score, chunk))
+            # Bound the read-ahead so memory stays at a few chunks
+            if len(pending) > n_jobs:
+                accumulate(*pending.popleft().result())
+        while pending:
+            accumulate(*pending.popleft().result())
+    return metrics.result()
+
+
+def evaluate_features(predict_fn, features, segment_columns=SEGMENT_COLUMNS, chunksize=DEFAULT_CHUNK_SIZE,
+                      n_jobs=1):
+    """Score a FeatureSet from the feature store chunk by chunk and accumulate overall and per-segment metrics
+
+    Chunks are slices of the memory-mapped arrays, so nothing is parsed or
+    copied before prediction and the dataset can be much larger than RAM.
+    With `n_jobs > 1` chunks are predicted by a thread pool; the tree engine
+    spends most of its time in NumPy, which releases the GIL. Metrics are
+    accumulated in row order on the calling thread, so the result does not
+    depend on `n_jobs`.
+    """
+    segment_columns = [column for column in segment_columns if column in features]
+    chunks = ((chunk.X, chunk.y, {column: _segment_values(chunk[column]) for column in segment_columns})
+              for chunk in features.chunks(chunksize))
+    return _evaluate_chunks(predict_fn, chunks, segment_columns, n_jobs)
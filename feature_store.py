@@ -0,0 +1,441 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from hashing import file_fingerprint
+from prediction_stats import FEATURE_COLUMNS
+
+TARGET_COLUMN = 'Usage (minutes)'
+DATE_COLUMN = 'Date'
+# 2: arrays can be extended in place and are hashed per appended segment
+FORMAT_VERSION = 2
+DEFAULT_CHUNK_SIZE = 100000
+
+_ARRAY_FILES = {'features': 'features.npy', 'target': 'target.npy', 'dates': 'dates.npy'}
+_ARRAY_DTYPES = {'features': np.float32, 'target': np.float64, 'dates': np.dtype('datetime64[ns]')}
+
+
+def feature_store_path(data_path):
+    """Where the columnar copy of a processed CSV lives, e.g. data/processed_data.features"""
+    return os.path.splitext(data_path)[0] + '.features'
+
+
+class FeatureSet:
+    """Model features as one float32 matrix plus the target and dates, usually memory-mapped
+
+    `X` has one column per name in `columns`, in FEATURE_COLUMNS order, and
+    can be passed to the models as is: sklearn's trees and the compiled
+    engine both evaluate float32 inputs, so predictions are identical to
+    scoring the CSV. `y` (float64) and `dates` (datetime64) are None when
+    the source had no such column. Columns are also available by name
+    (`features['Month']`), so a FeatureSet can be fed to anything that
+    indexes a DataFrame by column.
+    """
+
+    def __init__(self, X, y=None, dates=None, columns=FEATURE_COLUMNS, target_column=TARGET_COLUMN,
+                 manifest=None, start=0):
+        self.X = X
+        self.y = y
+        self.dates = dates
+        self.columns = list(columns)
+        self.target_column = target_column
+        self.manifest = manifest or {}
+        # Position of the first row in the full dataset, for slices
+        self.start = start
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    @property
+    def content_hash(self):
+        return self.manifest.get('content_hash')
+
+    def __contains__(self, name):
+        return (name in self.columns or (name == self.target_column and self.y is not None)
+                or (name == DATE_COLUMN and self.dates is not None))
+
+    def __getitem__(self, name):
+        if name in self.columns:
+            return self.X[:, self.columns.index(name)]
+        if name == self.target_column and self.y is not None:
+            return self.y
+        if name == DATE_COLUMN and self.dates is not None:
+            return self.dates
+        raise KeyError(name)
+
+    def slice(self, start, stop):
+        """Rows [start, stop) as a FeatureSet sharing this one's memory"""
+        return FeatureSet(self.X[start:stop],
+                          self.y[start:stop] if self.y is not None else None,
+                          self.dates[start:stop] if self.dates is not None else None,
+                          self.columns, self.target_column, self.manifest, self.start + start)
+
+    def chunks(self, chunksize=DEFAULT_CHUNK_SIZE):
+        for start in range(0, len(self), chunksize):
+            yield self.slice(start, start + chunksize)
+
+    def frame(self, rows=None, include_target=False, include_date=False):
+        """A DataFrame of the features (and optionally the target and date), indexed by row position
+
+        Without `rows` the feature columns wrap `X` without copying it.
+        """
+        import pandas as pd
+
+        index = np.arange(self.start, self.start + len(self))
+        X, y, dates = self.X, self.y, self.dates
+        if rows is not None:
+            index = index[rows]
+            X = X[rows]
+            y = y[rows] if y is not None else None
+            dates = dates[rows] if dates is not None else None
+        data = pd.DataFrame(X, columns=self.columns, index=index, copy=False)
+        if include_target and y is not None:
+            data[self.target_column] = y
+        if include_date and dates is not None:
+            data[DATE_COLUMN] = dates
+        return data
+
+
+def _read_current(store_path):
+    try:
+        with open(os.path.join(store_path, 'current.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _chain_sha256(previous, segment):
+    """Hash of an array after appending a segment, from the hash before and the segment's own hash"""
+    return segment if previous is None else hashlib.sha256(f"{previous}{segment}".encode()).hexdigest()
+
+
+def _array_sha256(path, segments):
+    """Recompute an array file's hash from its data, one appended segment (of rows) at a time"""
+    with open(path, 'rb') as f:
+        np.lib.format.read_magic(f)
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        chained = None
+        for rows in segments:
+            segment, remaining = hashlib.sha256(), rows * row_bytes
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 24))
+                if not block:
+                    raise ValueError(f"{path} is shorter than its manifest")
+                segment.update(block)
+                remaining -= len(block)
+            chained = _chain_sha256(chained, segment.hexdigest())
+    return chained
+
+
+def open_features(store_path, mmap=True, verify=False):
+    """Open the current version of a feature store, or return None if there is none
+
+    With `mmap` the arrays are memory-mapped read-only, so every stage and
+    API worker shares one copy in the page cache. With `verify` each array
+    file is checked against the hash in the manifest. Only the rows the
+    manifest lists are returned, so rows an append is still writing are
+    never seen.
+    """
+    manifest = _read_current(store_path)
+    if manifest is None or manifest.get('format_version') != FORMAT_VERSION:
+        return None
+    directory = os.path.join(store_path, manifest['directory'])
+    rows = manifest['rows']
+    arrays = {}
+    try:
+        for name, info in manifest['arrays'].items():
+            path = os.path.join(directory, _ARRAY_FILES[name])
+            if verify and _array_sha256(path, info['segments']) != info['sha256']:
+                raise ValueError(f"{path} does not match its manifest")
+            # np.asarray drops the np.memmap subclass (and its per-operation overhead) but keeps the mapping
+            arrays[name] = np.asarray(np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)[:rows])
+    except OSError:
+        # Pruned between reading current.json and opening the files; the caller rebuilds or retries
+        return None
+    return FeatureSet(arrays['features'], arrays.get('target'), arrays.get('dates'),
+                      manifest['columns'], manifest.get('target_column'), manifest)
+
+
+class _NpyAppender:
+    """Appends rows to a .npy file in place and rewrites its header with the new row count
+
+    NumPy pads .npy headers so the row count can grow without moving the
+    data. Anything past `rows` (left by an interrupted append) is dropped
+    first. Only the appended bytes are hashed.
+    """
+
+    def __init__(self, path, rows):
+        self._file = open(path, 'r+b')
+        np.lib.format.read_magic(self._file)
+        shape, _, self.dtype = np.lib.format.read_array_header_1_0(self._file)
+        self.offset = self._file.tell()
+        self.row_shape = tuple(shape[1:])
+        self.row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape, dtype=np.int64))
+        self.rows = rows
+        self.added = 0
+        self._sha256 = hashlib.sha256()
+        self._write_header()
+        self._file.truncate(self.offset + rows * self.row_bytes)
+        self._file.seek(0, os.SEEK_END)
+
+    def _write_header(self):
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(self.dtype),
+                                                      'fortran_order': False,
+                                                      'shape': (self.rows,) + self.row_shape})
+        if header.tell() != self.offset:
+            raise ValueError(f"{self._file.name} cannot grow in place")
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(header.getvalue())
+        self._file.seek(position)
+
+    def write(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        if values.shape[1:] != self.row_shape:
+            raise ValueError(f"expected rows of shape {self.row_shape}, got {values.shape[1:]}")
+        data = values.reshape(-1).view(np.uint8)
+        self._file.write(data)
+        self._sha256.update(data)
+        self.rows += len(values)
+        self.added += len(values)
+
+    def finish(self):
+        """Publish the new row count in the header; returns the hash of the appended rows"""
+        self._write_header()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        return self._sha256.hexdigest()
+
+    def close(self):
+        self._file.close()
+
+
+class FeatureStoreWriter:
+    """Streams feature rows into a store chunk by chunk, so no stage holds the whole dataset in memory
+
+    `create` starts a new version in a temporary directory, creating each
+    array with np.lib.format.open_memmap; `extend` appends to the arrays of
+    the current version in place, so an incremental run only writes and
+    hashes the new rows. Call `write` per chunk, then `publish` to make the
+    rows visible (or `abort` on failure). Array hashes are chained per
+    appended segment, so they never need the earlier rows.
+    """
+
+    def __init__(self, store_path, directory, arrays, columns, target_column, previous=None):
+        self.store_path = store_path
+        self.directory = directory
+        self.columns = list(columns)
+        self.target_column = target_column
+        self.previous = previous
+        self._arrays = arrays
+
+    @classmethod
+    def create(cls, store_path, columns=FEATURE_COLUMNS, target=True, dates=True, target_column=TARGET_COLUMN):
+        os.makedirs(store_path, exist_ok=True)
+        tmp_path = os.path.join(store_path, f"tmp-{os.getpid()}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        shapes = {'features': (len(columns),)}
+        if target:
+            shapes['target'] = ()
+        if dates:
+            shapes['dates'] = ()
+        arrays = {}
+        for name, row_shape in shapes.items():
+            path = os.path.join(tmp_path, _ARRAY_FILES[name])
+            np.lib.format.open_memmap(path, mode='w+', dtype=_ARRAY_DTYPES[name], shape=(0,) + row_shape).flush()
+            arrays[name] = _NpyAppender(path, 0)
+        return cls(store_path, tmp_path, arrays, columns, target_column if target else None)
+
+    @classmethod
+    def extend(cls, store_path, expected_fingerprint, target=True, dates=True):
+        """A writer appending to the current version, or None if there is none, it was not built from a
+        source with `expected_fingerprint`, or it does not have the same arrays"""
+        manifest = _read_current(store_path)
+        if (manifest is None or manifest.get('format_version') != FORMAT_VERSION
+                or manifest['source'].get('fingerprint') != expected_fingerprint
+                or ('target' in manifest['arrays']) != target or ('dates' in manifest['arrays']) != dates):
+            return None
+        directory = os.path.join(store_path, manifest['directory'])
+        arrays = {}
+        try:
+            for name in manifest['arrays']:
+                arrays[name] = _NpyAppender(os.path.join(directory, _ARRAY_FILES[name]), manifest['rows'])
+        except (OSError, ValueError):
+            for appender in arrays.values():
+                appender.close()
+            return None
+        return cls(store_path, directory, arrays, manifest['columns'], manifest.get('target_column'), manifest)
+
+    def write(self, X, y=None, dates=None):
+        self._arrays['features'].write(X)
+        if 'target' in self._arrays:
+            self._arrays['target'].write(y)
+        if 'dates' in self._arrays:
+            self._arrays['dates'].write(dates)
+
+    def abort(self):
+        for appender in self._arrays.values():
+            appender.close()
+        if self.previous is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def publish(self, source_path=None, source_fingerprint=None):
+        """Make the written rows the current version of the store; returns its manifest"""
+        info = {}
+        for name, appender in self._arrays.items():
+            segment = appender.finish()
+            previous = self.previous['arrays'][name] if self.previous is not None else None
+            if previous is not None and appender.added == 0:
+                sha256, segments = previous['sha256'], previous['segments']
+            else:
+                sha256 = _chain_sha256(previous['sha256'] if previous else None, segment)
+                segments = (previous['segments'] if previous else []) + [appender.added]
+            info[name] = {'dtype': str(appender.dtype), 'shape': [appender.rows, *appender.row_shape],
+                          'sha256': sha256, 'segments': segments}
+        content_hash = hashlib.sha256(json.dumps({'columns': self.columns, 'arrays': info},
+                                                 sort_keys=True).encode()).hexdigest()
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'directory': self.previous['directory'] if self.previous is not None else None,
+            'content_hash': content_hash,
+            'rows': info['features']['shape'][0],
+            'columns': self.columns,
+            'target_column': self.target_column,
+            'arrays': info,
+            'source': {'path': source_path, 'fingerprint': source_fingerprint},
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if self.previous is None:
+            manifest['directory'] = self._place_version(content_hash)
+        _write_json(os.path.join(self.store_path, manifest['directory'], 'manifest.json'), manifest)
+
+        previous = _read_current(self.store_path)
+        _write_json(os.path.join(self.store_path, 'current.json'), manifest)
+        keep = {manifest['directory'], previous.get('directory') if previous else None}
+        for name in os.listdir(self.store_path):
+            if name not in keep and name != 'current.json' and not name.startswith(('tmp-', 'current.json.tmp-')):
+                shutil.rmtree(os.path.join(self.store_path, name), ignore_errors=True)
+        return manifest
+
+    def _place_version(self, content_hash):
+        """Rename the temporary directory after the content hash; returns the directory name"""
+        for attempt in range(100):
+            name = content_hash[:16] if attempt == 0 else f"{content_hash[:16]}-{attempt}"
+            directory = os.path.join(self.store_path, name)
+            try:
+                os.rename(self.directory, directory)
+                return name
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+                try:
+                    with open(os.path.join(directory, 'manifest.json')) as f:
+                        existing = json.load(f).get('content_hash')
+                except (OSError, ValueError):
+                    existing = None
+                # Same content already published (e.g. by a concurrent build); a directory that was
+                # extended in place since holds other rows, so the next name is tried
+                if existing == content_hash:
+                    shutil.rmtree(self.directory, ignore_errors=True)
+                    return name
+        raise OSError(f"Could not place a new version in {self.store_path}")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def write_features(store_path, X, y=None, dates=None, columns=FEATURE_COLUMNS, target_column=TARGET_COLUMN,
+                   source_path=None, source_fingerprint=None):
+    """Publish a new version of the feature store from in-memory arrays; returns its manifest
+
+    Each version is written to a temporary directory and renamed to its
+    content hash, then `current.json` is replaced atomically, so readers
+    never see a partial store. Older versions except the previous one are
+    removed; processes still mapping them keep working because unlinked
+    files stay valid on POSIX.
+    """
+    writer = FeatureStoreWriter.create(store_path, columns, target=y is not None, dates=dates is not None,
+                                       target_column=target_column)
+    try:
+        writer.write(X, y, dates)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.publish(source_path, source_fingerprint)
+
+
+def write_features_from_frame(data, store_path, source_path=None):
+    """Publish the feature store for a processed DataFrame, e.g. right after preprocessing wrote its CSV"""
+    return write_features(
+        store_path,
+        data[FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+        data[TARGET_COLUMN].to_numpy(dtype=np.float64) if TARGET_COLUMN in data else None,
+        data[DATE_COLUMN].to_numpy(dtype='datetime64[ns]') if DATE_COLUMN in data else None,
+        source_path=source_path,
+        source_fingerprint=file_fingerprint(source_path) if source_path else None,
+    )
+
+
+def build_features(data_path, store_path=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """Convert a processed CSV to the feature store in one streamed pass; returns the manifest
+
+    Each parsed chunk is written straight to the store's files, so memory
+    does not grow with the size of the CSV.
+    """
+    import pandas as pd
+
+    store_path = store_path or feature_store_path(data_path)
+    # Fingerprint before reading, so a CSV rewritten during the build is seen as stale afterwards
+    fingerprint = file_fingerprint(data_path)
+    header = pd.read_csv(data_path, nrows=0).columns
+    has_target, has_dates = TARGET_COLUMN in header, DATE_COLUMN in header
+    usecols = list(FEATURE_COLUMNS)
+    if has_target:
+        usecols.append(TARGET_COLUMN)
+    if has_dates:
+        usecols.append(DATE_COLUMN)
+
+    writer = FeatureStoreWriter.create(store_path, target=has_target, dates=has_dates)
+    try:
+        for chunk in pd.read_csv(data_path, usecols=usecols, chunksize=chunksize):
+            writer.write(chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+                         chunk[TARGET_COLUMN].to_numpy(dtype=np.float64) if has_target else None,
+                         pd.to_datetime(chunk[DATE_COLUMN]).to_numpy(dtype='datetime64[ns]') if has_dates else None)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.publish(source_path=data_path, source_fingerprint=fingerprint)
+
+
+def load_features(data_path='data/processed_data.csv', store_path=None, mmap=True):
+    """The FeatureSet for a processed CSV, converting the CSV first if the store is missing or stale
+
+    This is the one entry point pipeline stages use to read the processed
+    data. The store is current when it was built from the CSV's present
+    fingerprint; if the CSV is gone the last store is used as is. Raises
+    FileNotFoundError when there is neither.
+    """
+    store_path = store_path or feature_store_path(data_path)
+    fingerprint = file_fingerprint(data_path)
+    manifest = _read_current(store_path)
+    if manifest is not None and (fingerprint is None or manifest['source'].get('fingerprint') == fingerprint):
+        features = open_features(store_path, mmap=mmap)
+        if features is not None:
+            return features
+    if fingerprint is None:
+        raise FileNotFoundError(f"{data_path} does not exist and has no feature store")
+    build_features(data_path, store_path)
+    return open_features(store_path, mmap=mmap)
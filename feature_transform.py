@@ -0,0 +1,93 @@
+import numpy as np
+
+from prediction_stats import FEATURE_COLUMNS
+
+# Raw inputs, in the order the transform expects them
+RAW_COLUMNS = ['Notifications', 'Times Opened', 'DayOfWeek', 'Month']
+SCALED_COLUMNS = ['Notifications', 'Times Opened']
+# Attribute holding the transform (as a plain dict) on a trained model, so it is pickled with it
+MODEL_ATTRIBUTE = 'feature_transform_'
+
+
+class FeatureTransform:
+    """Turns raw inputs into the model's feature matrix in one vectorized pass
+
+    Every raw column is mapped to `X * scale + offset` (identity for the day
+    and month), then the Notifications x Times Opened interaction is computed
+    from the scaled columns. The arithmetic is the same as sklearn's
+    MinMaxScaler followed by multiplying the two columns, so the output is
+    bit-for-bit what preprocessing writes. Inputs are (n_rows, 4) arrays in
+    RAW_COLUMNS order; no pandas is involved.
+    """
+
+    def __init__(self, scale=None, offset=None):
+        self.scale = np.ones(len(RAW_COLUMNS)) if scale is None else np.asarray(scale, dtype=np.float64)
+        self.offset = np.zeros(len(RAW_COLUMNS)) if offset is None else np.asarray(offset, dtype=np.float64)
+        if self.scale.shape != (len(RAW_COLUMNS),) or self.offset.shape != (len(RAW_COLUMNS),):
+            raise ValueError(f"scale and offset need one value per raw column {RAW_COLUMNS}")
+
+    @classmethod
+    def from_min_max(cls, minima, maxima):
+        """The transform scaling SCALED_COLUMNS to [0, 1] given their fitted minima and maxima"""
+        minima = np.asarray(minima, dtype=np.float64)
+        data_range = np.asarray(maxima, dtype=np.float64) - minima
+        # Constant columns keep a scale of 1, as in MinMaxScaler
+        data_range[data_range < 10 * np.finfo(np.float64).eps] = 1.0
+        scale, offset = np.ones(len(RAW_COLUMNS)), np.zeros(len(RAW_COLUMNS))
+        scale[:len(SCALED_COLUMNS)] = 1.0 / data_range
+        offset[:len(SCALED_COLUMNS)] = 0.0 - minima * scale[:len(SCALED_COLUMNS)]
+        return cls(scale, offset)
+
+    @classmethod
+    def fit(cls, raw):
+        """Fit the scaling on raw rows, ignoring missing values"""
+        values = np.asarray(raw, dtype=np.float64)[:, :len(SCALED_COLUMNS)]
+        return cls.from_min_max(np.nanmin(values, axis=0), np.nanmax(values, axis=0))
+
+    @classmethod
+    def from_dict(cls, data):
+        if data is None:
+            return cls()
+        if data.get('raw_columns', RAW_COLUMNS) != RAW_COLUMNS:
+            raise ValueError(f"Feature transform expects raw columns {data['raw_columns']}")
+        return cls(data['scale'], data['offset'])
+
+    def to_dict(self):
+        return {
+            'raw_columns': list(RAW_COLUMNS),
+            'feature_columns': list(FEATURE_COLUMNS),
+            'scale': self.scale.tolist(),
+            'offset': self.offset.tolist(),
+        }
+
+    @property
+    def is_identity(self):
+        return bool(np.all(self.scale == 1.0) and np.all(self.offset == 0.0))
+
+    def transform(self, raw, out=None):
+        """(n_rows, 4) raw inputs -> (n_rows, 5) float64 features, written into `out` if given"""
+        raw = np.asarray(raw, dtype=np.float64)
+        if raw.ndim == 1:
+            raw = raw.reshape(1, -1)
+        if raw.shape[1] != len(RAW_COLUMNS):
+            raise ValueError(f"Expected {len(RAW_COLUMNS)} raw columns {RAW_COLUMNS}, got {raw.shape[1]}")
+        if out is None:
+            out = np.empty((raw.shape[0], len(FEATURE_COLUMNS)), dtype=np.float64)
+        scaled = out[:, :len(RAW_COLUMNS)]
+        np.multiply(raw, self.scale, out=scaled)
+        scaled += self.offset
+        np.multiply(out[:, 0], out[:, 1], out=out[:, 4])
+        return out
+
+    __call__ = transform
+
+
+def attach_transform(model, transform):
+    """Store `transform` on a trained model so it is saved with (and loaded from) the model artifact"""
+    setattr(model, MODEL_ATTRIBUTE, transform.to_dict())
+    return model
+
+
+def model_transform(model):
+    """The transform bundled with a model; identity scaling for models trained before it was bundled"""
+    return FeatureTransform.from_dict(getattr(model, MODEL_ATTRIBUTE, None))
@@ -1,24 +1,37 @@
-import pandas as pd
-import joblib
+import argparse
 import os
 
-# Create directories if they don't exist
-os.makedirs('data', exist_ok=True)
+from bulk_scoring import DEFAULT_SHARD_MB, OUTPUT_DIR, score_file
+from prediction_labels import model_threshold
 
-# Load model and data
-model = joblib.load('models/model.pkl')
-data = pd.read_csv('data/processed_data.csv')
 
-# Define features
-X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
+def main():
+    parser = argparse.ArgumentParser(description='Score the processed dataset into partitioned Parquet files')
+    parser.add_argument('--input', default='data/processed_data.csv')
+    parser.add_argument('--model', default='models/model.pkl')
+    parser.add_argument('--output', default=OUTPUT_DIR, help='Directory for the part-NNNNN.parquet files')
+    parser.add_argument('--threshold', type=float, default=model_threshold(),
+                        help='Predicted minutes above which a row is labelled "Take a break!" (MODEL_THRESHOLD)')
+    parser.add_argument('--shard-mb', type=float, default=float(os.getenv('SCORING_SHARD_MB', DEFAULT_SHARD_MB)),
+                        help='Input megabytes per shard; each shard becomes one part file')
+    parser.add_argument('--n-jobs', type=int, default=int(os.getenv('SCORING_N_JOBS', 0)),
+                        help='Worker processes (0: every core)')
+    parser.add_argument('--restart', action='store_true', help='Rescore every shard instead of resuming')
+    args = parser.parse_args()
 
-# Make predictions
-predictions = model.predict(X)
+    def report(progress):
+        print(f"Shard {progress['shard'] + 1}/{progress['shards']}: {progress['rows']} rows "
+              f"({progress['scored_rows']} so far, {progress['rows_per_second']:,.0f} rows/s)")
 
-# Add predictions to dataset
-data['Predicted_Usage'] = predictions
-data['Notification'] = data['Predicted_Usage'].apply(lambda x: "Take a break!" if x > 60 else "All good!")
+    summary = score_file(args.input, args.model, args.output, threshold=args.threshold, shard_mb=args.shard_mb,
+                         n_jobs=args.n_jobs, resume=not args.restart, on_shard=report)
+    if summary['resumed_shards']:
+        print(f"Resumed: {summary['resumed_shards']} of {summary['shards']} shards "
+              f"({summary['resumed_rows']} rows) were already scored")
+    print(f"Scored {summary['scored_rows']} rows in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:,.0f} rows/s) at threshold {summary['threshold']:g}")
+    print(f"Predictions saved to {args.output}")
 
-# Save predictions
-data.to_csv('data/predictions.csv', index=False)
-print("Predictions saved to data/predictions.csv")
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
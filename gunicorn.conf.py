@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+import shutil
+
+# Production serving: a pre-fork pool of threaded workers.
+# Every worker memory-maps the compiled model arrays (models/model.compiled/)
+# read-only, so the tree data lives once in the page cache however many
+# workers run. The app is deliberately not preloaded in the master: each
+# worker keeps its own model watcher and hot reloads keep sharing pages.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+# Admission control (auth.AdmissionController) runs at most GUNICORN_THREADS requests per worker
+# and splits the rate limits between the workers. The extra threads hold requests waiting for a
+# slot, so queueing and load shedding happen where the controller sees them rather than unseen
+# in gunicorn's backlog.
+os.environ['ADMISSION_PROCESSES'] = str(workers)
+os.environ.setdefault('ADMISSION_MAX_IN_FLIGHT', str(threads))
+threads = int(os.environ['ADMISSION_MAX_IN_FLIGHT']) + int(os.getenv('ADMISSION_QUEUE_THREADS', threads))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+preload_app = False
+accesslog = '-'
+
+# Each worker writes its metric totals here and /api/metrics sums them, so a scrape
+# answered by any worker reports the whole server (see metrics.MetricsRegistry)
+os.environ.setdefault('METRICS_DIR', os.path.join('monitoring', 'metrics_workers'))
+
+
+def on_starting(server):
+    # Totals from a previous server run would otherwise be added to this one's
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
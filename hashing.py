@@ -0,0 +1,36 @@
+import hashlib
+import os
+
+
+def file_fingerprint(path):
+    """Cheap fingerprint of a file (mtime and size), or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def file_sha256(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in blocks so large files are never fully loaded"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sources_sha256(paths):
+    """One SHA-256 over the contents of several source files, e.g. the code a pipeline stage runs"""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode())
+        digest.update(file_sha256(path).encode())
+    return digest.hexdigest()
+
+
+def content_key(*parts):
+    """SHA-256 of JSON-serializable parts (hashes, parameters, versions), stable across processes and runs"""
+    import json
+
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,271 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, from 50 µs (a cached single-row prediction) up to 10 s (a cold model-range scan)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'app_requests_total': ('counter', 'HTTP requests by route, method and status code'),
+    'app_request_errors_total': ('counter', 'HTTP requests that ended with a 5xx status'),
+    'app_admission_total': ('counter', 'Admission control decisions by endpoint and outcome'),
+    'app_request_duration_seconds': ('histogram', 'Time from the start of the request to the response'),
+    'app_stage_duration_seconds': ('histogram', 'Time spent in each stage of a request handler'),
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; `counts[i]` holds observations <= buckets[i], the last slot is +Inf"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket holding the q-th observation"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+
+class StageTimer:
+    """Records the time since the previous mark (or creation) under each stage name"""
+
+    __slots__ = ('registry', 'route', '_last')
+
+    def __init__(self, registry, route):
+        self.registry = registry
+        self.route = route
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.registry.observe('app_stage_duration_seconds', now - self._last, route=self.route, stage=stage)
+        self._last = now
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Counters and latency histograms, rendered in the Prometheus text format
+
+    Every update is a dict lookup and a few additions under one lock. When the
+    registry is disabled `timer` returns a no-op timer and the app skips
+    request timing entirely.
+
+    Under a pre-fork server each worker process has its own registry. With
+    `shared_dir` set, a background thread writes this process's totals to
+    `shared_dir/metrics-<pid>-<start>.json` every `flush_interval` seconds,
+    and `render` sums the files of every worker, so a scrape answered by any
+    worker returns the totals of the whole server. Files of exited workers
+    are kept, so counters never go backwards while the server runs; the
+    directory is emptied when the server starts.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS, shared_dir=None, flush_interval=1.0):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.shared_dir = shared_dir
+        self.flush_interval = float(flush_interval)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._shared_path = None
+        self._flusher = None
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+        if self.shared_dir is not None and self._flusher is None:
+            self._start_flusher()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+            self._dirty = True
+        if self.shared_dir is not None and self._flusher is None:
+            self._start_flusher()
+
+    def timer(self, route):
+        return StageTimer(self, route) if self.enabled else NULL_TIMER
+
+    def record_request(self, route, method, status, duration):
+        self.inc('app_requests_total', route=route, method=method, status=str(status))
+        if status >= 500:
+            self.inc('app_request_errors_total', route=route, method=method)
+        self.observe('app_request_duration_seconds', duration, route=route, method=method)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._dirty = True
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _state(self):
+        return ({key: value for key, value in self._counters.items()},
+                {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()})
+
+    def flush(self):
+        """Write this process's totals to its file in `shared_dir`, if anything changed since the last write"""
+        if self.shared_dir is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            counters, histograms = self._state()
+            if self._shared_path is None:
+                os.makedirs(self.shared_dir, exist_ok=True)
+                # The start time keeps a recycled pid from overwriting an exited worker's totals
+                self._shared_path = os.path.join(self.shared_dir, f"metrics-{os.getpid()}-{time.time_ns()}.json")
+        state = {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), counts, total, count]
+                           for (name, labels), (counts, total, count) in histograms.items()],
+        }
+        tmp_path = f"{self._shared_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._shared_path)
+
+    def _merged_state(self):
+        """Totals summed over every worker's file, after writing this process's latest ones"""
+        if self.shared_dir is None:
+            with self._lock:
+                return self._state()
+        self.flush()
+        counters, histograms = {}, {}
+        for path in glob.glob(os.path.join(self.shared_dir, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in state['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, counts, total, count in state['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = (list(counts), total, count)
+                else:
+                    histograms[key] = ([a + b for a, b in zip(merged[0], counts)], merged[1] + total,
+                                       merged[2] + count)
+        return counters, histograms
+
+    def snapshot(self):
+        """Counters and histogram summaries as plain dicts, e.g. for tests and JSON endpoints"""
+        with self._lock:
+            counters = {(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {}
+            for (name, labels), histogram in self._histograms.items():
+                histograms[(name, labels)] = {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                }
+        return {"counters": counters, "histograms": histograms}
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4), summed over every worker when `shared_dir` is set"""
+        counters, histograms = self._merged_state()
+        counters = sorted(counters.items())
+        histograms = sorted(((key, counts, total, count) for key, (counts, total, count) in histograms.items()),
+                            key=lambda item: item[0])
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name in described or name not in METRIC_HELP:
+                return
+            described.add(name)
+            kind, text = METRIC_HELP[name]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), counts, total, count in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
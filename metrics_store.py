@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialized within the process only
+    fcntl = None
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# One sparse index entry per block of the log
+DEFAULT_INDEX_BLOCK = 64 * 1024
+# Compact once the log has doubled since the last compaction, but never below this size
+DEFAULT_COMPACT_MIN_BYTES = 1024 * 1024
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class MetricsStore:
+    """Append-only JSONL store of monitoring records with a sparse time index
+
+    Records are kept sorted by their `timestamp` field. The log is the file at `path`,
+    with one JSON record per line. The index at `path.idx` starts with a header line.
+    The header holds the log's inode and its size after the last compaction. Each
+    following line holds a (timestamp, byte offset) pair, one per `index_block` bytes
+    of log.
+
+    - Appends hold an exclusive lock on `path.lock`, so concurrent writers in
+      different processes cannot interleave lines.
+    - Readers take no lock. They use the index only when its inode matches the log,
+      so a compaction that is still being swapped in cannot mislead them.
+    - A time-range query seeks to the last index entry before `start`. It stops at
+      the first record after `end`, so recent ranges never read the full history.
+    - Compaction rewrites the log atomically. It drops records older than
+      `retention_days` and rebuilds the index. It runs when the log has doubled in
+      size since the last compaction, or when an append arrives out of time order.
+    """
+
+    def __init__(self, path, index_block=DEFAULT_INDEX_BLOCK, compact_min_bytes=DEFAULT_COMPACT_MIN_BYTES,
+                 retention_days=None):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.lock_path = f"{path}.lock"
+        self.index_block = int(index_block)
+        self.compact_min_bytes = int(compact_min_bytes)
+        self.retention_days = retention_days
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with _thread_lock(self.path):
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ----- index -----
+
+    def _read_index(self):
+        """Return (header, timestamps, offsets), or None if the index is missing or belongs to another log"""
+        try:
+            inode = os.stat(self.path).st_ino
+            with open(self.index_path, 'r') as f:
+                header = json.loads(f.readline())
+                if header.get('inode') != inode:
+                    return None
+                timestamps, offsets = [], []
+                for line in f:
+                    timestamp, offset = line.rstrip('\n').split('\t')
+                    timestamps.append(timestamp)
+                    offsets.append(int(offset))
+        except (OSError, ValueError):
+            return None
+        return header, timestamps, offsets
+
+    def _write_index(self, log_path, entries, compacted_size):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({"inode": os.stat(log_path).st_ino, "compacted_size": compacted_size}) + '\n')
+            f.writelines(f"{timestamp}\t{offset}\n" for timestamp, offset in entries)
+        os.replace(tmp_path, self.index_path)
+
+    def _index_entries(self, lines):
+        """Sparse index entries for a sequence of encoded log lines"""
+        entries = []
+        offset = 0
+        last_block = -1
+        for line in lines:
+            if offset // self.index_block != last_block:
+                entries.append((json.loads(line)['timestamp'], offset))
+                last_block = offset // self.index_block
+            offset += len(line)
+        return entries
+
+    def _rebuild_index(self, compacted_size=0):
+        with open(self.path, 'rb') as f:
+            entries = self._index_entries(f)
+        self._write_index(self.path, entries, compacted_size)
+
+    # ----- writing -----
+
+    @staticmethod
+    def _encode(record):
+        if 'timestamp' not in record:
+            record = {'timestamp': datetime.now().strftime(TIMESTAMP_FORMAT), **record}
+        return (json.dumps(record, default=float) + '\n').encode()
+
+    def _last_timestamp(self, f, size):
+        """Timestamp of the last record, reading backwards from the end of the open log"""
+        position = size
+        data = b''
+        while position > 0 and data.count(b'\n') < 2:
+            read_size = min(4096, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+        lines = data.splitlines()
+        return json.loads(lines[-1])['timestamp'] if lines else None
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append records atomically with respect to other writers"""
+        lines = [self._encode(record) for record in records]
+        if not lines:
+            return
+        with self._locked():
+            index = self._read_index() if os.path.exists(self.path) else None
+            if os.path.exists(self.path) and index is None:
+                self._rebuild_index()
+                index = self._read_index()
+            header, timestamps, offsets = index if index else ({"compacted_size": 0}, [], [])
+
+            with open(self.path, 'ab+') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                previous = self._last_timestamp(f, size) if size else None
+                in_order = True
+                new_entries = []
+                offset = size
+                last_block = offsets[-1] // self.index_block if offsets else -1
+                for line in lines:
+                    timestamp = json.loads(line)['timestamp']
+                    if previous is not None and timestamp < previous:
+                        in_order = False
+                    previous = timestamp
+                    if offset // self.index_block != last_block:
+                        new_entries.append((timestamp, offset))
+                        last_block = offset // self.index_block
+                    offset += len(line)
+                # One write call per batch; O_APPEND keeps it contiguous
+                f.write(b''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+            if index is None:
+                self._write_index(self.path, new_entries, 0)
+            elif new_entries:
+                with open(self.index_path, 'a') as f:
+                    f.writelines(f"{timestamp}\t{entry_offset}\n" for timestamp, entry_offset in new_entries)
+
+            if not in_order or offset >= max(self.compact_min_bytes, 2 * header.get('compacted_size', 0)):
+                self._compact_locked()
+
+    def compact(self):
+        """Sort the log, apply retention and rebuild the index"""
+        with self._locked():
+            if os.path.exists(self.path):
+                self._compact_locked()
+
+    def _compact_locked(self):
+        with open(self.path, 'rb') as f:
+            records = [(json.loads(line)['timestamp'], line) for line in f if line.strip()]
+        records.sort(key=lambda item: item[0])
+        if self.retention_days is not None:
+            cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime(TIMESTAMP_FORMAT)
+            records = [item for item in records if item[0] >= cutoff]
+        lines = [line if line.endswith(b'\n') else line + b'\n' for _, line in records]
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        # Swap the index first: until the log is replaced its inode will not match, so readers scan
+        self._write_index(tmp_path, self._index_entries(lines), sum(len(line) for line in lines))
+        os.replace(tmp_path, self.path)
+
+    def migrate_json(self, json_path):
+        """Import a legacy model_metrics.json history once; returns the number of records imported"""
+        if os.path.exists(self.path) or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                history = json.load(f)
+        except ValueError:
+            history = []
+        with self._locked():
+            if os.path.exists(self.path):
+                return 0
+            history = sorted(history, key=lambda record: record.get('timestamp', ''))
+            lines = [self._encode(record) for record in history]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(lines))
+            self._write_index(tmp_path, self._index_entries(lines), sum(len(line) for line in lines))
+            os.replace(tmp_path, self.path)
+        return len(history)
+
+    # ----- reading -----
+
+    def read(self, start=None, end=None):
+        """Records with start <= timestamp <= end (timestamps as strings in TIMESTAMP_FORMAT), oldest first"""
+        if not os.path.exists(self.path):
+            return []
+        offset = 0
+        if start is not None:
+            index = self._read_index()
+            if index is not None:
+                _, timestamps, offsets = index
+                # Last block that starts before `start`; earlier blocks only hold older records
+                position = bisect_left(timestamps, start) - 1
+                if position >= 0:
+                    offset = offsets[position]
+
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                timestamp = record.get('timestamp', '')
+                if end is not None and timestamp > end:
+                    break
+                if start is None or timestamp >= start:
+                    records.append(record)
+        return records
+
+    def tail(self, n):
+        """The last `n` records, reading backwards from the end of the log"""
+        if n <= 0 or not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            while position > 0 and data.count(b'\n') <= n:
+                read_size = min(65536, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+        lines = [line for line in data.splitlines() if line.strip()]
+        if position > 0:
+            lines = lines[1:]  # the first line may be partial
+        return [json.loads(line) for line in lines[-n:]]
@@ -0,0 +1,114 @@
+import copy
+import io
+import time
+
+import numpy as np
+
+from tree_engine import try_compile_forest
+
+DEFAULT_SINGLE_CALLS = 500
+DEFAULT_BATCH_ROWS = 1000
+DEFAULT_BATCH_REPEATS = 5
+
+
+def serialized_bytes(model):
+    """The model pickled the way publish_model writes it"""
+    import joblib
+
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getvalue()
+
+
+def measure_serving_cost(model, X, single_calls=DEFAULT_SINGLE_CALLS, batch_rows=DEFAULT_BATCH_ROWS,
+                         batch_repeats=DEFAULT_BATCH_REPEATS):
+    """Inference latency, size and load time of a model, measured the way the API serves it
+
+    Predictions go through the compiled engine when the model compiles (as in
+    the API), otherwise through model.predict. `X` is a sample of feature
+    rows: single-row latency cycles through its rows, batch latency scores
+    its first `batch_rows` rows. Returns a flat dict of floats, ready to log
+    as MLflow metrics.
+    """
+    import joblib
+
+    X = np.asarray(X, dtype=np.float64)
+    engine = try_compile_forest(model)
+    predict = engine.predict if engine is not None else model.predict
+
+    predict(X[:1])  # warm up
+    single = np.empty(single_calls)
+    for i in range(single_calls):
+        row = X[i % len(X):i % len(X) + 1]
+        started = time.perf_counter()
+        predict(row)
+        single[i] = time.perf_counter() - started
+
+    batch = X[:batch_rows]
+    batch_seconds = np.empty(batch_repeats)
+    for i in range(batch_repeats):
+        started = time.perf_counter()
+        predict(batch)
+        batch_seconds[i] = time.perf_counter() - started
+
+    data = serialized_bytes(model)
+    started = time.perf_counter()
+    joblib.load(io.BytesIO(data))
+    load_seconds = time.perf_counter() - started
+
+    compiled_bytes = 0
+    if engine is not None:
+        compiled_bytes = sum(array.nbytes for array in (engine.feature, engine.threshold, engine.children,
+                                                        engine.value, engine.roots))
+    return {
+        'latency_single_p50_us': float(np.percentile(single, 50) * 1e6),
+        'latency_single_p99_us': float(np.percentile(single, 99) * 1e6),
+        'latency_batch_ms': float(np.median(batch_seconds) * 1e3),
+        'latency_batch_per_row_us': float(np.median(batch_seconds) / len(batch) * 1e6),
+        'size_mb': len(data) / 1024 / 1024,
+        'compiled_size_mb': compiled_bytes / 1024 / 1024,
+        'load_seconds': load_seconds,
+        'n_trees': float(len(getattr(model, 'estimators_', [model]))),
+    }
+
+
+def budget_violations(cost, max_p99_us=None, max_size_mb=None):
+    """Human-readable reasons a measured model is over budget; empty when it fits"""
+    violations = []
+    if max_p99_us is not None and cost['latency_single_p99_us'] > max_p99_us:
+        violations.append(f"p99 {cost['latency_single_p99_us']:.0f} us > {max_p99_us:g} us")
+    if max_size_mb is not None and cost['size_mb'] > max_size_mb:
+        violations.append(f"size {cost['size_mb']:.2f} MB > {max_size_mb:g} MB")
+    return violations
+
+
+def trim_forest(model, n_trees):
+    """A copy of a fitted forest keeping only its first `n_trees` trees
+
+    The trees of a random forest are independent, so a prefix is itself a
+    valid (smaller, slightly less accurate) forest.
+    """
+    trimmed = copy.copy(model)
+    trimmed.estimators_ = model.estimators_[:n_trees]
+    trimmed.n_estimators = len(trimmed.estimators_)
+    return trimmed
+
+
+def trim_to_budget(model, X, max_p99_us=None, max_size_mb=None, **measure_kwargs):
+    """The largest prefix of a forest that fits the budget; returns (model, cost) or (None, None)
+
+    Size and latency grow with the number of trees, so the tree count is
+    found by binary search, measuring only O(log n_trees) prefixes.
+    """
+    low, high = 1, len(model.estimators_)
+    best = (None, None)
+    while low <= high:
+        n_trees = (low + high) // 2
+        candidate = trim_forest(model, n_trees)
+        cost = measure_serving_cost(candidate, X, **measure_kwargs)
+        if budget_violations(cost, max_p99_us, max_size_mb):
+            high = n_trees - 1
+        else:
+            best = (candidate, cost)
+            low = n_trees + 1
+    return best
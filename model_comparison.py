@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from evaluation import evaluate_features
+from feature_store import FeatureSet, load_features
+from hashing import file_fingerprint, file_sha256
+from model_registry import ModelRegistry
+from prediction_stats import load_model_metadata, save_model_metadata
+
+MODELS_DIR = 'models/versions'
+CACHE_DIR = 'models/comparison_cache'
+# Read by the dashboard
+COMPARISON_PATH = 'models/model_comparison.json'
+HOLDOUT_SIZE = 0.2
+HOLDOUT_SEED = 42
+
+
+def holdout_mask(rows, test_size=HOLDOUT_SIZE, seed=HOLDOUT_SEED):
+    """True for the rows (positions in the processed dataset) that belong to the fixed holdout
+
+    Each row's side comes from a hash of its own position, so it does not
+    change when incremental preprocessing appends rows or when a job only
+    looks at a window of the data. scripts/train.py tests on these rows and
+    never fits them, and retraining scores candidates on them, so every
+    version is compared on rows it was not trained on.
+    """
+    # splitmix64 of the position; numpy wraps uint64 arithmetic silently
+    z = np.asarray(rows, dtype=np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 % 2 ** 64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)) < np.uint64(int(test_size * 2 ** 53))
+
+
+def holdout_rows(n_rows, test_size=HOLDOUT_SIZE, seed=HOLDOUT_SEED):
+    """Row positions of the fixed holdout in a dataset of `n_rows` rows"""
+    return np.flatnonzero(holdout_mask(np.arange(n_rows), test_size, seed))
+
+
+def _version_name(model_file):
+    return model_file.replace('model_', '').replace('.pkl', '')
+
+
+def _model_hashes(paths, cache_dir):
+    """SHA-256 per model file, re-hashing only files whose fingerprint changed since the last run"""
+    index_path = os.path.join(cache_dir, 'hashes.json')
+    index = load_model_metadata(index_path)
+    hashes, changed = {}, False
+    for path in paths:
+        fingerprint = file_fingerprint(path)
+        entry = index.get(path)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            entry = {'fingerprint': fingerprint, 'sha256': file_sha256(path)}
+            index[path] = entry
+            changed = True
+        hashes[path] = entry['sha256']
+    if changed:
+        save_model_metadata(index_path, {path: entry for path, entry in index.items() if path in hashes})
+    return hashes
+
+
+def _cache_path(cache_dir, model_sha256, dataset_hash, scope):
+    return os.path.join(cache_dir, f"{model_sha256[:16]}-{dataset_hash[:16]}-{scope}.json")
+
+
+def evaluate_version(model_path, data_path, holdout=False):
+    """Metrics of one pickled model on the dataset (or its holdout), scored with the compiled engine"""
+    import joblib
+    from tree_engine import make_predict_fn
+
+    features = load_features(data_path)
+    if holdout:
+        rows = holdout_rows(len(features))
+        features = FeatureSet(features.X[rows], features.y[rows], None, features.columns,
+                              features.target_column, features.manifest)
+    started = datetime.now()
+    model = joblib.load(model_path)
+    result = evaluate_features(make_predict_fn(model), features, segment_columns=())
+    result.pop('segments', None)
+    result['seconds'] = (datetime.now() - started).total_seconds()
+    return result
+
+
+def _try_evaluate_version(model_path, data_path, holdout):
+    # One unreadable pickle (e.g. from an incompatible sklearn) must not abort the whole comparison
+    try:
+        return evaluate_version(model_path, data_path, holdout)
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"}
+
+
+def compare_versions(data_path='data/processed_data.csv', models_dir=MODELS_DIR, holdout=False, n_jobs=None,
+                     cache_dir=CACHE_DIR, output_path=COMPARISON_PATH):
+    """Score every model version on the same data and write the results for the dashboard
+
+    Results are cached per (model file SHA-256, dataset content hash,
+    full/holdout), so a run only scores versions it has not seen with this
+    exact data. The rest are scored in a pool of `n_jobs` processes (every
+    core when None or <= 0), each memory-mapping the feature store. With
+    `holdout` only the fixed holdout rows are scored, which also keeps
+    versions trained on the rest of the data from being judged on their
+    own training rows. A version that cannot be loaded gets an 'error'
+    instead of metrics. Returns the report written to `output_path`.
+    """
+    model_files = sorted(f for f in os.listdir(models_dir) if f.endswith('.pkl')) if os.path.isdir(models_dir) else []
+    features = load_features(data_path)
+    scope = 'holdout' if holdout else 'full'
+    dataset_hash = features.content_hash
+    os.makedirs(cache_dir, exist_ok=True)
+
+    paths = [os.path.join(models_dir, model_file) for model_file in model_files]
+    hashes = _model_hashes(paths, cache_dir)
+    results, missing = {}, []
+    for path in paths:
+        cached = load_model_metadata(_cache_path(cache_dir, hashes[path], dataset_hash, scope))
+        if cached:
+            results[path] = {**cached, 'cached': True}
+        else:
+            missing.append(path)
+
+    if missing:
+        if n_jobs is None or n_jobs <= 0:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = min(n_jobs, len(missing))
+        if n_jobs == 1:
+            scored = [_try_evaluate_version(path, data_path, holdout) for path in missing]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                scored = list(pool.map(_try_evaluate_version, missing, [data_path] * len(missing),
+                                       [holdout] * len(missing)))
+        for path, result in zip(missing, scored):
+            # Failures are not cached, so they are retried on the next run
+            if 'error' not in result:
+                save_model_metadata(_cache_path(cache_dir, hashes[path], dataset_hash, scope), result)
+            results[path] = {**result, 'cached': False}
+
+    # Stages come from the registry index next to the versions folder, so no pickle is opened for them
+    registry = ModelRegistry(os.path.join(os.path.dirname(os.path.abspath(models_dir)), 'registry.json'), models_dir)
+    versions = []
+    for path in paths:
+        version = _version_name(os.path.basename(path))
+        entry = registry.get(version)
+        versions.append({
+            'version': version,
+            'file': path,
+            'sha256': hashes[path],
+            'stage': entry['stage'] if entry is not None and entry['sha256'] == hashes[path] else None,
+            **results[path],
+        })
+    scored = [v for v in versions if 'error' not in v]
+    report = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'dataset': {'path': data_path, 'content_hash': dataset_hash, 'scope': scope,
+                    'rows': scored[0]['count'] if scored else None},
+        'versions': versions,
+        'best_mae': min(scored, key=lambda v: v['mae'])['version'] if scored else None,
+        'best_r2': max(scored, key=lambda v: v['r2'])['version'] if scored else None,
+    }
+    if output_path:
+        save_model_metadata(output_path, report)
+    return report
@@ -0,0 +1,318 @@
+import io
+import os
+import shutil
+import threading
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from feature_transform import MODEL_ATTRIBUTE, FeatureTransform, model_transform
+from hashing import file_fingerprint, file_sha256
+from tree_engine import try_compile_forest, load_compiled_forest
+
+logger = logging.getLogger(__name__)
+
+# Synthetic rows spanning the processed feature space, used to warm up a freshly loaded model
+WARMUP_ROWS = np.array([
+    [0.0, 0.0, 0, 1, 0.0],
+    [0.25, 0.5, 2, 4, 0.125],
+    [0.5, 0.5, 3, 6, 0.25],
+    [1.0, 1.0, 6, 12, 1.0],
+], dtype=np.float64)
+
+
+def compiled_artifact_path(model_path, sha256):
+    """Where the compiled arrays for a model pickle are cached, e.g. models/model.compiled/<sha256>"""
+    return os.path.join(os.path.splitext(model_path)[0] + '.compiled', sha256)
+
+
+def publish_compiled_model(model, model_path, sha256):
+    """Compile `model` and write its arrays where workers serving `model_path` will map them
+
+    Returns the artifact directory, or None if the model cannot be compiled.
+    Older artifacts are removed; processes still mapping them keep working
+    because unlinked files stay valid on POSIX.
+    """
+    engine = try_compile_forest(model)
+    if engine is None:
+        return None
+    path = compiled_artifact_path(model_path, sha256)
+    # The feature transform travels with the arrays, so serving from them never needs the pickle
+    engine.save(path, source_sha256=sha256, feature_transform=getattr(model, MODEL_ATTRIBUTE, None))
+    parent = os.path.dirname(path)
+    for name in os.listdir(parent):
+        if name != sha256 and '.tmp-' not in name:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    return path
+
+
+def publish_model(model, model_path, before_swap=None):
+    """Write a trained model to `model_path` for running APIs to hot-reload; returns its sha256
+
+    The pickle goes to a temporary file that is renamed into place, so the
+    watcher never loads a half-written file. The compiled arrays are
+    published first, and `before_swap(sha256)` can write anything else that
+    must already be in place when the new model is picked up (metadata,
+    drift profile).
+    """
+    import joblib
+
+    tmp_path = f"{model_path}.tmp"
+    joblib.dump(model, tmp_path)
+    sha256 = file_sha256(tmp_path)
+    # Publish the memory-mappable compiled arrays so API workers never have to unpickle the forest
+    publish_compiled_model(model, model_path, sha256)
+    if before_swap is not None:
+        before_swap(sha256)
+    os.replace(tmp_path, model_path)
+    return sha256
+
+
+def load_pickled_model(path, expected_sha256=None):
+    """Unpickle a model, optionally checking that the file still has the expected contents"""
+    import hashlib
+    import joblib
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if expected_sha256 is not None and hashlib.sha256(data).hexdigest() != expected_sha256:
+        raise RuntimeError(f"{path} changed since it was loaded")
+    return joblib.load(io.BytesIO(data))
+
+
+class LoadedModel:
+    """An immutable snapshot of a loaded model, its compiled engine and its feature transform
+
+    Requests grab the current snapshot once and use it until they finish, so
+    swapping in a new snapshot never affects in-flight requests. When the
+    engine came from the compiled-array cache the sklearn model is only
+    unpickled on first access through `model_loader`. `transform` turns raw
+    request inputs into model features and defaults to the one bundled with
+    `model`.
+    """
+
+    def __init__(self, model, engine, version, path, loaded_at, load_seconds, sha256=None, model_loader=None,
+                 transform=None):
+        self._model = model
+        self._model_loader = model_loader
+        self._model_lock = threading.Lock()
+        self.engine = engine
+        self.version = version
+        self.sha256 = sha256
+        self.path = path
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+        self.transform = transform if transform is not None else model_transform(model)
+
+    @property
+    def model(self):
+        if self._model is None and self._model_loader is not None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._model_loader()
+        return self._model
+
+    def predict(self, X):
+        if self.engine is not None:
+            return self.engine.predict(X)
+        return self.model.predict(X)
+
+    def features(self, raw):
+        """The (n_rows, 5) feature matrix for (n_rows, 4) raw inputs"""
+        return self.transform.transform(raw)
+
+    def info(self):
+        return {
+            "version": self.version,
+            "sha256": self.sha256,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4),
+            "compiled": self.engine is not None,
+            "feature_scaling": not self.transform.is_identity,
+        }
+
+
+class ModelManager:
+    """Owns the serving model and hot-swaps it when the model file changes
+
+    A new model is loaded, compiled and warmed up off the request path, then
+    published with a single reference assignment. The watcher only reloads
+    once the file fingerprint has been stable for one polling interval, so a
+    model that is still being written is never picked up half-way.
+    """
+
+    def __init__(self, model_path, compile_model=True, warmup_rounds=3, resolve_path=None):
+        self.model_path = model_path
+        # Optional callable returning the file to serve, re-evaluated on every reload and poll
+        # (e.g. the registry's production version), so switching files is picked up like a change
+        self.resolve_path = resolve_path
+        self.compile_model = compile_model
+        self.warmup_rounds = warmup_rounds
+        self._current = None
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self._failed_version = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def add_listener(self, callback):
+        """Register callback(new_snapshot, old_snapshot), called after every swap"""
+        self._listeners.append(callback)
+
+    def _load_compiled(self, sha256):
+        """Memory-map the cached compiled arrays if they were built from this exact model file
+
+        Returns (engine, transform), or None if there is no usable artifact;
+        artifacts written before the transform was bundled are rebuilt.
+        """
+        path = compiled_artifact_path(self.model_path, sha256)
+        if not os.path.isdir(path):
+            return None
+        try:
+            engine, metadata = load_compiled_forest(path, mmap=True)
+            if metadata.get('source_sha256') != sha256 or 'feature_transform' not in metadata:
+                return None
+            return engine, FeatureTransform.from_dict(metadata['feature_transform'])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable compiled model {path}: {str(e)}")
+            return None
+
+
+    def _load_snapshot(self, version):
+        start = time.perf_counter()
+        sha256 = file_sha256(self.model_path)
+        model = None
+        compiled = self._load_compiled(sha256) if self.compile_model else None
+        if compiled is None:
+            # Checked against the hash above, so a file replaced in between is never cached under the old hash
+            model = load_pickled_model(self.model_path, expected_sha256=sha256)
+            compiled = (None, None)
+            if self.compile_model:
+                try:
+                    publish_compiled_model(model, self.model_path, sha256)
+                except Exception as e:
+                    logger.warning(f"Could not cache compiled model: {str(e)}")
+                # Serve from the mapped files so this process shares pages with the other workers
+                compiled = self._load_compiled(sha256) or (try_compile_forest(model), None)
+        engine, transform = compiled
+
+        model_path = self.model_path
+        snapshot = LoadedModel(model, engine, version, model_path,
+                               loaded_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                               load_seconds=0.0, sha256=sha256,
+                               model_loader=lambda: load_pickled_model(model_path, expected_sha256=sha256),
+                               transform=transform)
+        self._warm_up(snapshot)
+        snapshot.load_seconds = time.perf_counter() - start
+        return snapshot
+
+    def _warm_up(self, snapshot):
+        if snapshot.engine is not None:
+            n_features = snapshot.engine.n_features or WARMUP_ROWS.shape[1]
+        else:
+            n_features = getattr(snapshot.model, 'n_features_in_', WARMUP_ROWS.shape[1])
+        if n_features != WARMUP_ROWS.shape[1]:
+            return
+        for _ in range(self.warmup_rounds):
+            snapshot.predict(WARMUP_ROWS[:1])
+            snapshot.predict(WARMUP_ROWS)
+
+    def swap(self, model, version=None, compile_model=None):
+        """Publish an already loaded model, e.g. one trained in-process"""
+        if compile_model is None:
+            compile_model = self.compile_model
+        engine = try_compile_forest(model) if compile_model else None
+        snapshot = LoadedModel(model, engine, version, self.model_path,
+                               loaded_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                               load_seconds=0.0)
+        self._publish(snapshot)
+        return snapshot
+
+    def _publish(self, snapshot):
+        previous = self._current
+        self._current = snapshot
+        for callback in self._listeners:
+            try:
+                callback(snapshot, previous)
+            except Exception as e:
+                logger.error(f"Model swap listener failed: {str(e)}")
+
+    def reload(self, force=False):
+        """Load the model file if it changed (or always with force); returns True if a new model was swapped in"""
+        with self._reload_lock:
+            if self.resolve_path is not None:
+                self.model_path = self.resolve_path()
+            version = file_fingerprint(self.model_path)
+            if version is None:
+                if self._current is None:
+                    logger.error(f"Model file not found at {self.model_path}")
+                return False
+            if (not force and self._current is not None and self._current.version == version
+                    and self._current.path == self.model_path):
+                return False
+            try:
+                snapshot = self._load_snapshot(version)
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = str(e)
+                self._failed_version = version
+                logger.error(f"Error loading model: {str(e)}")
+                return False
+            self._publish(snapshot)
+            self.reloads += 1
+            self.last_error = None
+            logger.info(f"Model {version} loaded in {snapshot.load_seconds:.3f}s")
+            return True
+
+    def start_watcher(self, interval=5.0):
+        """Poll the model file in a daemon thread and hot-swap when it changes"""
+        if self._watcher is not None or interval <= 0:
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
+            self._watcher = None
+
+    def _watch(self, interval):
+        pending = None
+        while not self._stop_watching.wait(interval):
+            path = self.resolve_path() if self.resolve_path is not None else self.model_path
+            fingerprint = file_fingerprint(path)
+            current_version = self._current.version if self._current is not None and self._current.path == path \
+                else None
+            # Skip files that are unchanged or already failed to load
+            if fingerprint is None or fingerprint in (current_version, self._failed_version):
+                pending = None
+                continue
+            # Wait one more interval to make sure the file is no longer being written
+            if fingerprint != pending:
+                pending = fingerprint
+                continue
+            self.reload()
+            pending = None
+
+    def status(self):
+        snapshot = self._current
+        return {
+            "model_loaded": snapshot is not None,
+            "model": snapshot.info() if snapshot is not None else None,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None,
+        }
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+
+from hashing import file_fingerprint, file_sha256
+from prediction_stats import save_model_metadata
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialized within the process only
+    fcntl = None
+
+REGISTRY_PATH = 'models/registry.json'
+MODELS_DIR = 'models/versions'
+PRODUCTION = 'production'
+CANDIDATE = 'candidate'
+DEFAULT_CACHE_SIZE = 2
+
+_write_lock = threading.Lock()
+
+
+def version_path(version, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, f'model_{version}.pkl')
+
+
+def drift_reference_path(version, models_dir=MODELS_DIR):
+    """The drift profile of a version's training data, kept so promoting the version can restore it"""
+    return os.path.join(models_dir, f'model_{version}.drift.json')
+
+
+def feature_schema(model):
+    """Input features a fitted model expects, read from the in-memory estimator"""
+    from feature_transform import MODEL_ATTRIBUTE
+
+    names = getattr(model, 'feature_names_in_', None)
+    return {
+        'n_features': int(getattr(model, 'n_features_in_', 0)) or None,
+        'features': [str(name) for name in names] if names is not None else None,
+        'feature_transform': getattr(model, MODEL_ATTRIBUTE, None) is not None,
+    }
+
+
+class ModelRegistry:
+    """Index of the model versions in `models_dir`, with their metadata and which one is in production
+
+    The index at `path` is one JSON document holding, per version, the
+    pickle's file, SHA-256, size and creation time, the training parameters
+    and metrics, the feature schema and its stage (production or candidate).
+    Listing versions and resolving the production model only read this
+    file, never a pickle, and the parsed index is reused until the file
+    changes. Writers hold a lock on `path.lock` and replace the index
+    atomically.
+    """
+
+    def __init__(self, path=REGISTRY_PATH, models_dir=MODELS_DIR):
+        self.path = path
+        self.models_dir = models_dir
+        self.lock_path = f"{path}.lock"
+        # Files are recorded relative to the index, so it resolves the same from any working directory
+        self.root = os.path.dirname(os.path.abspath(path))
+        self._cached = (None, None)
+
+    def file_path(self, entry):
+        """Absolute path of a registry entry's pickle"""
+        return os.path.join(self.root, entry['file'])
+
+    def _empty(self):
+        return {'production': None, 'updated_at': None, 'versions': {}}
+
+    def index(self):
+        """The parsed index, re-read only when the file's fingerprint changes"""
+        fingerprint = file_fingerprint(self.path)
+        cached_fingerprint, index = self._cached
+        if fingerprint is None:
+            return self._empty()
+        if fingerprint != cached_fingerprint:
+            with open(self.path) as f:
+                index = json.load(f)
+            self._cached = (fingerprint, index)
+        return index
+
+    @contextmanager
+    def _update(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with _write_lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Always start from the file, not the cache, so concurrent writers do not lose updates
+                index = self._empty()
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        index = json.load(f)
+                yield index
+                index['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                save_model_metadata(self.path, index)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def register(self, model_file, version, model=None, sha256=None, params=None, metrics=None,
+                 stage=CANDIDATE, **extra):
+        """Add (or refresh) a version; pass the in-memory `model` to record its feature schema without unpickling"""
+        entry = {
+            'version': version,
+            'file': os.path.relpath(model_file, self.root),
+            'sha256': sha256 or file_sha256(model_file),
+            'size_bytes': os.path.getsize(model_file),
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'stage': CANDIDATE,
+            'params': params,
+            'metrics': metrics,
+            'feature_schema': feature_schema(model) if model is not None else None,
+            'n_estimators': len(model.estimators_) if hasattr(model, 'estimators_') else None,
+            **extra,
+        }
+        with self._update() as index:
+            if index['production'] == version:
+                entry['stage'] = PRODUCTION
+            index['versions'][version] = entry
+            # Registered and promoted in one write, so readers never see the version without its stage
+            if stage == PRODUCTION:
+                self._promote(index, version)
+        return entry
+
+    @staticmethod
+    def _promote(index, version):
+        if version not in index['versions']:
+            raise KeyError(f"Unknown model version {version}")
+        previous = index['production']
+        if previous in index['versions']:
+            index['versions'][previous]['stage'] = CANDIDATE
+        index['versions'][version]['stage'] = PRODUCTION
+        index['versions'][version]['promoted_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        index['production'] = version
+
+    def promote(self, version):
+        """Make `version` the production model; the previous one becomes a candidate"""
+        with self._update() as index:
+            self._promote(index, version)
+
+    def scan(self):
+        """Register pickles in `models_dir` that are not indexed yet and drop entries whose file is gone
+
+        New entries get file-level metadata only (hash, size, modification
+        time), so no model is unpickled. Returns the versions added.
+        """
+        files = sorted(f for f in os.listdir(self.models_dir) if f.startswith('model_') and f.endswith('.pkl')) \
+            if os.path.isdir(self.models_dir) else []
+        added = []
+        with self._update() as index:
+            for version, entry in list(index['versions'].items()):
+                if not os.path.exists(self.file_path(entry)) and index['production'] != version:
+                    del index['versions'][version]
+            known = {os.path.abspath(self.file_path(entry)) for entry in index['versions'].values()}
+            for name in files:
+                path = os.path.join(self.models_dir, name)
+                version = name[len('model_'):-len('.pkl')]
+                if os.path.abspath(path) in known or version in index['versions']:
+                    continue
+                stat = os.stat(path)
+                index['versions'][version] = {
+                    'version': version, 'file': os.path.relpath(path, self.root), 'sha256': file_sha256(path),
+                    'size_bytes': stat.st_size,
+                    'created_at': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                    'stage': CANDIDATE, 'params': None, 'metrics': None, 'feature_schema': None,
+                    'n_estimators': None, 'source': 'scan',
+                }
+                added.append(version)
+        return added
+
+    def get(self, version):
+        return self.index()['versions'].get(version)
+
+    def list_versions(self, stage=None):
+        """Every registered version's metadata, oldest first, optionally only those in `stage`"""
+        versions = self.index()['versions']
+        return [versions[v] for v in sorted(versions) if stage is None or versions[v]['stage'] == stage]
+
+    def production(self):
+        index = self.index()
+        return index['versions'].get(index['production']) if index['production'] else None
+
+    def production_path(self):
+        """The pickle of the production version, or None if nothing has been promoted"""
+        entry = self.production()
+        return self.file_path(entry) if entry is not None else None
+
+
+def publish_version(model, version, registry_path=REGISTRY_PATH, models_dir=MODELS_DIR, promote=True,
+                    drift_reference=None, **metadata):
+    """Save a trained model as a new version (pickle plus compiled arrays), register it and optionally promote it
+
+    The pickle is renamed into place before it is registered, so the
+    registry never points at a half-written file. `drift_reference`, the
+    DriftProfile of the training data, is saved next to the pickle.
+    Returns its registry entry.
+    """
+    from model_manager import publish_model
+
+    path = version_path(version, models_dir)
+    os.makedirs(models_dir, exist_ok=True)
+    sha256 = publish_model(model, path)
+    if drift_reference is not None:
+        drift_reference.save(drift_reference_path(version, models_dir))
+    return ModelRegistry(registry_path, models_dir).register(
+        path, version, model=model, sha256=sha256, stage=PRODUCTION if promote else CANDIDATE, **metadata)
+
+
+class ModelCache:
+    """Loads registered versions on first use and keeps the `max_models` most recently used in memory
+
+    `loader(path, entry)` turns a registry entry and the absolute path of its
+    pickle into a usable model; the default unpickles the file and checks
+    its hash. Models are keyed on version and SHA-256, so a re-registered
+    version is loaded again. Each version is loaded once, outside the cache
+    lock: concurrent requests for it wait on the same load, while requests
+    for models already in memory are served meanwhile.
+    """
+
+    def __init__(self, registry, max_models=DEFAULT_CACHE_SIZE, loader=None):
+        self.registry = registry
+        self.max_models = max(1, int(max_models))
+        self.loader = loader or self._load_pickle
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _load_pickle(path, entry):
+        from model_manager import load_pickled_model
+
+        return load_pickled_model(path, expected_sha256=entry['sha256'])
+
+    def get(self, version):
+        entry = self.registry.get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version {version}")
+        key = (version, entry['sha256'])
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            loading = self._loading.get(key)
+            if loading is None:
+                self.misses += 1
+                self._loading[key] = Future()
+            else:
+                self.hits += 1
+        if loading is not None:
+            return loading.result()
+
+        try:
+            model = self.loader(self.registry.file_path(entry), entry)
+        except BaseException as e:
+            with self._lock:
+                future = self._loading.pop(key)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            future = self._loading.pop(key)
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        future.set_result(model)
+        return model
+
+    def stats(self):
+        with self._lock:
+            return {'loaded': [version for version, _ in self._models], 'max_models': self.max_models,
+                    'hits': self.hits, 'misses': self.misses}
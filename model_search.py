@@ -0,0 +1,163 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from feature_store import load_features
+
+# Searched when train.py runs with --search
+SEARCH_SPACE = {
+    'n_estimators': [50, 100, 200, 300],
+    'max_depth': [6, 8, 10, 12, 16, None],
+    'min_samples_split': [2, 5, 10, 20],
+}
+DEFAULT_CANDIDATES = 27
+DEFAULT_FACTOR = 3
+# Smallest number of training rows a first-rung fit gets
+MIN_RESOURCE = 500
+VALIDATION_FRACTION = 0.2
+# Most metrics MLflow accepts in one log_batch call
+MAX_BATCH_METRICS = 1000
+
+# Set in each worker by _init_worker, so the data is mapped once per process instead of pickled per trial
+_worker_data = None
+
+
+def sample_candidates(space=None, n_candidates=DEFAULT_CANDIDATES, random_state=42):
+    """Up to `n_candidates` distinct parameter combinations drawn from `space`"""
+    from sklearn.model_selection import ParameterSampler
+
+    space = space or SEARCH_SPACE
+    n_combinations = math.prod(len(values) for values in space.values())
+    return list(ParameterSampler(space, min(n_candidates, n_combinations), random_state=random_state))
+
+
+def rung_sizes(n_candidates, n_samples, factor=DEFAULT_FACTOR, min_resource=MIN_RESOURCE):
+    """(candidates, training rows) per rung: each rung keeps 1/factor of the candidates and gives them factor x the rows"""
+    n_rungs = 1
+    while factor ** n_rungs < n_candidates:
+        n_rungs += 1
+    sizes = []
+    for rung in range(n_rungs):
+        rows = n_samples // factor ** (n_rungs - 1 - rung)
+        sizes.append((max(1, math.ceil(n_candidates / factor ** rung)), min(n_samples, max(rows, min_resource))))
+    return sizes
+
+
+def _init_worker(data_path, fit_rows, val_rows):
+    global _worker_data
+    features = load_features(data_path)
+    _worker_data = (features, fit_rows, val_rows)
+
+
+def _run_trial(trial, params, n_samples, random_state):
+    """Fit one candidate on the first `n_samples` fit rows and score it on the validation rows"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_absolute_error, r2_score
+
+    features, fit_rows, val_rows = _worker_data
+    rows = np.sort(fit_rows[:n_samples])
+    model = RandomForestRegressor(**params, random_state=random_state, n_jobs=1)
+    started = time.perf_counter()
+    model.fit(features.X[rows], features.y[rows])
+    fit_seconds = time.perf_counter() - started
+    predictions = model.predict(features.X[val_rows])
+    return {
+        'trial': trial,
+        'params': params,
+        'n_samples': int(len(rows)),
+        'val_mae': float(mean_absolute_error(features.y[val_rows], predictions)),
+        'val_r2': float(r2_score(features.y[val_rows], predictions)),
+        'fit_seconds': fit_seconds,
+    }
+
+
+def successive_halving(data_path, train_rows, candidates, factor=DEFAULT_FACTOR, min_resource=MIN_RESOURCE,
+                       n_jobs=None, random_state=42, on_rung=None):
+    """Pick the best of `candidates` with successive halving; returns (best params, all trials)
+
+    `train_rows` are row positions in the feature store of `data_path`; a
+    VALIDATION_FRACTION of them is held out to score the trials. The first
+    rung fits every candidate on a small sample of the rest, then the best
+    1/factor by validation MAE move on to a rung with factor x the rows,
+    until the last rung uses them all. Trials run in a process pool of
+    `n_jobs` workers (every core when None or <= 0), each fitting one
+    single-threaded forest on the memory-mapped store, so throughput grows
+    with the number of cores. `on_rung(rung, trials)` is called after each
+    rung, e.g. to log its trials.
+    """
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = os.cpu_count() or 1
+    rng = np.random.RandomState(random_state)
+    shuffled = rng.permutation(np.asarray(train_rows))
+    n_val = max(1, int(len(shuffled) * VALIDATION_FRACTION))
+    val_rows, fit_rows = np.sort(shuffled[:n_val]), shuffled[n_val:]
+
+    pool = None
+    if n_jobs == 1:
+        _init_worker(data_path, fit_rows, val_rows)
+    else:
+        pool = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                   initargs=(data_path, fit_rows, val_rows))
+
+    alive = list(enumerate(candidates))
+    trials = []
+    try:
+        for rung, (n_keep, n_samples) in enumerate(rung_sizes(len(candidates), len(fit_rows), factor,
+                                                              min_resource)):
+            alive = alive[:n_keep]
+            # Biggest forests first, so the slowest fits do not end up alone at the tail of the rung
+            order = sorted(alive, key=lambda item: -item[1]['n_estimators'])
+            args = [(trial, params, n_samples, random_state) for trial, params in order]
+            if pool is None:
+                results = [_run_trial(*arg) for arg in args]
+            else:
+                results = [future.result() for future in [pool.submit(_run_trial, *arg) for arg in args]]
+            for result in results:
+                result['rung'] = rung
+            results.sort(key=lambda result: (result['val_mae'], result['trial']))
+            trials.extend(results)
+            if on_rung is not None:
+                on_rung(rung, results)
+            alive = [(result['trial'], result['params']) for result in results]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return alive[0][1], trials
+
+
+def log_nested_run(client, experiment_id, parent_run_id, name, params=None, metrics=None, tags=None, step=0):
+    """Create a finished child run of `parent_run_id` and send its params, metrics and tags in one log_batch call"""
+    from mlflow.entities import Metric, Param, RunTag
+    from mlflow.utils.mlflow_tags import MLFLOW_PARENT_RUN_ID, MLFLOW_RUN_NAME
+
+    timestamp = int(time.time() * 1000)
+    run = client.create_run(experiment_id, tags={MLFLOW_PARENT_RUN_ID: parent_run_id, MLFLOW_RUN_NAME: name})
+    client.log_batch(run.info.run_id,
+                     metrics=[Metric(key, float(value), timestamp, step) for key, value in (metrics or {}).items()],
+                     params=[Param(key, str(value)) for key, value in (params or {}).items()],
+                     tags=[RunTag(key, str(value)) for key, value in (tags or {}).items()])
+    client.set_terminated(run.info.run_id)
+    return run.info.run_id
+
+
+def log_rung(client, run_id, rung, trials):
+    """Log a rung's trials to the search's own run, in one log_batch call per MAX_BATCH_METRICS metrics
+
+    Each trial's metrics are stepped by trial number under per-rung keys
+    (`rung_0_val_mae`, ...), next to the rung's best validation MAE and
+    candidate count stepped by rung. Trial parameters go in the run's
+    `search_trials.json` artifact, so no child run is created per trial.
+    """
+    from mlflow.entities import Metric
+
+    timestamp = int(time.time() * 1000)
+    metrics = [Metric(f"rung_{rung}_{name}", float(result[name]), timestamp, result['trial'])
+               for result in trials for name in ('val_mae', 'val_r2', 'fit_seconds')]
+    metrics.append(Metric('search_best_val_mae', float(trials[0]['val_mae']), timestamp, rung))
+    metrics.append(Metric('search_rung_candidates', len(trials), timestamp, rung))
+    # MLflow rejects batches of more than MAX_BATCH_METRICS metrics, so a large rung takes several calls
+    for start in range(0, len(metrics), MAX_BATCH_METRICS):
+        client.log_batch(run_id, metrics=metrics[start:start + MAX_BATCH_METRICS])
@@ -1,127 +1,197 @@
-import pandas as pd
 import joblib
 import os
-import json
 from datetime import datetime
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from tree_engine import make_predict_fn
+from evaluation import DEFAULT_CHUNK_SIZE, evaluate_features
+from audit_log import AuditLogReader, audit_entry_rows
+from drift import DriftProfile, DriftWindow, MIN_CURRENT_ROWS, compare_profiles, profile_features
+from feature_store import load_features
+from metrics_store import MetricsStore
+
+FEATURE_COLUMNS = ['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']
 
 class ModelMonitor:
-    def __init__(self, model_path='models/model.pkl', data_path='data/processed_data.csv'):
+    def __init__(self, model_path='models/model.pkl', data_path='data/processed_data.csv',
+                 audit_log_path='monitoring/prediction_log.jsonl',
+                 drift_reference_path='models/drift_reference.json',
+                 drift_window_path='monitoring/drift_window.json', drift_window_days=7):
         self.model_path = model_path
         self.data_path = data_path
-        self.monitoring_file = 'monitoring/model_metrics.json'
+        self.audit_log_path = audit_log_path
+        self.drift_reference_path = drift_reference_path
+        self.drift_window_path = drift_window_path
+        self.drift_window_days = drift_window_days
+        self.monitoring_file = 'monitoring/model_metrics.jsonl'
         
         # Create monitoring directory if it doesn't exist
         os.makedirs('monitoring', exist_ok=True)
+
+        # Append-only metrics history; the old JSON history is imported on first use
+        retention_days = os.getenv('METRICS_RETENTION_DAYS')
+        self.metrics_store = MetricsStore(self.monitoring_file,
+                                          retention_days=float(retention_days) if retention_days else None)
+        self.metrics_store.migrate_json('monitoring/model_metrics.json')
         
-    def load_model_and_data(self):
+    def load_model(self):
         try:
-            model = joblib.load(self.model_path)
-            data = pd.read_csv(self.data_path)
-            return model, data
+            return joblib.load(self.model_path)
         except Exception as e:
-            print(f"Error loading model or data: {e}")
-            return None, None
-    
-    def calculate_metrics(self):
-        model, data = self.load_model_and_data()
-        if model is None or data is None:
+            print(f"Error loading model: {e}")
+            return None
+
+    def calculate_metrics(self, chunksize=None, n_jobs=None, model=None):
+        """Evaluate the model on the processed dataset without loading it into memory
+
+        The memory-mapped feature store of the processed dataset is read in
+        `chunksize` rows (MONITOR_CHUNK_SIZE), chunks are predicted on `n_jobs`
+        threads (MONITOR_N_JOBS, 0 for all cores) and MAE/MSE/R² are
+        accumulated exactly from running sums, overall and per DayOfWeek and
+        Month. Pass `model` to evaluate one already in memory instead of
+        loading `model_path`.
+        """
+        if not os.path.exists(self.data_path):
+            print(f"Error loading data: {self.data_path} does not exist")
+            return None
+        if model is None:
+            model = self.load_model()
+        if model is None:
+            return None
+
+        chunksize = chunksize or int(os.getenv('MONITOR_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        n_jobs = n_jobs if n_jobs is not None else int(os.getenv('MONITOR_N_JOBS', 1))
+        features = load_features(self.data_path)
+        if features.y is None:
+            print(f"Error loading data: {self.data_path} has no target column")
+            return None
+        # Make predictions with the compiled forest when the model supports it
+        result = evaluate_features(make_predict_fn(model), features, chunksize=chunksize, n_jobs=n_jobs)
+        if result['count'] == 0:
             return None
-        
-        # Define features and target
-        X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
-        y = data['Usage (minutes)']
-        
-        # Make predictions
-        predictions = model.predict(X)
         
         # Calculate metrics
         metrics = {
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'mae': mean_absolute_error(y, predictions),
-            'mse': mean_squared_error(y, predictions),
-            'r2': r2_score(y, predictions),
-            'data_size': len(data)
+            'mae': result['mae'],
+            'mse': result['mse'],
+            'r2': result['r2'],
+            'data_size': result['count'],
+            'segments': result['segments']
         }
         
         return metrics
     
     def save_metrics(self, metrics):
-        # Load existing metrics if available
-        if os.path.exists(self.monitoring_file):
-            with open(self.monitoring_file, 'r') as f:
-                try:
-                    history = json.load(f)
-                except:
-                    history = []
-        else:
-            history = []
-        
-        # Add new metrics
-        history.append(metrics)
-        
-        # Save updated metrics
-        with open(self.monitoring_file, 'w') as f:
-            json.dump(history, f, indent=4)
+        # Append one line instead of rewriting the whole history
+        self.metrics_store.append(metrics)
     
-    def run_monitoring(self):
-        metrics = self.calculate_metrics()
+    def run_monitoring(self, model=None):
+        metrics = self.calculate_metrics(model=model)
         if metrics:
             self.save_metrics(metrics)
             print(f"Model monitoring complete. Metrics: MAE={metrics['mae']:.4f}, R²={metrics['r2']:.4f}")
             return metrics
         return None
 
-    def check_data_drift(self, reference_data_path='data/reference_data.csv'):
-        """Check for data drift between reference and current data"""
-        model, current_data = self.load_model_and_data()
-        
-        try:
-            reference_data = pd.read_csv(reference_data_path)
-        except Exception as e:
-            print(f"Error loading reference data: {e}")
-            # First run - save current data as reference
-            current_data.to_csv(reference_data_path, index=False)
-            return {"drift_detected": False, "message": "First run, setting current data as reference"}
-        
-        # Calculate basic statistics for numeric columns
-        ref_stats = reference_data.describe()
-        curr_stats = current_data.describe()
-        
-        # Check for significant changes in mean and std
-        drift_results = {}
-        for col in ['Notifications', 'Times Opened', 'Usage (minutes)']:
-            if col in reference_data.columns and col in current_data.columns:
-                mean_diff_pct = abs(ref_stats[col]['mean'] - curr_stats[col]['mean']) / ref_stats[col]['mean'] * 100
-                std_diff_pct = abs(ref_stats[col]['std'] - curr_stats[col]['std']) / ref_stats[col]['std'] * 100
-                
-                drift_results[col] = {
-                    'mean_diff_pct': mean_diff_pct,
-                    'std_diff_pct': std_diff_pct,
-                    'drift_detected': mean_diff_pct > 15 or std_diff_pct > 20  # Thresholds
-                }
-        
+    def update_drift_window(self, reference, chunk_rows=10000):
+        """Fold the audit log entries written since the last check into the daily drift sketches"""
+        window = DriftWindow.load(self.drift_window_path, reference)
+        reader = AuditLogReader(self.audit_log_path, window.position)
+        today = datetime.now().strftime('%Y-%m-%d')
+        pending, buffered = {}, 0
+        for entry in reader:
+            rows, _ = audit_entry_rows(entry)
+            if not rows:
+                continue
+            pending.setdefault(str(entry.get('timestamp', ''))[:10] or today, []).extend(rows)
+            buffered += len(rows)
+            if buffered >= chunk_rows:
+                for day, day_rows in pending.items():
+                    window.update(reference, day, day_rows, FEATURE_COLUMNS)
+                pending, buffered = {}, 0
+        for day, day_rows in pending.items():
+            window.update(reference, day, day_rows, FEATURE_COLUMNS)
+        window.position = reader.position
+        window.current(reference, self.drift_window_days)  # drops days that left the window
+        window.save(self.drift_window_path)
+        return window
+
+    def _profile_dataset(self, reference=None):
+        if not os.path.exists(self.data_path):
+            return None
+        return profile_features(load_features(self.data_path), reference)
+
+    def check_data_drift(self, reference_profile_path=None):
+        """Check for data drift between the reference profile and recent data
+
+        The reference is a set of per-column sketches (moments and fixed-bin
+        histograms) that scripts/train.py stores next to the model, so the raw
+        reference data is not needed. Recent data comes from the API's
+        prediction audit log: only entries written since the previous check
+        are read, and the last `drift_window_days` days of sketches are
+        merged. Without an audit log the processed dataset is sketched in
+        chunks instead.
+        """
+        reference_profile_path = reference_profile_path or self.drift_reference_path
+        reference = DriftProfile.load(reference_profile_path)
+        if reference is None:
+            # Models trained before profiles were stored: sketch the processed dataset once and keep it
+            reference = self._profile_dataset()
+            if reference is None:
+                return {"drift_detected": False, "message": "No reference profile or data available"}
+            reference.metadata = {'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                  'source': self.data_path}
+            reference.save(reference_profile_path)
+            print(f"Stored reference drift profile at {reference_profile_path}")
+
+        current, source = None, 'audit_log'
+        if self.audit_log_path and os.path.exists(self.audit_log_path):
+            current = self.update_drift_window(reference).current(reference, self.drift_window_days)
+        if current is None or current.count == 0:
+            current, source = self._profile_dataset(reference), 'dataset'
+        current_rows = current.count if current is not None else 0
+        if current_rows < MIN_CURRENT_ROWS:
+            return {"drift_detected": False, "message": f"Not enough recent data ({current_rows} rows)",
+                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+        drift_results = compare_profiles(reference, current)
         drift_detected = any(col_result['drift_detected'] for col_result in drift_results.values())
         
         return {
             "drift_detected": drift_detected,
             "details": drift_results,
+            "source": source,
+            "current_rows": current_rows,
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
 
-    def trigger_retraining_if_needed(self):
+    def trigger_retraining_if_needed(self, mode=None):
+        """Start a background retraining job on drift; returns True if a job was started
+
+        RETRAIN_MODE picks warm_start, replace or full. The default, auto,
+        warm-starts the forest on moderate drift and retrains from scratch when
+        a column's PSI reaches FULL_RETRAIN_PSI. Progress is written to
+        monitoring/retrain_status.json.
+        """
+        # Import here to avoid circular imports
+        from retraining import choose_retrain_mode, start_retraining_job
+
         drift_results = self.check_data_drift()
-        if drift_results["drift_detected"]:
-            print(f"Data drift detected! Details: {drift_results['details']}")
-            print("Triggering model retraining...")
-            # Import here to avoid circular imports
-            import subprocess
-            subprocess.run(["python", "scripts/train.py"])
-            return True
-        else:
+        if not drift_results["drift_detected"]:
             print("No significant data drift detected. Model retraining not needed.")
             return False
 
+        print(f"Data drift detected! Details: {drift_results['details']}")
+        auto_mode, severity = choose_retrain_mode(drift_results)
+        mode = mode or os.getenv('RETRAIN_MODE', 'auto')
+        if mode == 'auto':
+            mode = auto_mode
+        status = start_retraining_job(mode, severity)
+        if status is None:
+            print("A retraining job is already running.")
+            return False
+        print(f"Started {mode} retraining (pid {status['pid']}, max PSI {severity:.3f})")
+        return True
+
 if __name__ == "__main__":
     monitor = ModelMonitor()
     monitor.run_monitoring()
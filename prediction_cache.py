@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Bounded LRU cache of predictions keyed on (model version, feature row)
+
+    Entries expire after `ttl_seconds` (None disables expiry). The serving
+    code calls `clear()` when the model changes.
+    """
+
+    def __init__(self, max_size=10000, ttl_seconds=None):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(model_version, features):
+        return (model_version, tuple(float(value) for value in features))
+
+    def get(self, model_version, features):
+        """Return the cached prediction or None"""
+        key = self.make_key(model_version, features)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            prediction, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prediction
+
+    def put(self, model_version, features, prediction):
+        key = self.make_key(model_version, features)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (prediction, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put_many(self, model_version, rows, predictions):
+        """Insert many entries at once, e.g. when pre-warming from historical inputs"""
+        for features, prediction in zip(rows, predictions):
+            self.put(model_version, features, prediction)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
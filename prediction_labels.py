@@ -0,0 +1,15 @@
+import os
+
+import numpy as np
+
+# Default MODEL_THRESHOLD, shared by the API and bulk scoring
+DEFAULT_THRESHOLD = 60.0
+
+
+def model_threshold():
+    """The usage (minutes) above which a prediction is labelled "Take a break!" """
+    return float(os.getenv('MODEL_THRESHOLD', DEFAULT_THRESHOLD))
+
+
+def label_predictions(predictions, threshold):
+    return np.where(np.asarray(predictions) > threshold, "Take a break!", "All good!")
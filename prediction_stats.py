@@ -0,0 +1,102 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+FEATURE_COLUMNS = ['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']
+RANGE_PERCENTILES = (5, 25, 50, 75, 95, 99)
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_SAMPLE_SIZE = 100000
+
+
+class RunningRange:
+    """Streaming min/max/mean of predictions plus a reservoir sample for percentiles
+
+    Memory is bounded by `sample_size`; percentiles are exact as long as no
+    more than `sample_size` predictions have been seen.
+    """
+
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE, seed=0):
+        self.sample_size = int(sample_size)
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._sample = np.empty(self.sample_size, dtype=np.float64)
+        self._rng = np.random.RandomState(seed)
+
+    def update(self, predictions):
+        predictions = np.asarray(predictions, dtype=np.float64).ravel()
+        if predictions.size == 0:
+            return
+        self.min = min(self.min, float(predictions.min()))
+        self.max = max(self.max, float(predictions.max()))
+        self.total += float(predictions.sum())
+
+        # Fill the reservoir first, then replace entries with probability sample_size / seen (Algorithm R)
+        filled = min(self.count, self.sample_size)
+        n_fill = min(self.sample_size - filled, predictions.size)
+        self._sample[filled:filled + n_fill] = predictions[:n_fill]
+        rest = predictions[n_fill:]
+        if rest.size:
+            seen = self.count + n_fill + np.arange(1, rest.size + 1)
+            slots = (self._rng.random_sample(rest.size) * seen).astype(np.int64)
+            keep = slots < self.sample_size
+            self._sample[slots[keep]] = rest[keep]
+        self.count += predictions.size
+
+    def result(self):
+        if self.count == 0:
+            return {"min": 0, "max": 0, "avg": 0, "count": 0}
+        sample = self._sample[:min(self.count, self.sample_size)]
+        result = {
+            "min": float(round(self.min, 2)),
+            "max": float(round(self.max, 2)),
+            "avg": float(round(self.total / self.count, 2)),
+            "count": self.count,
+            "percentiles_exact": self.count <= self.sample_size,
+        }
+        for q, value in zip(RANGE_PERCENTILES, np.percentile(sample, RANGE_PERCENTILES)):
+            result[f"p{q:02d}"] = float(round(value, 2))
+        return result
+
+
+def compute_prediction_range(predict_fn, data_path, chunksize=DEFAULT_CHUNK_SIZE, sample_size=DEFAULT_SAMPLE_SIZE):
+    """Score a dataset chunk by chunk and summarize the predictions without holding them all in memory
+
+    `predict_fn` receives float32 feature matrices sliced from the dataset's feature store.
+    """
+    from feature_store import load_features
+
+    running = RunningRange(sample_size=sample_size)
+    for chunk in load_features(data_path).chunks(chunksize):
+        running.update(predict_fn(chunk.X))
+    return running.result()
+
+
+def load_model_metadata(path):
+    """Read the metadata stored next to a model, or return an empty dict"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_model_metadata(path, metadata):
+    """Atomically write model metadata as JSON"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def build_range_metadata(prediction_range, dataset_path, dataset_fingerprint):
+    return {
+        "dataset_path": dataset_path,
+        "dataset_fingerprint": dataset_fingerprint,
+        "computed_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        **prediction_range,
+    }
@@ -0,0 +1,365 @@
+import hashlib
+import io
+import os
+from datetime import datetime
+
+import numpy as np
+
+from feature_store import (DATE_COLUMN, FEATURE_COLUMNS, TARGET_COLUMN, FeatureStoreWriter, build_features,
+                           feature_store_path)
+from feature_transform import RAW_COLUMNS, SCALED_COLUMNS, FeatureTransform
+from hashing import file_fingerprint
+from prediction_stats import load_model_metadata, save_model_metadata
+
+RAW_PATH = 'data/screentime_analysis.csv'
+PROCESSED_PATH = 'data/processed_data.csv'
+STATE_PATH = 'data/preprocess_state.json'
+CATEGORY_COLUMN = 'App'
+# 2: records a tail hash of the processed file, checked before an interrupted append is rolled back
+STATE_VERSION = 2
+DEFAULT_CHUNK_SIZE = 100000
+# Bytes before the watermark that must be unchanged for the raw (or processed) file to count as append-only
+_TAIL_BYTES = 4096
+
+
+class FullRebuildRequired(Exception):
+    """New rows cannot be appended without changing rows that were already processed"""
+
+
+class ByteRange(io.RawIOBase):
+    """Bytes [start, end) of a file, so pandas parses exactly the rows between two watermarks"""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _complete_size(path):
+    """File size up to the end of the last complete line; a row still being written waits for the next run"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            read_size = min(65536, position)
+            f.seek(position - read_size)
+            block = f.read(read_size)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return position - read_size + newline + 1
+            position -= read_size
+    return 0
+
+
+def _tail_sha256(path, end):
+    with open(path, 'rb') as f:
+        f.seek(max(end - _TAIL_BYTES, 0))
+        return hashlib.sha256(f.read(min(end, _TAIL_BYTES))).hexdigest()
+
+
+def _header(path):
+    import pandas as pd
+
+    with open(path, 'rb') as f:
+        header_size = len(f.readline())
+    return list(pd.read_csv(path, nrows=0).columns), header_size
+
+
+def _read_chunks(path, start, end, columns, chunksize, dtypes=None):
+    import pandas as pd
+
+    if start >= end:
+        return
+    with io.BufferedReader(ByteRange(path, start, end)) as f:
+        yield from pd.read_csv(f, header=None, names=columns, dtype=dtypes, chunksize=chunksize)
+
+
+def _merge_dtype(previous, dtype):
+    """The dtype pandas would infer for a column read in one piece, given the dtype of each chunk"""
+    kind = 'int64' if dtype.kind in 'iu' else 'float64' if dtype.kind == 'f' else 'object'
+    if previous is None or previous == kind:
+        return kind
+    if 'object' in (previous, kind):
+        return 'object'
+    return 'float64'
+
+
+def load_transform(state_path=STATE_PATH):
+    """The FeatureTransform fit by the last preprocessing run, for bundling with a model trained on its output"""
+    state = load_model_metadata(state_path)
+    if 'scaler' not in state:
+        raise FileNotFoundError(f"{state_path} has no fitted scaling; run preprocessing first")
+    return _transform(state)
+
+
+def _transform(state):
+    # The stored column minima and maxima give exactly the scaling fit on all rows
+    return FeatureTransform.from_min_max(state['scaler']['min'], state['scaler']['max'])
+
+
+def transform_chunk(chunk, state, transform, previous_usage):
+    """Apply the preprocessing steps to consecutive raw rows; returns (processed rows, last usage)
+
+    `previous_usage` is the usage of the row just before the chunk (NaN for the
+    first row of the file), so the lag feature is the same as shifting the
+    whole file at once.
+    """
+    import pandas as pd
+
+    data = chunk
+    # convert Date column to datetime and extract features
+    data[DATE_COLUMN] = pd.to_datetime(data[DATE_COLUMN])
+    data['DayOfWeek'] = data[DATE_COLUMN].dt.dayofweek
+    data['Month'] = data[DATE_COLUMN].dt.month
+
+    # one-hot encode App over every category seen in the data, so all chunks get the same columns
+    dummies = pd.get_dummies(pd.Categorical(data[CATEGORY_COLUMN], categories=state['categories']),
+                             prefix=CATEGORY_COLUMN, drop_first=True)
+    dummies.index = data.index
+    data = pd.concat([data.drop(columns=[CATEGORY_COLUMN]), dummies], axis=1)
+
+    # scale numerical features and build the interaction with the transform bundled with the model
+    features = transform.transform(data[RAW_COLUMNS].to_numpy(dtype=np.float64))
+    for i, column in enumerate(SCALED_COLUMNS):
+        data[column] = features[:, i]
+
+    # feature engineering
+    usage = data[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    data['Previous_Day_Usage'] = np.concatenate([[previous_usage], usage[:-1]])
+    data['Notifications_x_TimesOpened'] = features[:, FEATURE_COLUMNS.index('Notifications_x_TimesOpened')]
+    return data, (usage[-1] if usage.size else previous_usage)
+
+
+def _feature_arrays(processed):
+    return (processed[FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+            processed[TARGET_COLUMN].to_numpy(dtype=np.float64),
+            processed[DATE_COLUMN].to_numpy(dtype='datetime64[ns]'))
+
+
+def _write_rows(chunks, state, transform, f, write_header, previous_usage, writer=None):
+    """Transform and write chunks to the CSV (and the feature store `writer`); returns (rows, last usage, latest date)"""
+    rows, latest = 0, None
+    for chunk in chunks:
+        processed, previous_usage = transform_chunk(chunk, state, transform, previous_usage)
+        processed.to_csv(f, header=write_header, index=False)
+        write_header = False
+        if writer is not None:
+            writer.write(*_feature_arrays(processed))
+        rows += len(processed)
+        chunk_latest = processed[DATE_COLUMN].max()
+        if latest is None or chunk_latest > latest:
+            latest = chunk_latest
+    return rows, previous_usage, latest
+
+
+def _save_state(state_path, state, raw_path, raw_end, processed_path, previous_usage, latest):
+    import pandas as pd
+
+    processed_size = os.path.getsize(processed_path)
+    state.update({
+        'version': STATE_VERSION,
+        'raw_path': raw_path,
+        'raw_offset': raw_end,
+        'raw_tail_sha256': _tail_sha256(raw_path, raw_end),
+        'processed_path': processed_path,
+        'processed_size': processed_size,
+        'processed_tail_sha256': _tail_sha256(processed_path, processed_size),
+        'processed_fingerprint': file_fingerprint(processed_path),
+        'previous_usage': None if previous_usage is None or np.isnan(previous_usage) else float(previous_usage),
+        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    if latest is not None and not pd.isna(latest):
+        latest = str(latest)
+        if state.get('watermark') is None or latest > state['watermark']:
+            state['watermark'] = latest
+    save_model_metadata(state_path, state)
+
+
+def preprocess_full(raw_path=RAW_PATH, processed_path=PROCESSED_PATH, state_path=STATE_PATH,
+                    chunksize=DEFAULT_CHUNK_SIZE):
+    """Rebuild the processed dataset from the whole raw file, streaming it twice
+
+    The first pass collects what the transforms need from all rows (column
+    dtypes, App categories, the scaler's minima and maxima, plus null and
+    duplicate counts); the second writes the processed rows. The output is
+    the same as transforming the whole file in memory.
+    """
+    import pandas as pd
+
+    columns, header_size = _header(raw_path)
+    raw_end = _complete_size(raw_path)
+
+    nulls, hashes, dtypes, categories = None, [], {}, set()
+    minima = np.full(len(SCALED_COLUMNS), np.nan)
+    maxima = np.full(len(SCALED_COLUMNS), np.nan)
+    for chunk in _read_chunks(raw_path, header_size, raw_end, columns, chunksize):
+        chunk_nulls = chunk.isnull().sum()
+        nulls = chunk_nulls if nulls is None else nulls + chunk_nulls
+        hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+        for column, dtype in chunk.dtypes.items():
+            dtypes[column] = _merge_dtype(dtypes.get(column), dtype)
+        values = chunk[SCALED_COLUMNS].to_numpy(dtype=np.float64)
+        minima = np.fmin(minima, np.fmin.reduce(values, axis=0))
+        maxima = np.fmax(maxima, np.fmax.reduce(values, axis=0))
+        categories.update(chunk[CATEGORY_COLUMN].dropna().unique().tolist())
+    hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+    state = {
+        'header': columns,
+        'dtypes': dtypes,
+        'categories': sorted(categories),
+        'scaler': {'min': minima.tolist(), 'max': maxima.tolist()},
+        'watermark': None,
+    }
+    transform = _transform(state)
+    tmp_path = f"{processed_path}.tmp"
+    # The feature store is written alongside the CSV, chunk by chunk, and published once the CSV is in place
+    writer = FeatureStoreWriter.create(feature_store_path(processed_path))
+    try:
+        with open(tmp_path, 'w', newline='') as f:
+            chunks = _read_chunks(raw_path, header_size, raw_end, columns, chunksize, dtypes)
+            rows, previous_usage, latest = _write_rows(chunks, state, transform, f, True, np.nan, writer)
+        if rows == 0:
+            os.remove(tmp_path)
+            raise ValueError(f"{raw_path} has no rows to preprocess")
+        os.replace(tmp_path, processed_path)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.publish(source_path=processed_path, source_fingerprint=file_fingerprint(processed_path))
+    _save_state(state_path, state, raw_path, raw_end, processed_path, previous_usage, latest)
+    return {
+        'mode': 'full',
+        'rows': rows,
+        'rows_added': rows,
+        'nulls': {column: int(count) for column, count in nulls.items()} if nulls is not None else {},
+        'duplicates': int(hashes.size - np.unique(hashes).size),
+        'watermark': state['watermark'],
+    }
+
+
+def _check_new_rows(chunks, state):
+    """Raise FullRebuildRequired if the new rows would change the scaler or the dummy columns"""
+    minima = np.asarray(state['scaler']['min'], dtype=np.float64)
+    maxima = np.asarray(state['scaler']['max'], dtype=np.float64)
+    known = set(state['categories'])
+    late_rows = 0
+    watermark = np.datetime64(state['watermark']) if state.get('watermark') else None
+    for chunk in chunks:
+        values = chunk[SCALED_COLUMNS].to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        if np.any(present & ((values < minima) | (values > maxima))):
+            raise FullRebuildRequired("new rows are outside the fitted scaling range")
+        new_categories = set(chunk[CATEGORY_COLUMN].dropna().unique().tolist()) - known
+        if new_categories:
+            raise FullRebuildRequired(f"new {CATEGORY_COLUMN} values {sorted(new_categories)}")
+        if watermark is not None:
+            dates = _to_datetime(chunk[DATE_COLUMN])
+            late_rows += int(np.sum(dates < watermark))
+    return late_rows
+
+
+def _to_datetime(values):
+    import pandas as pd
+
+    return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]')
+
+
+def preprocess_incremental(raw_path=RAW_PATH, processed_path=PROCESSED_PATH, state_path=STATE_PATH,
+                           chunksize=DEFAULT_CHUNK_SIZE):
+    """Process only the raw rows appended since the last run and append them to the processed dataset
+
+    The state file holds the watermark (the raw file's byte offset and the
+    latest processed date), the fitted scaler, the App categories, column
+    dtypes and the last usage value for the lag feature. Raises
+    FullRebuildRequired when appending would not give the same output as a
+    full rebuild: the raw file was rewritten, or new rows fall outside the
+    scaling range, add an App category or change a column's dtype.
+    """
+    state = load_model_metadata(state_path)
+    if state.get('version') != STATE_VERSION or state.get('raw_path') != raw_path:
+        raise FullRebuildRequired("no preprocessing state")
+    if not os.path.exists(processed_path):
+        raise FullRebuildRequired(f"{processed_path} does not exist")
+
+    raw_start = state['raw_offset']
+    raw_end = _complete_size(raw_path)
+    if raw_end < raw_start or _tail_sha256(raw_path, raw_start) != state['raw_tail_sha256']:
+        raise FullRebuildRequired("the raw file was rewritten")
+    columns, _ = _header(raw_path)
+    if columns != state['header']:
+        raise FullRebuildRequired("the raw file's columns changed")
+
+    # A run interrupted while appending leaves extra bytes; drop them and process those rows again. Only if
+    # the rows before them are still the ones the last run wrote: anything else rewrote the file
+    processed_size = os.path.getsize(processed_path)
+    if processed_size < state['processed_size']:
+        raise FullRebuildRequired(f"{processed_path} is shorter than the last run left it")
+    if _tail_sha256(processed_path, state['processed_size']) != state['processed_tail_sha256']:
+        raise FullRebuildRequired(f"{processed_path} was rewritten since the last run")
+    if processed_size > state['processed_size']:
+        with open(processed_path, 'r+b') as f:
+            f.truncate(state['processed_size'])
+
+    if raw_end == raw_start:
+        return {'mode': 'incremental', 'rows_added': 0, 'late_rows': 0, 'watermark': state.get('watermark')}
+
+    try:
+        late_rows = _check_new_rows(_read_chunks(raw_path, raw_start, raw_end, columns, chunksize,
+                                                 state['dtypes']), state)
+    except ValueError as e:
+        # A value that does not fit the column's dtype, e.g. a missing value in an integer column
+        raise FullRebuildRequired(f"new rows change a column's type: {e}")
+
+    previous_usage = state['previous_usage'] if state['previous_usage'] is not None else np.nan
+    store_path = feature_store_path(processed_path)
+    # The store's files are extended in place only if it still matches the processed file the last run left;
+    # otherwise it is rebuilt from the CSV afterwards
+    writer = FeatureStoreWriter.extend(store_path, expected_fingerprint=state['processed_fingerprint'])
+    try:
+        with open(processed_path, 'a', newline='') as f:
+            chunks = _read_chunks(raw_path, raw_start, raw_end, columns, chunksize, state['dtypes'])
+            rows, previous_usage, latest = _write_rows(chunks, state, _transform(state), f, False,
+                                                       previous_usage, writer)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if writer is not None:
+        writer.publish(source_path=processed_path, source_fingerprint=file_fingerprint(processed_path))
+    else:
+        build_features(processed_path, store_path)
+    _save_state(state_path, state, raw_path, raw_end, processed_path, previous_usage, latest)
+    return {'mode': 'incremental', 'rows_added': rows, 'late_rows': late_rows, 'watermark': state['watermark']}
+
+
+def run_preprocessing(raw_path=RAW_PATH, processed_path=PROCESSED_PATH, state_path=STATE_PATH, full=False,
+                      chunksize=DEFAULT_CHUNK_SIZE):
+    """Incremental preprocessing, falling back to a full rebuild when it is not possible"""
+    if not full:
+        try:
+            return preprocess_incremental(raw_path, processed_path, state_path, chunksize)
+        except FullRebuildRequired as e:
+            result = preprocess_full(raw_path, processed_path, state_path, chunksize)
+            result['reason'] = str(e)
+            return result
+    return preprocess_full(raw_path, processed_path, state_path, chunksize)
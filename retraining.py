@@ -0,0 +1,290 @@
+import copy
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from drift import DriftProfile
+from evaluation import RunningRegressionMetrics
+from feature_store import TARGET_COLUMN, load_features
+from hashing import file_fingerprint
+from metrics_store import MetricsStore
+from model_comparison import holdout_mask
+from model_manager import publish_model
+from model_registry import publish_version
+from prediction_stats import (FEATURE_COLUMNS, build_range_metadata, compute_prediction_range,
+                              load_model_metadata, save_model_metadata)
+from tree_engine import make_predict_fn
+
+RETRAIN_MODES = ('warm_start', 'replace', 'full')
+RETRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'retrain.py')
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'train.py')
+
+STATUS_PATH = 'monitoring/retrain_status.json'
+HISTORY_PATH = 'monitoring/retrain_history.jsonl'
+LOG_PATH = 'monitoring/retrain.log'
+
+# A column with PSI at or above this is treated as a distribution change warm starting cannot absorb
+FULL_RETRAIN_PSI = 0.5
+DEFAULT_NEW_TREES = 20
+DEFAULT_WINDOW_DAYS = 30
+# Used instead of the date window when the dataset has no Date column
+DEFAULT_WINDOW_ROWS = 10000
+# Accept a retrained model if its holdout MAE is at most this much worse than the current model's
+MAE_TOLERANCE = 0.02
+# A queued job that has not reported itself running within this many seconds is treated as dead
+QUEUED_TIMEOUT = 60
+
+
+def choose_retrain_mode(drift_results, full_retrain_psi=FULL_RETRAIN_PSI):
+    """Warm start for moderate drift and a full retrain for severe drift; returns (mode, severity)"""
+    severity = max((column.get('psi', 0.0) for column in drift_results.get('details', {}).values()), default=0.0)
+    return ('full' if severity >= full_retrain_psi else 'warm_start'), severity
+
+
+def load_training_window(data_path, window_days=DEFAULT_WINDOW_DAYS, window_rows=None):
+    """The most recent labelled rows of the processed dataset, from its feature store
+
+    Rows within `window_days` of the newest date are returned when the
+    dataset has dates; otherwise (or with `window_rows`) the last
+    `window_rows` rows (DEFAULT_WINDOW_ROWS). The index holds each row's
+    position in the dataset.
+    """
+    import pandas as pd
+
+    features = load_features(data_path)
+    if features.dates is not None and window_rows is None:
+        cutoff = features.dates.max() - np.timedelta64(pd.Timedelta(days=window_days))
+        rows = np.flatnonzero(features.dates >= cutoff)
+    else:
+        rows = np.arange(max(len(features) - (window_rows or DEFAULT_WINDOW_ROWS), 0), len(features))
+    return features.frame(rows, include_target=True, include_date=True)
+
+
+def warm_start_forest(model, X, y, n_new_trees=DEFAULT_NEW_TREES, replace_oldest=False):
+    """Return a copy of a fitted forest with `n_new_trees` more trees fit on (X, y)
+
+    With `replace_oldest` the same number of the oldest trees are dropped, so
+    the forest keeps its size and gradually forgets old data.
+    """
+    candidate = copy.deepcopy(model)
+    n_trees = len(candidate.estimators_)
+    # sklearn seeds new trees by skipping one draw per existing tree from random_state, so a forest trimmed
+    # back to its size would reuse the last round's seeds and bootstraps. Seeding from the current trees'
+    # seeds gives every round new ones, and the same forest still always grows the same trees
+    seeds = [int(tree.random_state) for tree in candidate.estimators_]
+    candidate.set_params(random_state=int(np.random.SeedSequence(seeds).generate_state(1)[0]))
+    candidate.set_params(warm_start=True, n_estimators=n_trees + n_new_trees)
+    candidate.fit(X, y)
+    if replace_oldest:
+        candidate.estimators_ = candidate.estimators_[n_new_trees:]
+        candidate.set_params(n_estimators=len(candidate.estimators_))
+    candidate.set_params(warm_start=False)
+    return candidate
+
+
+def holdout_metrics(model, X, y):
+    running = RunningRegressionMetrics()
+    running.update(np.asarray(y), make_predict_fn(model)(X))
+    return running.result()
+
+
+def read_status(path=STATUS_PATH):
+    return load_model_metadata(path)
+
+
+def write_status(path=STATUS_PATH, **fields):
+    save_model_metadata(path, fields)
+    return fields
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def job_in_progress(status):
+    if status.get('state') == 'queued' and not status.get('pid'):
+        # Written just before launch; the job replaces it with its own pid once it starts
+        queued_at = datetime.strptime(status['queued_at'], '%Y-%m-%d %H:%M:%S')
+        return (datetime.now() - queued_at).total_seconds() < QUEUED_TIMEOUT
+    return status.get('state') in ('queued', 'running') and bool(status.get('pid')) and _pid_alive(status['pid'])
+
+
+def start_retraining_job(mode, severity=None, status_path=STATUS_PATH, log_path=LOG_PATH, extra_args=()):
+    """Launch scripts/retrain.py in the background and return its status, or None if a job is running"""
+    if mode not in RETRAIN_MODES:
+        raise ValueError(f"Unknown retraining mode: {mode}")
+    if job_in_progress(read_status(status_path)):
+        return None
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    args = [sys.executable, RETRAIN_SCRIPT, '--mode', mode, '--status-path', status_path, *extra_args]
+    if severity is not None:
+        args += ['--severity', str(severity)]
+    # Written before launching: from then on the job owns the status file, so a fast job's
+    # 'running' or 'failed' is never overwritten by this process
+    status = write_status(status_path, state='queued', mode=mode, pid=None, severity=severity,
+                          queued_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    try:
+        with open(log_path, 'a') as log:
+            # A new session keeps the job running after the monitor process exits
+            process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    except OSError as e:
+        write_status(status_path, **{**status, 'state': 'failed', 'error': str(e)})
+        raise
+    return {**status, 'pid': process.pid}
+
+
+def _full_retrain_baseline(model, data_path, holdout_index, X_hold, y_hold):
+    """Time a from-scratch fit with the current model's parameters, excluding the holdout rows"""
+    from sklearn.base import clone
+
+    data = load_features(data_path).frame(include_target=True).drop(index=holdout_index, errors='ignore')
+    full = clone(model).set_params(warm_start=False, n_estimators=len(model.estimators_))
+    started = time.perf_counter()
+    full.fit(data[FEATURE_COLUMNS], data[TARGET_COLUMN])
+    seconds = time.perf_counter() - started
+    return {'seconds': seconds, **holdout_metrics(full, X_hold, y_hold)}
+
+
+def _publish_retrained(candidate, model_path, data_path, reference_path, metadata_path, info, window=None):
+    """Publish an accepted candidate with its metadata and drift reference
+
+    A warm-started forest also reflects the `window` it was fit on, which is
+    folded into the existing drift reference; a full retrain gets a profile
+    of the rows it was trained on (everything but the fixed holdout).
+    """
+    model_version = datetime.now().strftime('%Y%m%d_%H%M%S')
+    prediction_range = compute_prediction_range(make_predict_fn(candidate), data_path)
+    published = {}
+
+    def write_metadata(model_sha256):
+        metadata = load_model_metadata(metadata_path)
+        # The test-split metrics belonged to the previous forest; the holdout scores are under 'retrain'
+        metadata.pop('metrics', None)
+        metadata.update({
+            'model_sha256': model_sha256,
+            'model_version': model_version,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'params': candidate.get_params(),
+            'retrain': info,
+            'prediction_range': build_range_metadata(prediction_range, data_path, file_fingerprint(data_path)),
+        })
+        save_model_metadata(metadata_path, metadata)
+        if window is None:
+            features = load_features(data_path)
+            reference = DriftProfile.fit(features.frame(~holdout_mask(np.arange(len(features))),
+                                                        include_target=True))
+        else:
+            reference = DriftProfile.load(reference_path)
+            window_profile = reference.empty_like() if reference is not None else None
+            if window_profile is not None:
+                window_profile.update(window)
+                reference.merge(window_profile)
+            else:
+                reference = DriftProfile.fit(window)
+        reference.metadata = {'model_sha256': model_sha256, 'model_version': model_version,
+                              'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        reference.save(reference_path)
+        published['reference'] = reference
+
+    publish_model(candidate, model_path, before_swap=write_metadata)
+    # The registry next to the model file decides what the API serves
+    model_dir = os.path.dirname(model_path)
+    publish_version(candidate, model_version, registry_path=os.path.join(model_dir, 'registry.json'),
+                    models_dir=os.path.join(model_dir, 'versions'), params=candidate.get_params(),
+                    metrics=info['holdout'], retrain={k: v for k, v in info.items() if k != 'holdout'},
+                    source='retrain', drift_reference=published.get('reference'))
+    return model_version
+
+
+def run_retraining(mode, model_path='models/model.pkl', data_path='data/processed_data.csv',
+                   status_path=STATUS_PATH, history_path=HISTORY_PATH,
+                   metadata_path='models/model_meta.json', reference_path='models/drift_reference.json',
+                   new_trees=DEFAULT_NEW_TREES, window_days=DEFAULT_WINDOW_DAYS, window_rows=None,
+                   compare_full=False, severity=None):
+    """Retrain the served model and record timing and holdout quality
+
+    - warm_start adds `new_trees` trees fit on the recent window.
+    - replace does the same and drops as many of the oldest trees.
+    - full runs scripts/train.py, which never fits holdout rows.
+    All modes are scored on the recent window's rows in the fixed holdout
+    (model_comparison.holdout_mask), next to
+    the model they replace. A retrained model, full or warm-started, is
+    published only if its holdout MAE is within MAE_TOLERANCE of the current
+    model's. With
+    `compare_full` the job also times a from-scratch fit on the full
+    dataset, minus the holdout, so the modes can be compared in the history
+    at monitoring/retrain_history.jsonl.
+    """
+    import joblib
+
+    status = {'mode': mode, 'pid': os.getpid(), 'severity': severity,
+              'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    write_status(status_path, state='running', **status)
+    try:
+        model = joblib.load(model_path)
+        window = load_training_window(data_path, window_days=window_days, window_rows=window_rows)
+        if len(window) < 10:
+            raise ValueError(f"Only {len(window)} recent rows to retrain on")
+        # The window's share of the fixed holdout, which no trained or warm-started version ever fits
+        hold = holdout_mask(window.index.to_numpy())
+        if hold.all() or not hold.any():
+            raise ValueError(f"The {len(window)}-row window needs rows on both sides of the holdout")
+        X_fit, X_hold = window.loc[~hold, FEATURE_COLUMNS], window.loc[hold, FEATURE_COLUMNS]
+        y_fit, y_hold = window.loc[~hold, TARGET_COLUMN], window.loc[hold, TARGET_COLUMN]
+        baseline = holdout_metrics(model, X_hold, y_hold)
+
+        started = time.perf_counter()
+        if mode == 'full':
+            # train.py tests on the same fixed holdout, so it never fits the rows scored here. It only saves
+            # the candidate; like the warm-started modes it is published below if it passes the holdout check
+            with tempfile.TemporaryDirectory() as tmp:
+                candidate_path = os.path.join(tmp, 'candidate.pkl')
+                subprocess.run([sys.executable, TRAIN_SCRIPT, '--candidate-path', candidate_path], check=True)
+                candidate = joblib.load(candidate_path)
+        else:
+            candidate = warm_start_forest(model, X_fit, y_fit, new_trees, replace_oldest=(mode == 'replace'))
+        seconds = time.perf_counter() - started
+        quality = holdout_metrics(candidate, X_hold, y_hold)
+
+        record = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'mode': mode,
+            'severity': severity,
+            'seconds': seconds,
+            'window_rows': len(window),
+            'n_estimators': len(candidate.estimators_),
+            'previous': baseline,
+            'candidate': quality,
+        }
+        if compare_full and mode != 'full':
+            record['full_retrain'] = _full_retrain_baseline(model, data_path, X_hold.index, X_hold, y_hold)
+
+        accepted = quality['mae'] <= baseline['mae'] * (1 + MAE_TOLERANCE)
+        if accepted:
+            info = {'mode': mode, 'window_rows': len(window), 'holdout': quality}
+            if mode != 'full':
+                info['new_trees'] = new_trees
+            record['model_version'] = _publish_retrained(
+                candidate, model_path, data_path, reference_path, metadata_path, info,
+                window=None if mode == 'full' else window[FEATURE_COLUMNS + [TARGET_COLUMN]])
+        record['accepted'] = accepted
+
+        MetricsStore(history_path).append(record)
+        write_status(status_path, state='succeeded' if accepted else 'rejected', **status,
+                     finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), result=record)
+        return record
+    except Exception as e:
+        write_status(status_path, state='failed', **status,
+                     finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), error=str(e))
+        raise
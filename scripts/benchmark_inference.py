@@ -0,0 +1,84 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import joblib
+
+# Add parent directory to path so we can import tree_engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tree_engine import compile_forest
+
+FEATURES = ['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']
+
+def synthetic_features(n_rows, seed=0):
+    """Random rows in the processed feature space (scaled counts, calendar fields, interaction)"""
+    rng = np.random.RandomState(seed)
+    notifications = rng.rand(n_rows)
+    times_opened = rng.rand(n_rows)
+    return np.column_stack([
+        notifications,
+        times_opened,
+        rng.randint(0, 7, n_rows),
+        rng.randint(1, 13, n_rows),
+        notifications * times_opened,
+    ])
+
+def load_model_and_features(model_path, data_path, n_rows):
+    if os.path.exists(model_path):
+        model = joblib.load(model_path)
+        print(f"Loaded model from {model_path}")
+    else:
+        from sklearn.ensemble import RandomForestRegressor
+        print(f"{model_path} not found, fitting a synthetic forest with the train.py parameters")
+        X = synthetic_features(2000, seed=1)
+        y = 60 * X[:, 4] + 5 * X[:, 2] + np.random.RandomState(2).normal(0, 5, len(X))
+        model = RandomForestRegressor(n_estimators=100, max_depth=10, min_samples_split=2, random_state=42)
+        model.fit(X, y)
+
+    if os.path.exists(data_path):
+        import pandas as pd
+        X = pd.read_csv(data_path)[FEATURES].to_numpy(dtype=np.float64)
+        X = np.resize(X, (n_rows, X.shape[1]))
+    else:
+        X = synthetic_features(n_rows)
+    return model, X
+
+def time_calls(fn, X, repeats):
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        timings[i] = time.perf_counter() - start
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sklearn and compiled forest inference latency')
+    parser.add_argument('--model', default='models/model.pkl')
+    parser.add_argument('--data', default='data/processed_data.csv')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=200, help='Single-row calls per engine')
+    args = parser.parse_args()
+
+    model, X = load_model_and_features(args.model, args.data, args.batch_size)
+
+    start = time.perf_counter()
+    engine = compile_forest(model)
+    print(f"Compiled {engine.n_trees} trees / {engine.n_nodes} nodes in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    identical = np.array_equal(model.predict(X), engine.predict(X))
+    print(f"Predictions bit-for-bit identical: {identical}")
+
+    print(f"{'engine':<10}{'single p50 (us)':>18}{'single p99 (us)':>18}{'batch rows/s':>16}")
+    for name, fn in [('sklearn', model.predict), ('compiled', engine.predict)]:
+        single = time_calls(fn, X[:1], args.repeats) * 1e6
+        batch = time_calls(fn, X, 3).min()
+        print(f"{name:<10}{np.percentile(single, 50):>18.1f}{np.percentile(single, 99):>18.1f}"
+              f"{len(X) / batch:>16,.0f}")
+
+    if not identical:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
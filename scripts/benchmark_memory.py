@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def child_pids(parent_pid):
+    """PIDs whose parent is parent_pid, read from /proc"""
+    pids = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # The command name may contain spaces, so split after the closing parenthesis
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            pids.append(int(name))
+    return pids
+
+def memory_kb(pid):
+    """Rss, Pss and Uss (private pages) of a process from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'uss': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+def wait_until_ready(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+def send_predictions(port, count):
+    body = json.dumps({'notifications': 5, 'times_opened': 10, 'day_of_week': 3, 'month': 6}).encode()
+    for _ in range(count):
+        request = urllib.request.Request(f'http://127.0.0.1:{port}/api/predict', data=body,
+                                         headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request, timeout=5).read()
+
+def ensure_compiled_artifact(model_path):
+    """Build the shared compiled arrays up front so workers do not race to compile them"""
+    sys.path.append(ROOT_DIR)
+    from hashing import file_sha256
+    from model_manager import compiled_artifact_path, load_pickled_model, publish_compiled_model
+
+    model_path = os.path.abspath(model_path or os.path.join(ROOT_DIR, 'models', 'model.pkl'))
+    sha256 = file_sha256(model_path)
+    if not os.path.isdir(compiled_artifact_path(model_path, sha256)):
+        publish_compiled_model(load_pickled_model(model_path), model_path, sha256)
+
+def measure(mode, workers, model_path, timeout):
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), MODEL_WATCH_INTERVAL='0',
+               COMPILED_INFERENCE='true' if mode == 'mmap' else 'false')
+    if model_path:
+        env['MODEL_PATH'] = os.path.abspath(model_path)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                              cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_ready(port, timeout):
+            raise RuntimeError('gunicorn did not become ready')
+        # Wait for every worker to finish importing the app and loading the model
+        deadline = time.time() + timeout
+        while len(child_pids(server.pid)) < workers and time.time() < deadline:
+            time.sleep(0.2)
+        send_predictions(port, workers * 20)
+        time.sleep(1)
+        return [memory_kb(pid) for pid in child_pids(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure memory per gunicorn worker with and without the shared model')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--model', default=None, help='Model pickle to serve (defaults to models/model.pkl)')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit('This benchmark needs Linux /proc/<pid>/smaps_rollup')
+
+    ensure_compiled_artifact(args.model)
+
+    print(f"{'mode':<8}{'workers':>8}{'RSS/worker MB':>16}{'PSS/worker MB':>16}{'USS/worker MB':>16}{'total PSS MB':>15}")
+    for mode in ('pickle', 'mmap'):
+        stats = measure(mode, args.workers, args.model, args.timeout)
+        n = len(stats)
+        mean = lambda key: sum(s[key] for s in stats) / n / 1024
+        total_pss = sum(s['pss'] for s in stats) / 1024
+        print(f"{mode:<8}{n:>8}{mean('rss'):>16.1f}{mean('pss'):>16.1f}{mean('uss'):>16.1f}{total_pss:>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the prediction path should not need at startup
+HEAVY_MODULES = ['pandas', 'matplotlib', 'sklearn', 'joblib', 'mlflow']
+
+# Runs in a fresh interpreter: time `import app`, then the first /api/predict call
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().post('/api/predict', json={
+    'notifications': 5, 'times_opened': 10, 'day_of_week': 3, 'month': 6})
+predicted = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'first_prediction_seconds': predicted - imported,
+    'status': response.status_code,
+    'modules_loaded': [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def run_probe(env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    probe['process_seconds'] = wall
+    return probe
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure API import time and time-to-first-prediction')
+    parser.add_argument('--model', default=None, help='Model pickle to serve (defaults to models/model.pkl)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default=None, help='Append the summary as one JSON line to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_WATCH_INTERVAL='0', PYTHONDONTWRITEBYTECODE='1')
+    if args.model:
+        env['MODEL_PATH'] = os.path.abspath(args.model)
+
+    # The first run may compile and cache the forest, so it is reported separately
+    first = run_probe(env)
+    runs = [run_probe(env) for _ in range(args.runs)]
+
+    summary = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'runs': args.runs,
+        'first_run': first,
+        'median_import_seconds': statistics.median(r['import_seconds'] for r in runs),
+        'median_first_prediction_seconds': statistics.median(r['first_prediction_seconds'] for r in runs),
+        'median_process_seconds': statistics.median(r['process_seconds'] for r in runs),
+        'prediction_status': runs[-1]['status'],
+        'modules_loaded': runs[-1]['modules_loaded'],
+    }
+
+    print(f"Import time:            {summary['median_import_seconds'] * 1000:8.1f} ms")
+    print(f"Time to first predict:  {summary['median_first_prediction_seconds'] * 1000:8.1f} ms "
+          f"(HTTP {summary['prediction_status']})")
+    print(f"Process wall time:      {summary['median_process_seconds'] * 1000:8.1f} ms")
+    print(f"First run (cold cache): {(first['import_seconds'] + first['first_prediction_seconds']) * 1000:8.1f} ms")
+    print(f"Heavy modules loaded:   {', '.join(summary['modules_loaded']) or 'none'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+if __name__ == "__main__":
+    main()
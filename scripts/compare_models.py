@@ -1,41 +1,36 @@
+import argparse
 import pandas as pd
-import joblib
 import os
 import matplotlib.pyplot as plt
-from sklearn.metrics import mean_absolute_error, r2_score
-
-def compare_models(data_path='data/processed_data.csv', models_dir='models/versions'):
-    # Load test data
-    data = pd.read_csv(data_path)
-    X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
-    y = data['Usage (minutes)']
-    
-    # Find all model versions
-    model_files = [f for f in os.listdir(models_dir) if f.endswith('.pkl')]
-    
-    if not model_files:
+import sys
+
+# Add parent directory to path so we can import the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_comparison import CACHE_DIR, COMPARISON_PATH, MODELS_DIR, compare_versions
+
+def compare_models(data_path='data/processed_data.csv', models_dir=MODELS_DIR, holdout=False, n_jobs=None,
+                   cache_dir=CACHE_DIR, output_path=COMPARISON_PATH):
+    # Score new versions in parallel; versions already scored on this exact dataset come from the cache
+    report = compare_versions(data_path, models_dir, holdout=holdout, n_jobs=n_jobs, cache_dir=cache_dir,
+                              output_path=output_path)
+
+    if not report['versions']:
         print("No model versions found!")
         return
-    
-    # Compare models
-    results = []
-    for model_file in model_files:
-        model = joblib.load(os.path.join(models_dir, model_file))
-        predictions = model.predict(X)
-        mae = mean_absolute_error(y, predictions)
-        r2 = r2_score(y, predictions)
-        
-        version = model_file.replace('model_', '').replace('.pkl', '')
-        results.append({
-            'version': version,
-            'mae': mae,
-            'r2': r2
-        })
-    
+
+    for entry in report['versions']:
+        if 'error' in entry:
+            print(f"Could not evaluate {entry['file']}: {entry['error']}")
+    scored = [entry for entry in report['versions'] if 'error' not in entry]
+    if not scored:
+        print("No model version could be evaluated!")
+        return
+
     # Convert to DataFrame for better display
-    results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values('version')
-    
+    results_df = pd.DataFrame(scored)[['version', 'stage', 'mae', 'r2', 'count', 'cached']]
+    results_df = results_df.sort_values('version').reset_index(drop=True)
+
     # Plot results
     plt.figure(figsize=(12, 6))
     plt.subplot(1, 2, 1)
@@ -43,21 +38,36 @@ def compare_models(data_path='data/processed_data.csv', models_dir='models/versi
     plt.title('MAE by Model Version')
     plt.xticks(rotation=45)
     plt.ylabel('Mean Absolute Error')
-    
+
     plt.subplot(1, 2, 2)
     plt.plot(results_df['version'], results_df['r2'], marker='o', color='green')
     plt.title('R² by Model Version')
     plt.xticks(rotation=45)
     plt.ylabel('R² Score')
-    
+
     plt.tight_layout()
     plt.savefig('models/model_comparison.png')
-    
+
     print(results_df)
-    print(f"Best model by MAE: {results_df.iloc[results_df['mae'].idxmin()]['version']}")
-    print(f"Best model by R²: {results_df.iloc[results_df['r2'].idxmax()]['version']}")
-    
+    print(f"Scored {int((~results_df['cached']).sum())} new versions on the {report['dataset']['scope']} dataset, "
+          f"{int(results_df['cached'].sum())} from the cache")
+    print(f"Best model by MAE: {report['best_mae']}")
+    print(f"Best model by R²: {report['best_r2']}")
+    if output_path:
+        print(f"Results written to {output_path}")
+
     return results_df
 
+def main():
+    parser = argparse.ArgumentParser(description='Compare the saved model versions on the processed dataset')
+    parser.add_argument('--data', default='data/processed_data.csv')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--holdout', action='store_true',
+                        help="Score only the fixed holdout (train.py's test split) instead of every row")
+    parser.add_argument('--n-jobs', type=int, default=0, help='Worker processes (0: every core)')
+    parser.add_argument('--output', default=COMPARISON_PATH, help='JSON report read by the dashboard')
+    args = parser.parse_args()
+    compare_models(args.data, args.models_dir, holdout=args.holdout, n_jobs=args.n_jobs, output_path=args.output)
+
 if __name__ == "__main__":
-    compare_models()
\ No newline at end of file
+    main()
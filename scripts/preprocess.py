@@ -1,31 +1,36 @@
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-import joblib
-
-# Load data
-data = pd.read_csv('data/screentime_analysis.csv')
-
-# check for missing values and duplicates
-print(data.isnull().sum())
-print(data.duplicated().sum())
-
-# convert Date column to datetime and extract features
-data['Date'] = pd.to_datetime(data['Date'])
-data['DayOfWeek'] = data['Date'].dt.dayofweek
-data['Month'] = data['Date'].dt.month
-
-# encode the categorical 'App' column using one-hot encoding
-data = pd.get_dummies(data, columns=['App'], drop_first=True)
-
-# scale numerical features using MinMaxScaler
-scaler = MinMaxScaler()
-data[['Notifications', 'Times Opened']] = scaler.fit_transform(data[['Notifications', 'Times Opened']])
-
-# feature engineering
-data['Previous_Day_Usage'] = data['Usage (minutes)'].shift(1)
-data['Notifications_x_TimesOpened'] = data['Notifications'] * data['Times Opened']
-
-# Save preprocessed data
-data.to_csv('data/processed_data.csv', index=False)
-
-print("Preprocessing complete! Saved to data/processed_data.csv")
\ No newline at end of file
+import argparse
+import os
+import sys
+
+# Add parent directory to path so we can import the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import DEFAULT_CHUNK_SIZE, PROCESSED_PATH, RAW_PATH, STATE_PATH, run_preprocessing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocess the raw screen time data')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild everything instead of appending the rows added since the last run')
+    parser.add_argument('--raw', default=RAW_PATH)
+    parser.add_argument('--output', default=PROCESSED_PATH)
+    parser.add_argument('--state', default=STATE_PATH)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    result = run_preprocessing(args.raw, args.output, args.state, full=args.full, chunksize=args.chunksize)
+
+    if result['mode'] == 'full':
+        if 'reason' in result:
+            print(f"Full rebuild: {result['reason']}")
+        # check for missing values and duplicates
+        for column, count in result['nulls'].items():
+            print(f"{column:<20} {count}")
+        print(f"Duplicate rows: {result['duplicates']}")
+    else:
+        print(f"Appended {result['rows_added']} new rows ({result['late_rows']} dated before the previous watermark)")
+    print(f"Watermark: {result['watermark']}")
+    print(f"Preprocessing complete! Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+import sys
+from datetime import datetime
+
+# Add parent directory to path so we can import the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import MODELS_DIR, REGISTRY_PATH, ModelRegistry, drift_reference_path
+
+def list_versions(registry):
+    versions = registry.list_versions()
+    if not versions:
+        print("No registered model versions; run with 'scan' to index models/versions")
+    for entry in versions:
+        metrics = entry.get('metrics') or {}
+        r2 = metrics.get('test_r2', metrics.get('r2'))
+        print(f"{entry['version']}  {entry['stage']:<10}  {entry['size_bytes'] / 1e6:8.2f} MB  "
+              f"created {entry['created_at']}" + (f"  R² {r2:.4f}" if r2 is not None else ""))
+
+def refresh_model_files(registry, entry, model_path, data_path):
+    """Write the metadata and drift reference next to `model_path` for a promoted version
+
+    The metadata comes from the registry entry, with the prediction range
+    scored on the current dataset. The drift reference is the one saved with
+    the version; versions published without one get a profile of the
+    current dataset's training rows (everything but the fixed holdout).
+    """
+    import numpy as np
+    from drift import DriftProfile
+    from feature_store import load_features
+    from hashing import file_fingerprint
+    from model_comparison import holdout_mask
+    from model_manager import load_pickled_model
+    from prediction_stats import build_range_metadata, compute_prediction_range, save_model_metadata
+    from tree_engine import make_predict_fn
+
+    model_dir = os.path.dirname(model_path)
+    metadata = {
+        'model_sha256': entry['sha256'],
+        'model_version': entry['version'],
+        'created_at': entry['created_at'],
+        'params': entry.get('params'),
+        **{key: entry[key] for key in ('metrics', 'serving_cost', 'retrain') if entry.get(key) is not None},
+    }
+    if os.path.exists(data_path):
+        model = load_pickled_model(registry.file_path(entry), expected_sha256=entry['sha256'])
+        prediction_range = compute_prediction_range(make_predict_fn(model), data_path)
+        metadata['prediction_range'] = build_range_metadata(prediction_range, data_path,
+                                                            file_fingerprint(data_path))
+    save_model_metadata(os.path.join(model_dir, 'model_meta.json'), metadata)
+
+    reference = DriftProfile.load(drift_reference_path(entry['version'], registry.models_dir))
+    if reference is None and os.path.exists(data_path):
+        features = load_features(data_path)
+        reference = DriftProfile.fit(features.frame(~holdout_mask(np.arange(len(features))), include_target=True))
+    if reference is not None:
+        reference.metadata = {'model_sha256': entry['sha256'], 'model_version': entry['version'],
+                              'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        reference.save(os.path.join(model_dir, 'drift_reference.json'))
+
+def promote(registry, version, model_path, data_path='data/processed_data.csv'):
+    entry = registry.get(version)
+    if entry is None:
+        raise SystemExit(f"Unknown model version {version}")
+    # Metadata and drift reference first, so they already match when the API or monitoring picks up the switch
+    if model_path:
+        refresh_model_files(registry, entry, model_path, data_path)
+    registry.promote(version)
+    # Keep models/model.pkl in step for the scripts that read it directly (monitoring, scoring, retraining)
+    if model_path:
+        tmp_path = f"{model_path}.tmp"
+        shutil.copyfile(registry.file_path(entry), tmp_path)
+        os.replace(tmp_path, model_path)
+    print(f"{version} is now the production model")
+
+def main():
+    parser = argparse.ArgumentParser(description='List, index and promote model versions')
+    parser.add_argument('--registry', default=REGISTRY_PATH)
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='Show every registered version')
+    subparsers.add_parser('scan', help='Register pickles in the versions folder that are not indexed yet')
+    promote_parser = subparsers.add_parser('promote', help='Make a version the production model')
+    promote_parser.add_argument('version')
+    promote_parser.add_argument('--model-path', default='models/model.pkl',
+                                help="Also copy the version here and refresh the model_meta.json and "
+                                     "drift_reference.json next to it ('' to skip)")
+    promote_parser.add_argument('--data-path', default='data/processed_data.csv',
+                                help='Dataset to compute the prediction range (and a missing drift reference) on')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry, args.models_dir)
+    if args.command == 'scan':
+        added = registry.scan()
+        print(f"Registered {len(added)} new versions" + (f": {', '.join(added)}" if added else ""))
+    elif args.command == 'promote':
+        promote(registry, args.version, args.model_path, args.data_path)
+    else:
+        list_versions(registry)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+
+# Add parent directory to path so we can import the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retraining import (DEFAULT_NEW_TREES, DEFAULT_WINDOW_DAYS, RETRAIN_MODES, STATUS_PATH,
+                        run_retraining)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Retrain the current model on recent data')
+    parser.add_argument('--mode', choices=RETRAIN_MODES, default='warm_start',
+                        help='warm_start adds trees, replace swaps out the oldest trees, full runs train.py')
+    parser.add_argument('--new-trees', type=int, default=int(os.getenv('RETRAIN_NEW_TREES', DEFAULT_NEW_TREES)))
+    parser.add_argument('--window-days', type=float,
+                        default=float(os.getenv('RETRAIN_WINDOW_DAYS', DEFAULT_WINDOW_DAYS)))
+    parser.add_argument('--window-rows', type=int, default=None,
+                        help='Use the last N rows instead of a date window')
+    parser.add_argument('--compare-full', action='store_true',
+                        help='Also time a full retrain and record its holdout quality')
+    parser.add_argument('--severity', type=float, default=None, help='Drift severity that triggered the job')
+    parser.add_argument('--status-path', default=STATUS_PATH)
+    args = parser.parse_args()
+
+    compare_full = args.compare_full or os.getenv('RETRAIN_COMPARE_FULL', '').lower() in ('1', 'true', 'yes')
+    record = run_retraining(args.mode, new_trees=args.new_trees, window_days=args.window_days,
+                            window_rows=args.window_rows, compare_full=compare_full,
+                            severity=args.severity, status_path=args.status_path)
+
+    print(f"Mode:       {record['mode']} ({record['seconds']:.2f} s on {record['window_rows']} rows)")
+    print(f"Holdout MAE: {record['previous']['mae']:.4f} -> {record['candidate']['mae']:.4f}")
+    if 'full_retrain' in record:
+        full = record['full_retrain']
+        print(f"Full retrain: {full['seconds']:.2f} s, holdout MAE {full['mae']:.4f}")
+    print("Published new model" if record['accepted'] else "Rejected: holdout MAE got worse")
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,243 @@
-import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import argparse
 import joblib
 import mlflow
 import mlflow.sklearn
 import os
+import sys
 from datetime import datetime
 
-# Set MLflow experiment name
-mlflow.set_experiment("screen_time_prediction")
-
-# Load preprocessed data
-data = pd.read_csv('data/processed_data.csv')
-
-# Load the saved scaler (optional, since data is already scaled)
-scaler = joblib.load('models/scaler.pkl')
-
-# Define features and target
-X = data[['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']]
-y = data['Usage (minutes)']
-
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Define model parameters
-params = {
-    'n_estimators': 100,
-    'max_depth': 10,
-    'min_samples_split': 2,
-    'random_state': 42
-}
-
-# Start a new MLflow run
-with mlflow.start_run(run_name=f"screen_time_model_{datetime.now().strftime('%Y%m%d_%H%M%S')}"):
-    # Log parameters
-    mlflow.log_params(params)
-    
-    # Train the model
-    model = RandomForestRegressor(**params)
-    model.fit(X_train, y_train)
-    
-    # Evaluate the model
-    train_predictions = model.predict(X_train)
-    test_predictions = model.predict(X_test)
-    
-    # Calculate metrics
-    mae = mean_absolute_error(y_test, test_predictions)
-    mse = mean_squared_error(y_test, test_predictions)
-    r2 = r2_score(y_test, test_predictions)
-    
-    # Log metrics
-    mlflow.log_metric("train_mae", mean_absolute_error(y_train, train_predictions))
-    mlflow.log_metric("test_mae", mae)
-    mlflow.log_metric("test_mse", mse)
-    mlflow.log_metric("test_r2", r2)
-    
-    # Log model
-    mlflow.sklearn.log_model(model, "random_forest_model")
-    
-    # Save the model to disk (regular save)
-    model_version = datetime.now().strftime('%Y%m%d_%H%M%S')
-    model_dir = 'models/versions'
-    os.makedirs(model_dir, exist_ok=True)
-    joblib.dump(model, f'{model_dir}/model_{model_version}.pkl')
-    
-    # Also save as the current model
-    joblib.dump(model, 'models/model.pkl')
-
-    print(f'Mean Absolute Error: {mae}')
-    print(f'Mean Squared Error: {mse}')
-    print(f'R² Score: {r2}')
-    print(f"Training complete! Model saved to models/model.pkl and versioned at models/versions/model_{model_version}.pkl")
-    print(f"Run ID: {mlflow.active_run().info.run_id}")
\ No newline at end of file
+# Add parent directory to path so we can import the shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hashing import file_fingerprint
+from prediction_stats import build_range_metadata, compute_prediction_range, save_model_metadata
+from tree_engine import make_predict_fn
+from model_manager import publish_model
+from model_registry import publish_version
+from drift import DriftProfile
+from feature_store import load_features
+from feature_transform import attach_transform
+from preprocessing import load_transform
+from model_search import (DEFAULT_CANDIDATES, DEFAULT_FACTOR, VALIDATION_FRACTION, log_nested_run, log_rung,
+                          sample_candidates, successive_halving)
+from model_comparison import holdout_mask
+from model_budget import DEFAULT_BATCH_ROWS, budget_violations, measure_serving_cost, trim_to_budget
+
+
+def search_params(data_path, train_rows, args):
+    """Successive-halving search over model_search.SEARCH_SPACE, with every trial logged to the active run
+
+    Returns the parameters of the last rung's candidates, best first.
+    """
+    from mlflow.tracking import MlflowClient
+
+    client = MlflowClient()
+    run = mlflow.active_run()
+    candidates = sample_candidates(n_candidates=args.candidates, random_state=42)
+
+    def on_rung(rung, trials):
+        # One batched request per rung on this run
+        log_rung(client, run.info.run_id, rung, trials)
+        print(f"Rung {rung}: {len(trials)} candidates on {trials[0]['n_samples']} rows, "
+              f"best val MAE {trials[0]['val_mae']:.4f} with {trials[0]['params']}")
+
+    _, trials = successive_halving(data_path, train_rows, candidates, factor=args.factor,
+                                   n_jobs=args.n_jobs, random_state=42, on_rung=on_rung)
+    mlflow.log_dict({'trials': trials}, 'search_trials.json')
+    last_rung = trials[-1]['rung']
+    return [trial['params'] for trial in trials if trial['rung'] == last_rung]
+
+
+def select_within_budget(candidates, X_train, y_train, args):
+    """Fit each candidate and return (model, params, cost) with the best validation R² that meets the budget
+
+    Candidates are fitted on the training split minus a VALIDATION_FRACTION
+    and scored on that remainder, so the test split only scores the winner
+    and its reported metrics stay unbiased. The winner ships as fitted, so
+    the measured budget is the one it serves with. Every candidate's serving
+    latency, size and load time are measured and logged as a nested MLflow
+    run. With --trim an over-budget forest is also tried with as many of its
+    trees as fit the budget.
+    """
+    from mlflow.tracking import MlflowClient
+
+    client = MlflowClient()
+    run = mlflow.active_run()
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=VALIDATION_FRACTION, random_state=42)
+    X_sample = X_val.to_numpy()[:DEFAULT_BATCH_ROWS]
+    selected = None
+    for i, candidate_params in enumerate(candidates):
+        model = RandomForestRegressor(**candidate_params, n_jobs=args.n_jobs if args.n_jobs > 0 else -1)
+        model.fit(X_fit, y_fit)
+        model.set_params(n_jobs=None)
+        options = [(model, measure_serving_cost(model, X_sample), False)]
+        if args.trim and budget_violations(options[0][1], args.max_p99_us, args.max_size_mb):
+            trimmed, cost = trim_to_budget(model, X_sample, args.max_p99_us, args.max_size_mb)
+            if trimmed is not None:
+                options.append((trimmed, cost, True))
+
+        for option, cost, trimmed in options:
+            r2 = r2_score(y_val, option.predict(X_val))
+            violations = budget_violations(cost, args.max_p99_us, args.max_size_mb)
+            option_params = {**candidate_params, 'n_estimators': len(option.estimators_)}
+            log_nested_run(client, run.info.experiment_id, run.info.run_id,
+                           f"candidate-{i}{'-trimmed' if trimmed else ''}", params=option_params,
+                           metrics={'val_r2': r2, **cost},
+                           tags={'within_budget': not violations, 'trimmed': trimmed})
+            print(f"Candidate {i}{' (trimmed)' if trimmed else ''}: validation R² {r2:.4f}, "
+                  f"p99 {cost['latency_single_p99_us']:.0f} us, {cost['size_mb']:.2f} MB"
+                  + (f" - over budget: {', '.join(violations)}" if violations else ""))
+            if not violations and (selected is None or r2 > selected[3]):
+                selected = (option, option_params, cost, r2)
+    if selected is None:
+        raise SystemExit("No candidate meets the latency and size budget; relax it or pass --trim")
+    return selected[:3]
+
+
+def _env_float(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the screen time model and publish it as models/model.pkl')
+    parser.add_argument('--search', action='store_true',
+                        help='Pick n_estimators, max_depth and min_samples_split with a successive-halving search')
+    parser.add_argument('--candidates', type=int, default=int(os.getenv('TRAIN_SEARCH_CANDIDATES', DEFAULT_CANDIDATES)))
+    parser.add_argument('--factor', type=int, default=DEFAULT_FACTOR,
+                        help='Keep 1/factor of the candidates per rung and give them factor x the rows')
+    parser.add_argument('--n-jobs', type=int, default=int(os.getenv('TRAIN_N_JOBS', 0)),
+                        help='Worker processes for the search and threads for the final fit (0: every core)')
+    parser.add_argument('--max-p99-us', type=float, default=_env_float('TRAIN_MAX_P99_US'),
+                        help='Only ship a model whose single-row p99 latency is below this many microseconds')
+    parser.add_argument('--max-size-mb', type=float, default=_env_float('TRAIN_MAX_SIZE_MB'),
+                        help='Only ship a model whose pickle is smaller than this many MB')
+    parser.add_argument('--trim', action='store_true',
+                        help='Drop trees from over-budget forests until they fit the budget')
+    parser.add_argument('--candidate-path',
+                        help='Only save the fitted model here instead of publishing it (retraining checks it first)')
+    args = parser.parse_args()
+    constrained = args.max_p99_us is not None or args.max_size_mb is not None
+
+    # Set MLflow experiment name
+    mlflow.set_experiment("screen_time_prediction")
+
+    # Load preprocessed data from its memory-mapped feature store (converted from the CSV if needed)
+    data_path = 'data/processed_data.csv'
+    features = load_features(data_path)
+
+    # The scaling and interaction features the data was preprocessed with, bundled with the model
+    # so the API applies exactly the same transform to raw request inputs
+    feature_transform = load_transform()
+
+    # Define features and target
+    X = features.frame()
+    y = features.y
+
+    # The test split is the fixed holdout (chosen per row, so it stays put as data is appended). No version
+    # trained here or by a retraining job ever fits these rows, so scripts/compare_models.py --holdout is fair
+    test = holdout_mask(X.index.to_numpy())
+    X_train, X_test, y_train, y_test = X[~test], X[test], y[~test], y[test]
+
+    # Define model parameters
+    params = {
+        'n_estimators': 100,
+        'max_depth': 10,
+        'min_samples_split': 2,
+        'random_state': 42
+    }
+
+    # Start a new MLflow run
+    with mlflow.start_run(run_name=f"screen_time_model_{datetime.now().strftime('%Y%m%d_%H%M%S')}"):
+        candidates = [params]
+        if args.search:
+            # The search only sees the training split; the test split still scores the winner
+            finalists = search_params(data_path, X_train.index.to_numpy(), args)
+            candidates = [{**params, **finalist} for finalist in finalists]
+
+        if constrained:
+            # Best validation R² among the candidates (or their trimmed forests) that meet the serving budget
+            model, params, serving_cost = select_within_budget(candidates, X_train, y_train, args)
+        else:
+            # Train the model on every core, then reset n_jobs so serving does not start a thread pool per request
+            params = candidates[0]
+            model = RandomForestRegressor(**params, n_jobs=args.n_jobs if args.n_jobs > 0 else -1)
+            model.fit(X_train, y_train)
+            model.set_params(n_jobs=None)
+            serving_cost = measure_serving_cost(model, X_test.to_numpy()[:DEFAULT_BATCH_ROWS])
+        attach_transform(model, feature_transform)
+
+        # Log parameters
+        mlflow.log_params(params)
+        mlflow.log_dict(feature_transform.to_dict(), "feature_transform.json")
+        # Single-row and batch latency, pickle size and load time, next to the quality metrics
+        mlflow.log_metrics(serving_cost)
+
+        # Evaluate the model
+        train_predictions = model.predict(X_train)
+        test_predictions = model.predict(X_test)
+
+        # Calculate metrics
+        mae = mean_absolute_error(y_test, test_predictions)
+        mse = mean_squared_error(y_test, test_predictions)
+        r2 = r2_score(y_test, test_predictions)
+
+        # Log metrics
+        mlflow.log_metric("train_mae", mean_absolute_error(y_train, train_predictions))
+        mlflow.log_metric("test_mae", mae)
+        mlflow.log_metric("test_mse", mse)
+        mlflow.log_metric("test_r2", r2)
+
+        # Log model
+        mlflow.sklearn.log_model(model, "random_forest_model")
+
+        if args.candidate_path:
+            joblib.dump(model, args.candidate_path)
+            print(f'Mean Absolute Error: {mae}')
+            print(f"Training complete! Candidate saved to {args.candidate_path}")
+            return
+
+        model_version = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        # Precompute the prediction range served by /api/model-range and store it with the model
+        prediction_range = compute_prediction_range(make_predict_fn(model), data_path)
+
+        # Also save as the current model. publish_model renames the pickle into place so a running
+        # API never hot-reloads a half-written file, and the metadata and drift profile are written
+        # first so they are already in place when the new model is picked up
+        # Per-feature sketches of the training data; drift checks compare against these instead of raw CSVs
+        drift_reference = DriftProfile.fit(X_train.assign(**{'Usage (minutes)': y_train}))
+
+        def write_model_metadata(model_sha256):
+            save_model_metadata('models/model_meta.json', {
+                'model_sha256': model_sha256,
+                'model_version': model_version,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'params': params,
+                'metrics': {'test_mae': mae, 'test_mse': mse, 'test_r2': r2},
+                'serving_cost': serving_cost,
+                'prediction_range': build_range_metadata(prediction_range, data_path, file_fingerprint(data_path)),
+            })
+            drift_reference.metadata = {'model_sha256': model_sha256, 'model_version': model_version,
+                                        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+            drift_reference.save('models/drift_reference.json')
+
+        publish_model(model, 'models/model.pkl', before_swap=write_model_metadata)
+
+        # Save the version and make it the registry's production model, which is what the API serves
+        publish_version(model, model_version, params=params,
+                        metrics={'test_mae': mae, 'test_mse': mse, 'test_r2': r2},
+                        serving_cost=serving_cost, mlflow_run_id=mlflow.active_run().info.run_id, source='train',
+                        drift_reference=drift_reference)
+
+        print(f'Mean Absolute Error: {mae}')
+        print(f'Mean Squared Error: {mse}')
+        print(f'R² Score: {r2}')
+        print(f"Training complete! Model saved to models/model.pkl and versioned at models/versions/model_{model_version}.pkl")
+        print(f"Run ID: {mlflow.active_run().info.run_id}")
+
+if __name__ == "__main__":
+    main()
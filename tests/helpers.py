@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+
+def make_dataset(n, seed=0, start='2024-01-01'):
+    """A processed dataset of `n` hourly rows, whose usage depends on notifications and day of week"""
+    rng = np.random.RandomState(seed)
+    data = pd.DataFrame({
+        'Date': pd.date_range(start, periods=n, freq='h'),
+        'Notifications': rng.uniform(0, 1, n),
+        'Times Opened': rng.uniform(0, 1, n),
+        'DayOfWeek': rng.randint(0, 7, n),
+        'Month': rng.randint(1, 13, n),
+    })
+    data['Notifications_x_TimesOpened'] = data['Notifications'] * data['Times Opened']
+    data['Usage (minutes)'] = 60 * data['Notifications'] + 5 * data['DayOfWeek'] + rng.normal(0, 5, n)
+    return data
@@ -3,11 +3,35 @@ import unittest
 import json
 import sys
 import os
+import shutil
+import tempfile
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
 
 # Add parent directory to path so we can import app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import app as app_module
 from app import app
+from audit_log import AuditLogReader, PredictionAuditLog, audit_entry_rows
+from batching import MicroBatcher
+from prediction_cache import PredictionCache
+from model_registry import ModelCache, ModelRegistry, publish_version
+
+def make_test_model():
+    """Fit a small forest on synthetic data shaped like processed_data.csv"""
+    rng = np.random.RandomState(0)
+    notifications = rng.uniform(0, 100, 200)
+    times_opened = rng.uniform(0, 50, 200)
+    X = np.column_stack([
+        notifications,
+        times_opened,
+        rng.randint(0, 7, 200),
+        rng.randint(1, 13, 200),
+        notifications * times_opened,
+    ])
+    y = 0.02 * X[:, 4] + rng.normal(0, 5, 200)
+    return RandomForestRegressor(n_estimators=10, max_depth=6, random_state=42).fit(X, y)
 
 class TestAPI(unittest.TestCase):
     def setUp(self):
@@ -35,5 +59,248 @@ class TestAPI(unittest.TestCase):
         self.assertIn('predicted_usage_minutes', data)
         self.assertIn('notification', data)
 
+class TestBatchPredict(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = make_test_model()
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self._original_model = app_module.model_manager.current
+        self._original_cache = app_module.prediction_cache
+        app_module.prediction_cache = PredictionCache(max_size=100)
+        app_module.model_manager.swap(self.model, version='test')
+        app_module.admission.reset()
+        self.audit_dir = tempfile.mkdtemp()
+        self._original_audit_log = app_module.audit_log
+        app_module.audit_log = PredictionAuditLog(os.path.join(self.audit_dir, 'prediction_log.jsonl'))
+
+    def tearDown(self):
+        app_module.model_manager._current = self._original_model
+        app_module.prediction_cache = self._original_cache
+        app_module.audit_log.close()
+        app_module.audit_log = self._original_audit_log
+        shutil.rmtree(self.audit_dir)
+
+    def post_batch(self, payload):
+        response = self.app.post('/api/predict/batch',
+                                 data=json.dumps(payload),
+                                 content_type='application/json')
+        return response, json.loads(response.data)
+
+    def test_rows_match_single_predictions(self):
+        rows = [
+            {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6},
+            {"notifications": 80, "times_opened": 45, "day_of_week": 0, "month": 12},
+        ]
+        response, data = self.post_batch(rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['valid'], 2)
+        self.assertEqual(data['errors'], [])
+        for row, result in zip(rows, data['predictions']):
+            single = self.app.post('/api/predict', data=json.dumps(row), content_type='application/json')
+            self.assertEqual(result, json.loads(single.data))
+
+    def test_columnar_input_matches_row_input(self):
+        rows = [
+            {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6},
+            {"notifications": 20, "times_opened": 2, "day_of_week": 6, "month": 1},
+        ]
+        columns = {name: [row[name] for row in rows] for name in rows[0]}
+        _, by_rows = self.post_batch({"instances": rows})
+        response, by_columns = self.post_batch({"columns": columns})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(by_rows, by_columns)
+
+    def test_invalid_rows_are_reported_per_row(self):
+        rows = [
+            {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6},
+            {"notifications": 5, "times_opened": 10, "day_of_week": 9, "month": 13},
+            {"notifications": "abc", "times_opened": 10, "day_of_week": 3, "month": 6},
+            {"notifications": 5, "day_of_week": 3, "month": 6},
+            {"notifications": 101, "times_opened": 10, "day_of_week": 3, "month": 6},
+        ]
+        response, data = self.post_batch(rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['valid'], 1)
+        self.assertIsNotNone(data['predictions'][0])
+        self.assertEqual(data['predictions'][1:], [None] * 4)
+        self.assertEqual([error['index'] for error in data['errors']], [1, 2, 3, 4])
+        self.assertEqual(data['errors'][0]['error'], "day_of_week must be between 0 and 6")
+        self.assertIn("notifications", data['errors'][1]['error'])
+        self.assertIn("times_opened", data['errors'][2]['error'])
+        self.assertEqual(data['errors'][3]['error'], "notifications must be between 0 and 100")
+
+    def test_compiled_engine_matches_model(self):
+        rows = [
+            {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6},
+            {"notifications": 80, "times_opened": 45, "day_of_week": 0, "month": 12},
+        ]
+        _, compiled = self.post_batch(rows)
+        self.assertTrue(app_module.model_manager.current.info()['compiled'])
+        app_module.model_manager.swap(self.model, version='test', compile_model=False)
+        _, uncompiled = self.post_batch(rows)
+        self.assertEqual(compiled, uncompiled)
+
+    def test_raw_inputs_go_through_the_bundled_transform(self):
+        from feature_transform import FeatureTransform, attach_transform
+
+        transform = FeatureTransform.from_min_max([0, 1], [100, 50])
+        model = attach_transform(make_test_model(), transform)
+        app_module.model_manager.swap(model, version='scaled')
+        row = {"notifications": 80, "times_opened": 45, "day_of_week": 0, "month": 12}
+        expected = model.predict(transform.transform([[80, 45, 0, 12]]))[0]
+
+        single = json.loads(self.app.post('/api/predict', data=json.dumps(row),
+                                          content_type='application/json').data)
+        _, batch = self.post_batch([row])
+        self.assertEqual(single['predicted_usage_minutes'], round(expected, 2))
+        self.assertEqual(batch['predictions'][0], single)
+
+    def test_model_range_is_computed_once_then_served_from_metadata(self):
+        import tempfile
+        import pandas as pd
+        from model_manager import LoadedModel
+        from prediction_stats import save_model_metadata, FEATURE_COLUMNS
+
+        original_paths = app_module.DATA_PATH, app_module.MODEL_METADATA_PATH
+        with tempfile.TemporaryDirectory() as tmp:
+            app_module.DATA_PATH = os.path.join(tmp, 'processed_data.csv')
+            app_module.MODEL_METADATA_PATH = os.path.join(tmp, 'model_meta.json')
+            try:
+                pd.DataFrame(np.random.RandomState(0).rand(50, 5) * [100, 50, 6, 12, 5000],
+                             columns=FEATURE_COLUMNS).to_csv(app_module.DATA_PATH, index=False)
+                computed = json.loads(self.app.get('/api/model-range').data)
+                self.assertEqual(computed['source'], 'computed')
+                self.assertEqual(computed['count'], 50)
+
+                # A model whose hash matches the stored metadata skips scoring entirely
+                save_model_metadata(app_module.MODEL_METADATA_PATH, {
+                    'model_sha256': 'abc',
+                    'prediction_range': {'min': 1, 'max': 2, 'avg': 1.5, 'count': 50,
+                                         'dataset_fingerprint': app_module.file_fingerprint(app_module.DATA_PATH)},
+                })
+                app_module.model_manager._current = LoadedModel(self.model, None, 'other', None, None, 0.0,
+                                                                sha256='abc')
+                stored = json.loads(self.app.get('/api/model-range').data)
+                self.assertEqual(stored, {'min': 1, 'max': 2, 'avg': 1.5, 'count': 50, 'source': 'metadata'})
+            finally:
+                app_module.DATA_PATH, app_module.MODEL_METADATA_PATH = original_paths
+                app_module._range_cache.clear()
+
+    def test_health_reports_active_model(self):
+        response = self.app.get('/api/health')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['model']['version'], 'test')
+        self.assertIn('loaded_at', data['model'])
+
+    def test_single_predict_through_micro_batcher(self):
+        row = {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6}
+        direct = self.app.post('/api/predict', data=json.dumps(row), content_type='application/json')
+
+        app_module.prediction_cache = None
+        app_module.batcher = MicroBatcher(app_module.predict_features, max_wait_ms=0)
+        try:
+            batched = self.app.post('/api/predict', data=json.dumps(row), content_type='application/json')
+            stats = json.loads(self.app.get('/api/predict/batcher-stats').data)
+        finally:
+            app_module.batcher.stop()
+            app_module.batcher = None
+
+        self.assertEqual(json.loads(batched.data), json.loads(direct.data))
+        self.assertEqual(stats['requests'], 1)
+
+    def test_repeated_predictions_are_served_from_cache(self):
+        row = {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6}
+        first = self.app.post('/api/predict', data=json.dumps(row), content_type='application/json')
+        second = self.app.post('/api/predict', data=json.dumps(row), content_type='application/json')
+        self.assertEqual(json.loads(first.data), json.loads(second.data))
+
+        stats = json.loads(self.app.get('/api/cache').data)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+
+        response = self.app.delete('/api/cache', headers={'X-API-Key': os.getenv('API_KEY', 'default_dev_key')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(self.app.get('/api/cache').data)['size'], 0)
+
+    def test_predictions_are_written_to_audit_log(self):
+        row = {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6}
+        single = json.loads(self.app.post('/api/predict', data=json.dumps(row), content_type='application/json').data)
+        _, batch = self.post_batch([row, {"notifications": 20, "times_opened": 2, "day_of_week": 6, "month": 1}])
+
+        self.assertTrue(app_module.audit_log.flush())
+        stats = json.loads(self.app.get('/api/audit-log').data)
+        self.assertEqual(stats['written'], 2)
+        self.assertEqual(stats['dropped'], 0)
+
+        logged = [pair for entry in AuditLogReader(app_module.audit_log.path)
+                  for pair in zip(*audit_entry_rows(entry))]
+        self.assertEqual(len(logged), 3)
+        self.assertEqual([features[4] for features, _ in logged], [50.0, 50.0, 40.0])
+        self.assertAlmostEqual(logged[0][1], single['predicted_usage_minutes'], places=2)
+        self.assertEqual(len(batch['predictions']), 2)
+
+    def test_metrics_endpoint_reports_stage_latencies(self):
+        app_module.metrics.reset()
+        row = {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6}
+        self.app.post('/api/predict', data=json.dumps(row), content_type='application/json')
+        self.app.post('/api/predict', data=json.dumps({"notifications": 5}), content_type='application/json')
+
+        response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.data.decode()
+        self.assertIn('app_requests_total{route="/api/predict",method="POST",status="200"} 1', text)
+        self.assertIn('app_requests_total{route="/api/predict",method="POST",status="500"} 1', text)
+        self.assertIn('app_request_errors_total{route="/api/predict",method="POST"} 1', text)
+        # The failed request stops after parsing, so only the stages both requests reach count twice
+        for stage, count in (('parse', 2), ('validate', 1), ('features', 1), ('predict', 1),
+                             ('postprocess', 1), ('serialize', 2)):
+            self.assertIn(f'app_stage_duration_seconds_count{{route="predict",stage="{stage}"}} {count}', text)
+
+    def test_registered_versions_are_listed_and_scored_on_request(self):
+        registry_dir = tempfile.mkdtemp()
+        original = (app_module.model_registry, app_module.version_cache)
+        try:
+            registry = ModelRegistry(os.path.join(registry_dir, 'registry.json'), os.path.join(registry_dir, 'versions'))
+            other = RandomForestRegressor(n_estimators=3, max_depth=3, random_state=1).fit(
+                np.random.RandomState(1).rand(50, 5) * 50, np.random.RandomState(2).rand(50) * 100)
+            publish_version(other, '20240101_000000', registry_path=registry.path, models_dir=registry.models_dir,
+                            promote=False, metrics={'test_r2': 0.1})
+            app_module.model_registry = registry
+            app_module.version_cache = ModelCache(registry, max_models=1, loader=app_module._load_registered_version)
+
+            listing = json.loads(self.app.get('/api/models').data)
+            self.assertIsNone(listing['production'])
+            self.assertEqual([v['version'] for v in listing['versions']], ['20240101_000000'])
+            self.assertEqual(json.loads(self.app.get('/api/models/20240101_000000').data)['metrics'],
+                             {'test_r2': 0.1})
+            self.assertEqual(self.app.get('/api/models/19990101_000000').status_code, 404)
+
+            row = {"notifications": 5, "times_opened": 10, "day_of_week": 3, "month": 6}
+            response = self.app.post('/api/predict/batch?version=20240101_000000', data=json.dumps([row]),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            expected = other.predict([[5, 10, 3, 6, 50]])[0]
+            self.assertAlmostEqual(json.loads(response.data)['predictions'][0]['predicted_usage_minutes'],
+                                   round(expected, 2))
+            response = self.app.post('/api/predict/batch?version=19990101_000000', data=json.dumps([row]),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 404)
+        finally:
+            app_module.model_registry, app_module.version_cache = original
+            shutil.rmtree(registry_dir)
+
+    def test_malformed_payloads_are_rejected(self):
+        response, _ = self.post_batch({"columns": {"notifications": [1, 2]}})
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.post_batch([])
+        self.assertEqual(response.status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+# Add parent directory to path so we can import audit_log
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit_log import AuditLogReader, PredictionAuditLog, audit_entry_rows
+
+class TestPredictionAuditLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'prediction_log.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read_lines(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_flush_writes_entries_with_numpy_values(self):
+        log = PredictionAuditLog(self.path, flush_interval=60)
+        log.record({"features": np.array([1.0, 2.0]), "prediction": np.float64(3.5)})
+        log.record({"features": [4.0, 5.0], "prediction": 6.0})
+        self.assertTrue(log.flush())
+        log.close()
+
+        self.assertEqual(self.read_lines(self.path), [
+            {"features": [1.0, 2.0], "prediction": 3.5},
+            {"features": [4.0, 5.0], "prediction": 6.0},
+        ])
+        self.assertEqual(log.stats()['written'], 2)
+
+    def test_full_buffer_drops_oldest_entries(self):
+        log = PredictionAuditLog(self.path, capacity=3, batch_size=100, flush_interval=60)
+        for i in range(5):
+            log.record({"features": [i, i], "prediction": i})
+        self.assertEqual(log.stats()['dropped'], 2)
+        self.assertTrue(log.flush())
+        log.close()
+        self.assertEqual([entry['prediction'] for entry in self.read_lines(self.path)], [2, 3, 4])
+
+    def test_buffer_is_bounded_by_rows(self):
+        log = PredictionAuditLog(self.path, capacity=100, max_rows=5, batch_size=100, flush_interval=60)
+        log.record({"features": [0, 0], "prediction": 0})
+        log.record({"rows": [[1, 1]] * 3, "predictions": [1] * 3})
+        log.record({"rows": [[2, 2]] * 3, "predictions": [2] * 3})
+        self.assertEqual((log.stats()['dropped'], log.stats()['buffered_rows']), (2, 3))
+        self.assertTrue(log.flush())
+        log.close()
+        self.assertEqual([entry['predictions'][0] for entry in self.read_lines(self.path)], [2])
+
+    def test_writers_sharing_a_file_never_lose_a_rotated_segment(self):
+        logs = [PredictionAuditLog(self.path, batch_size=1, flush_interval=0.001, max_bytes=200, backup_count=1000)
+                for _ in range(4)]
+        for i in range(200):
+            logs[i % len(logs)].record({"features": [i, i], "prediction": i})
+        for log in logs:
+            self.assertTrue(log.flush())
+            log.close()
+        files = [os.path.join(self.tmp, name) for name in os.listdir(self.tmp) if not name.endswith('.lock')]
+        predictions = sorted(entry['prediction'] for path in files for entry in self.read_lines(path))
+        self.assertEqual(predictions, list(range(200)))
+
+    def test_rotation_keeps_backup_count_files(self):
+        log = PredictionAuditLog(self.path, flush_interval=60, max_bytes=1, backup_count=2)
+        for i in range(4):
+            log.record({"features": [i, i], "prediction": i})
+            log.flush()
+        log.close()
+
+        self.assertEqual(log.stats()['rotations'], 3)
+        self.assertEqual(self.read_lines(self.path)[0]['prediction'], 3)
+        self.assertEqual(self.read_lines(f"{self.path}.1")[0]['prediction'], 2)
+        self.assertEqual(self.read_lines(f"{self.path}.2")[0]['prediction'], 1)
+        self.assertFalse(os.path.exists(f"{self.path}.3"))
+
+    def test_reader_flattens_batches_in_order_across_rotations(self):
+        log = PredictionAuditLog(self.path, flush_interval=60, max_bytes=1, backup_count=2)
+        log.record({"features": [1, 2], "prediction": 10})
+        log.flush()
+        log.record({"rows": np.array([[3, 4], [5, 6]]), "predictions": np.array([30, 50])})
+        log.flush()
+
+        reader = AuditLogReader(self.path, backup_count=2)
+        rows = [pair for entry in reader for pair in zip(*audit_entry_rows(entry))]
+        self.assertEqual(rows, [([1, 2], 10), ([3, 4], 30), ([5, 6], 50)])
+
+        # A later pass from the saved position reads only what was appended since
+        log.record({"features": [7, 8], "prediction": 70})
+        log.flush()
+        log.close()
+        newer = AuditLogReader(self.path, position=reader.position, backup_count=2)
+        self.assertEqual([audit_entry_rows(entry) for entry in newer], [([[7, 8]], [70])])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import sys
+import os
+import threading
+from flask import Flask
+
+# Add parent directory to path so we can import auth
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import AdmissionController, TokenBucket, load_api_keys
+
+class TestApiKeys(unittest.TestCase):
+    def test_load_api_keys_with_per_key_limits(self):
+        keys = load_api_keys('alpha:5:10, beta', default_key='legacy', default_rate=50, default_burst=100)
+        self.assertEqual(set(keys), {'alpha', 'beta', 'legacy'})
+        self.assertEqual((keys['alpha'].rate, keys['alpha'].burst), (5.0, 10.0))
+        self.assertEqual((keys['beta'].rate, keys['beta'].burst), (50, 100))
+        self.assertNotIn('alpha', keys['alpha'].name)
+
+    def test_token_bucket_burst_then_retry_after(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        retry_after = bucket.try_acquire()
+        self.assertGreater(retry_after, 0.0)
+        self.assertLessEqual(retry_after, 0.1)
+
+class TestAdmissionController(unittest.TestCase):
+    def make_app(self, controller, view=None, require_key=False):
+        app = Flask(__name__)
+
+        @app.route('/predict')
+        @controller.admit('predict', require_key=require_key)
+        def predict():
+            return view() if view else {'ok': True}
+
+        return app.test_client()
+
+    def test_unknown_key_is_rejected(self):
+        controller = AdmissionController(api_keys=load_api_keys('', default_key='secret'))
+        client = self.make_app(controller, require_key=True)
+        self.assertEqual(client.get('/predict').status_code, 401)
+        self.assertEqual(client.get('/predict', headers={'X-API-Key': 'wrong'}).status_code, 401)
+        self.assertEqual(client.get('/predict', headers={'X-API-Key': 'secret'}).status_code, 200)
+        self.assertEqual(controller.stats()['endpoints']['predict']['unauthorized'], 2)
+
+    def test_rate_limit_is_per_key(self):
+        keys = load_api_keys('noisy:1:2,quiet:1:2', default_key='')
+        controller = AdmissionController(api_keys=keys)
+        client = self.make_app(controller)
+        statuses = [client.get('/predict', headers={'X-API-Key': 'noisy'}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        limited = client.get('/predict', headers={'X-API-Key': 'noisy'})
+        self.assertEqual(limited.headers['Retry-After'], '1')
+        self.assertEqual(client.get('/predict', headers={'X-API-Key': 'quiet'}).status_code, 200)
+
+        counts = controller.stats()['endpoints']['predict']
+        self.assertEqual(counts['admitted'], 3)
+        self.assertEqual(counts['rate_limited'], 2)
+
+    def test_each_process_enforces_its_share_of_the_limit(self):
+        keys = load_api_keys('shared:10:4', default_key='')
+        controller = AdmissionController(api_keys=keys, processes=2)
+        client = self.make_app(controller)
+        statuses = [client.get('/predict', headers={'X-API-Key': 'shared'}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_proxied_clients_are_limited_by_forwarded_address(self):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+
+        controller = AdmissionController(anonymous_rate=1, anonymous_burst=1, api_keys={})
+        client = self.make_app(controller)
+        client.application.wsgi_app = ProxyFix(client.application.wsgi_app, x_for=1)
+        first = {'X-Forwarded-For': '203.0.113.1'}
+        self.assertEqual(client.get('/predict', headers=first).status_code, 200)
+        self.assertEqual(client.get('/predict', headers=first).status_code, 429)
+        self.assertEqual(client.get('/predict', headers={'X-Forwarded-For': '203.0.113.2'}).status_code, 200)
+
+    def test_requests_over_the_in_flight_cap_are_shed(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_view():
+            started.set()
+            release.wait(5)
+            return {'ok': True}
+
+        controller = AdmissionController(max_in_flight=1, queue_budget=0.05, api_keys={})
+        client = self.make_app(controller, view=slow_view)
+        statuses = []
+        worker = threading.Thread(target=lambda: statuses.append(client.get('/predict').status_code))
+        worker.start()
+        try:
+            self.assertTrue(started.wait(5))
+            # The slot is held past the queue budget, so the second request gives up
+            shed = client.get('/predict')
+            self.assertEqual(shed.status_code, 503)
+            self.assertEqual(controller.stats()['endpoints']['predict']['shed'], 1)
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(statuses, [200])
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_queued_request_is_shed_immediately_when_budget_cannot_be_met(self):
+        controller = AdmissionController(max_in_flight=1, queue_budget=0.05, api_keys={})
+        controller.service_time = 1.0
+        self.assertTrue(controller.acquire_slot())
+        self.assertFalse(controller.acquire_slot())
+        controller.release_slot(1.0)
+        self.assertTrue(controller.acquire_slot())
+
+if __name__ == '__main__':
+    unittest.main()
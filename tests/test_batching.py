@@ -0,0 +1,121 @@
+import unittest
+import sys
+import os
+import threading
+import numpy as np
+
+# Add parent directory to path so we can import batching
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import MicroBatcher
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def predict_fn(X):
+            self.calls.append(len(X))
+            return X.sum(axis=1)
+
+        self.batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=50)
+
+    def tearDown(self):
+        self.batcher.stop()
+
+    def test_concurrent_requests_are_coalesced(self):
+        rows = [[i, i, 0, 1, i * i] for i in range(16)]
+        results = [None] * len(rows)
+        start = threading.Barrier(len(rows))
+
+        def worker(i):
+            start.wait()
+            results[i] = self.batcher.predict(rows[i], timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(rows))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [float(sum(row)) for row in rows])
+        self.assertLess(len(self.calls), len(rows))
+        self.assertTrue(all(size <= 8 for size in self.calls))
+
+        stats = self.batcher.stats()
+        self.assertEqual(stats['requests'], len(rows))
+        self.assertEqual(stats['batches'], len(self.calls))
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertGreater(stats['avg_batch_size'], 1)
+
+    def test_errors_are_propagated_to_callers(self):
+        def failing_predict(X):
+            raise ValueError("bad input")
+
+        batcher = MicroBatcher(failing_predict, max_wait_ms=0)
+        try:
+            with self.assertRaises(ValueError):
+                batcher.predict([1, 2, 3, 4, 5], timeout=5)
+            self.assertEqual(batcher.stats()['errors'], 1)
+        finally:
+            batcher.stop()
+
+    def test_short_predictions_fail_every_request(self):
+        batcher = MicroBatcher(lambda X: X.sum(axis=1)[1:], max_batch_size=4, max_wait_ms=50)
+        errors = []
+
+        def worker(row):
+            try:
+                batcher.predict(row, timeout=5)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=([i] * 5,)) for i in range(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            batcher.stop()
+        self.assertEqual(len(errors), 4)
+
+    def test_requests_after_stop_are_rejected(self):
+        self.batcher.stop()
+        with self.assertRaises(RuntimeError):
+            self.batcher.predict([1, 2, 3, 4, 5], timeout=5)
+
+    def test_rows_queued_before_a_model_swap_keep_their_model(self):
+        class Snapshot:
+            def __init__(self, scale):
+                self.scale = scale
+
+        calls = []
+
+        def predict_fn(X, model=None):
+            calls.append((model.scale, len(X)))
+            return X.sum(axis=1) * model.scale
+
+        batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=200)
+        old, new = Snapshot(1), Snapshot(10)
+        rows = [[i, 0, 0, 1, 0] for i in range(6)]
+        results = [None] * len(rows)
+        start = threading.Barrier(len(rows))
+
+        def worker(i):
+            start.wait()
+            # Half the requests started before the swap and hold the old snapshot
+            results[i] = batcher.predict(rows[i], timeout=5, model=old if i % 2 else new)
+
+        try:
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(rows))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            batcher.stop()
+        self.assertEqual(results, [(i + 1) * (1 if i % 2 else 10) for i in range(len(rows))])
+        self.assertEqual(sorted(calls), [(1, 3), (10, 3)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import sys
+import os
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+# Add parent directory to path so we can import bulk_scoring
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import make_dataset
+import bulk_scoring
+from bulk_scoring import (MANIFEST_NAME, label_predictions, part_paths, read_predictions, score_file, score_frame,
+                          shard_ranges)
+from dashboard_utils import tail_prediction_records
+from prediction_stats import FEATURE_COLUMNS, load_model_metadata, save_model_metadata
+
+class TestBulkScoring(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.input_path = os.path.join(root, 'processed_data.csv')
+        self.model_path = os.path.join(root, 'model.pkl')
+        self.output = os.path.join(root, 'predictions')
+        self.data = make_dataset(2000)
+        # Pass-through columns as a CSV gives them: dates as text and an App dummy
+        self.data['Date'] = self.data['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        self.data['App_Instagram'] = np.random.RandomState(1).rand(len(self.data)) > 0.5
+        self.data.to_csv(self.input_path, index=False)
+        self.model = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0)
+        self.model.fit(self.data[FEATURE_COLUMNS], self.data['Usage (minutes)'])
+        joblib.dump(self.model, self.model_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def score(self, **kwargs):
+        kwargs.setdefault('n_jobs', 1)
+        # Small shards and row groups, so the input spans several parts
+        kwargs.setdefault('shard_mb', 0.02)
+        kwargs.setdefault('chunksize', 100)
+        return score_file(self.input_path, self.model_path, self.output, **kwargs)
+
+    def test_shards_cover_every_row_once(self):
+        with open(self.input_path, 'rb') as f:
+            content = f.read()
+        ranges = shard_ranges(self.input_path, 5000)
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(ranges[0][0], content.index(b'\n') + 1)
+        self.assertEqual(ranges[-1][1], len(content))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(content[end - 1:end], b'\n')
+
+    def test_output_matches_a_full_prediction(self):
+        summary = self.score(threshold=60)
+        self.assertEqual(summary['rows'], 2000)
+        self.assertEqual(summary['scored_rows'], 2000)
+        self.assertGreater(summary['shards'], 1)
+        self.assertEqual(len(part_paths(self.output)), summary['shards'])
+        self.assertGreater(summary['rows_per_second'], 0)
+
+        result = read_predictions(self.output)
+        expected = self.model.predict(self.data[FEATURE_COLUMNS])
+        np.testing.assert_allclose(result['Predicted_Usage'], expected)
+        self.assertEqual(list(result['Notification']), list(label_predictions(expected, 60)))
+        pd.testing.assert_frame_equal(result[self.data.columns], self.data)
+
+    def test_missing_values_after_the_dtype_sample(self):
+        data = self.data.assign(Sessions=np.arange(len(self.data))).astype({'App_Instagram': object})
+        data.loc[1500, 'Sessions'] = np.nan
+        data.loc[1600, 'App_Instagram'] = np.nan
+        data.to_csv(self.input_path, index=False)
+        original = bulk_scoring._DTYPE_SAMPLE_ROWS
+        bulk_scoring._DTYPE_SAMPLE_ROWS = 100
+        try:
+            self.assertEqual(self.score(threshold=60)['rows'], 2000)
+        finally:
+            bulk_scoring._DTYPE_SAMPLE_ROWS = original
+        result = read_predictions(self.output)
+        self.assertTrue(np.isnan(result.loc[1500, 'Sessions']))
+        self.assertEqual(result.loc[1499, 'Sessions'], 1499)
+        self.assertTrue(pd.isna(result.loc[1600, 'App_Instagram']))
+
+    def test_threshold_defaults_to_model_threshold(self):
+        os.environ['MODEL_THRESHOLD'] = '30'
+        try:
+            summary = self.score()
+        finally:
+            del os.environ['MODEL_THRESHOLD']
+        self.assertEqual(summary['threshold'], 30)
+        result = read_predictions(self.output)
+        self.assertTrue((result['Notification'] == np.where(result['Predicted_Usage'] > 30, "Take a break!",
+                                                               "All good!")).all())
+
+    def test_resume_scores_only_missing_parts(self):
+        first = self.score()
+        parts = part_paths(self.output)
+        os.remove(parts[1])
+        manifest = load_model_metadata(os.path.join(self.output, MANIFEST_NAME))
+        manifest['shards'][2]['rows'] = None
+        manifest['complete'] = False
+        save_model_metadata(os.path.join(self.output, MANIFEST_NAME), manifest)
+
+        second = self.score()
+        self.assertEqual(second['resumed_shards'], first['shards'] - 2)
+        self.assertEqual(second['rows'], 2000)
+        self.assertEqual(len(read_predictions(self.output)), 2000)
+        self.assertTrue(load_model_metadata(os.path.join(self.output, MANIFEST_NAME))['complete'])
+
+        # A different threshold (or input, or model) starts over
+        third = self.score(threshold=10)
+        self.assertEqual(third['resumed_shards'], 0)
+        self.assertEqual(third['scored_rows'], 2000)
+        # So does an explicit restart
+        self.assertEqual(self.score(threshold=10, resume=False)['resumed_shards'], 0)
+
+    def test_failed_shard_leaves_no_part(self):
+        original = bulk_scoring.label_predictions
+        calls = []
+
+        def failing(predictions, threshold):
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError('interrupted')
+            return original(predictions, threshold)
+
+        bulk_scoring.label_predictions = failing
+        try:
+            with self.assertRaises(RuntimeError):
+                self.score(chunksize=1000)
+        finally:
+            bulk_scoring.label_predictions = original
+        self.assertEqual(len(part_paths(self.output)), 2)
+        self.assertEqual([f for f in os.listdir(self.output) if '.tmp-' in f], [])
+        summary = self.score(chunksize=1000)
+        self.assertEqual(summary['resumed_shards'], 2)
+        self.assertEqual(len(read_predictions(self.output)), 2000)
+
+    def test_process_pool_matches_serial(self):
+        self.score()
+        serial = read_predictions(self.output)
+        parallel_output = os.path.join(self.tmp.name, 'parallel')
+        score_file(self.input_path, self.model_path, parallel_output, n_jobs=2, shard_mb=0.02, chunksize=100)
+        pd.testing.assert_frame_equal(read_predictions(parallel_output), serial)
+
+    def test_in_memory_frame_matches_file_scoring(self):
+        self.score(threshold=60)
+        from_file = read_predictions(self.output)
+        summary = score_frame(self.model, self.data, self.output, threshold=60, rows_per_part=700)
+        self.assertEqual((summary['rows'], summary['shards']), (2000, 3))
+        pd.testing.assert_frame_equal(read_predictions(self.output), from_file)
+        # A file run does not resume from parts written from a frame
+        self.assertEqual(self.score(threshold=60)['resumed_shards'], 0)
+
+    def test_dashboard_tail_reads_the_last_parts(self):
+        self.score()
+        expected = read_predictions(self.output).tail(10).to_dict('records')
+        self.assertEqual(tail_prediction_records(self.output, 10), expected)
+        self.assertEqual(len(tail_prediction_records(self.output, 1500)), 1500)
+
+if __name__ == '__main__':
+    unittest.main()
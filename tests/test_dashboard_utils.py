@@ -0,0 +1,92 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import dashboard_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard_utils import (lttb, load_metrics, metrics_timeseries, read_tail_lines,
+                             render_metrics_plot, tail_csv_records, clear_cache)
+from metrics_store import MetricsStore
+
+class TestTailReader(unittest.TestCase):
+    def test_tail_matches_full_read(self):
+        data = pd.DataFrame({
+            'Notifications': np.arange(500) / 7.0,
+            'App': ['Instagram', 'WhatsApp'] * 250,
+            'Notification': ['All good!', 'Take a break!'] * 250,
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'predictions.csv')
+            data.to_csv(path, index=False)
+            for n in (1, 10, 499, 500, 600):
+                expected = pd.read_csv(path).tail(n).to_dict('records')
+                self.assertEqual(tail_csv_records(path, n), expected)
+            # Tiny blocks force many backwards reads
+            header, lines = read_tail_lines(path, 3, block_size=7)
+            self.assertEqual(header.strip(), 'Notifications,App,Notification')
+            self.assertEqual(len(lines), 3)
+
+    def test_header_only_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'predictions.csv')
+            with open(path, 'w') as f:
+                f.write('a,b\n')
+            self.assertEqual(tail_csv_records(path, 10), [])
+
+class TestLTTB(unittest.TestCase):
+    def test_keeps_endpoints_and_extremes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50.0)
+        y[500] = 10.0  # a spike must survive downsampling
+        selected = lttb(x, y, 100)
+        self.assertEqual(len(selected), 100)
+        self.assertEqual(selected[0], 0)
+        self.assertEqual(selected[-1], 999)
+        self.assertIn(500, selected)
+        self.assertTrue(np.all(np.diff(selected) > 0))
+
+    def test_short_series_is_unchanged(self):
+        self.assertEqual(lttb([1, 2, 3], [1, 2, 3], 10).tolist(), [0, 1, 2])
+
+class TestMetricsCache(unittest.TestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_plot_is_rendered_once_per_file_version(self):
+        metrics = [{'timestamp': f'2025-03-{day:02d} 10:00:00', 'mae': 10.0 + day, 'mse': 200.0, 'r2': 0.7,
+                    'data_size': 200} for day in range(1, 31)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model_metrics.json')
+            with open(path, 'w') as f:
+                json.dump(metrics, f)
+            first = render_metrics_plot(path)
+            self.assertTrue(first)
+            self.assertIs(render_metrics_plot(path), first)
+            self.assertEqual(len(load_metrics(path)), 30)
+
+            with open(path, 'w') as f:
+                json.dump(metrics[:5], f, indent=4)
+            self.assertEqual(len(load_metrics(path)), 5)
+            self.assertIsNot(render_metrics_plot(path), first)
+
+            series = metrics_timeseries(load_metrics(path), ['mae'], 3)
+            self.assertEqual(series['total'], 5)
+            self.assertEqual(len(series['series']['mae']['values']), 3)
+            self.assertEqual(series['series']['mae']['timestamps'][0], '2025-03-01 10:00:00')
+
+    def test_metrics_store_tail_for_plot(self):
+        metrics = [{'timestamp': f'2025-03-{day:02d} 10:00:00', 'mae': 10.0 + day, 'r2': 0.7} for day in range(1, 31)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model_metrics.jsonl')
+            MetricsStore(path).append_many(metrics)
+            self.assertEqual(load_metrics(path), metrics)
+            self.assertEqual(load_metrics(path, limit=5), metrics[-5:])
+            self.assertTrue(render_metrics_plot(path, limit=5))
+
+if __name__ == '__main__':
+    unittest.main()
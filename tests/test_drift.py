@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import drift
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit_log import PredictionAuditLog
+from drift import DriftProfile, FeatureSketch, bin_edges, compare_profiles, FEATURE_COLUMNS
+from monitoring import ModelMonitor
+
+def make_features(n, shift=0.0, seed=0):
+    rng = np.random.RandomState(seed)
+    notifications = rng.uniform(0, 1, n) + shift
+    times_opened = rng.uniform(0, 1, n)
+    return pd.DataFrame({
+        'Notifications': notifications,
+        'Times Opened': times_opened,
+        'DayOfWeek': rng.randint(0, 7, n),
+        'Month': rng.randint(1, 13, n),
+        'Notifications_x_TimesOpened': notifications * times_opened,
+    })
+
+class TestSketches(unittest.TestCase):
+    def test_merged_moments_match_numpy(self):
+        values = np.random.RandomState(1).normal(5, 2, 10000)
+        edges = bin_edges(values)
+        whole, left, right = FeatureSketch(edges), FeatureSketch(edges), FeatureSketch(edges)
+        whole.update(values)
+        left.update(values[:3000])
+        right.update(values[3000:])
+        left.merge(right)
+        for sketch in (whole, left):
+            self.assertAlmostEqual(sketch.mean, values.mean(), places=10)
+            self.assertAlmostEqual(sketch.std, values.std(ddof=1), places=10)
+            self.assertEqual(sketch.counts.sum(), values.size)
+        self.assertEqual(left.counts.tolist(), whole.counts.tolist())
+
+    def test_discrete_columns_get_one_bin_per_value(self):
+        self.assertEqual(bin_edges([0, 1, 2, 2, 6]).tolist(), [0.5, 1.5, 4.0])
+
+    def test_psi_and_ks_detect_a_shift(self):
+        reference = DriftProfile.fit(make_features(5000), FEATURE_COLUMNS)
+        same = reference.empty_like()
+        same.update(make_features(5000, seed=2))
+        shifted = reference.empty_like()
+        shifted.update(make_features(5000, shift=0.5, seed=3))
+
+        stable = compare_profiles(reference, same)
+        drifted = compare_profiles(reference, shifted)
+        self.assertFalse(any(column['drift_detected'] for column in stable.values()))
+        self.assertTrue(drifted['Notifications']['drift_detected'])
+        self.assertGreater(drifted['Notifications']['psi'], 0.2)
+        self.assertFalse(drifted['DayOfWeek']['drift_detected'])
+
+    def test_profile_round_trip(self):
+        reference = DriftProfile.fit(make_features(500), FEATURE_COLUMNS, metadata={'model_version': 'v1'})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'drift_reference.json')
+            reference.save(path)
+            loaded = DriftProfile.load(path)
+        self.assertEqual(loaded.metadata, {'model_version': 'v1'})
+        self.assertEqual(loaded.to_dict(), reference.to_dict())
+
+class TestMonitorDrift(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs('models')
+        DriftProfile.fit(make_features(5000), FEATURE_COLUMNS, metadata={'created_at': 'v1'}).save(
+            'models/drift_reference.json')
+        self.monitor = ModelMonitor(data_path='missing.csv')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write_audit(self, features):
+        log = PredictionAuditLog(self.monitor.audit_log_path, flush_interval=60)
+        log.record({'timestamp': pd.Timestamp.now().isoformat(), 'rows': features.to_numpy(),
+                    'predictions': np.zeros(len(features))})
+        log.flush()
+        log.close()
+
+    def test_drift_from_audit_log_reads_only_new_entries(self):
+        self.write_audit(make_features(2000, seed=4))
+        result = self.monitor.check_data_drift()
+        self.assertFalse(result['drift_detected'])
+        self.assertEqual(result['source'], 'audit_log')
+        self.assertEqual(result['current_rows'], 2000)
+
+        self.write_audit(make_features(6000, shift=0.5, seed=5))
+        result = self.monitor.check_data_drift()
+        self.assertTrue(result['drift_detected'])
+        self.assertEqual(result['current_rows'], 8000)
+        self.assertTrue(result['details']['Notifications']['drift_detected'])
+
+    def test_not_enough_data(self):
+        self.write_audit(make_features(10))
+        result = self.monitor.check_data_drift()
+        self.assertFalse(result['drift_detected'])
+        self.assertIn('Not enough', result['message'])
+
+if __name__ == '__main__':
+    unittest.main()
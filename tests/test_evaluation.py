@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+# Add parent directory to path so we can import evaluation
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import make_dataset
+from evaluation import RunningRegressionMetrics, evaluate_features
+from feature_store import load_features
+from monitoring import ModelMonitor, FEATURE_COLUMNS
+
+class TestRunningMetrics(unittest.TestCase):
+    def test_chunked_sums_match_sklearn(self):
+        rng = np.random.RandomState(1)
+        y, pred = rng.normal(50, 10, 10000), rng.normal(50, 10, 10000)
+        running = RunningRegressionMetrics()
+        for start in range(0, 10000, 777):
+            running.update(y[start:start + 777], pred[start:start + 777])
+        result = running.result()
+        self.assertAlmostEqual(result['mae'], mean_absolute_error(y, pred), places=9)
+        self.assertAlmostEqual(result['mse'], mean_squared_error(y, pred), places=9)
+        self.assertAlmostEqual(result['r2'], r2_score(y, pred), places=9)
+        self.assertEqual(result['count'], 10000)
+
+class TestEvaluateFeatures(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.data = make_dataset(5000)
+        cls.path = os.path.join(cls.tmp.name, 'processed_data.csv')
+        cls.data.to_csv(cls.path, index=False)
+        cls.model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0)
+        cls.model.fit(cls.data[FEATURE_COLUMNS], cls.data['Usage (minutes)'])
+
+    def evaluate(self, **kwargs):
+        predict = lambda X: self.model.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS))
+        return evaluate_features(predict, load_features(self.path), **kwargs)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_overall_and_segments_match_full_evaluation(self):
+        data = pd.read_csv(self.path)
+        predictions = self.model.predict(data[FEATURE_COLUMNS])
+        result = self.evaluate(chunksize=333)
+
+        self.assertEqual(result['count'], 5000)
+        self.assertAlmostEqual(result['mae'], mean_absolute_error(data['Usage (minutes)'], predictions), places=9)
+        self.assertAlmostEqual(result['r2'], r2_score(data['Usage (minutes)'], predictions), places=9)
+
+        self.assertEqual(sorted(result['segments']['DayOfWeek'], key=int), [str(day) for day in range(7)])
+        mask = (data['Month'] == 3).to_numpy()
+        month = result['segments']['Month']['3']
+        self.assertEqual(month['count'], mask.sum())
+        self.assertAlmostEqual(month['mse'], mean_squared_error(data['Usage (minutes)'][mask], predictions[mask]),
+                               places=9)
+        self.assertAlmostEqual(month['r2'], r2_score(data['Usage (minutes)'][mask], predictions[mask]), places=9)
+
+    def test_parallel_result_matches_sequential(self):
+        sequential = self.evaluate(chunksize=500)
+        parallel = self.evaluate(chunksize=500, n_jobs=4)
+        self.assertEqual(parallel, sequential)
+
+    def test_monitor_calculate_metrics(self):
+        model_path = os.path.join(self.tmp.name, 'model.pkl')
+        joblib.dump(self.model, model_path)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        try:
+            metrics = ModelMonitor(model_path=model_path, data_path=self.path).calculate_metrics(chunksize=1000)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(metrics['data_size'], 5000)
+        self.assertIn('Month', metrics['segments'])
+        self.assertLess(metrics['mae'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
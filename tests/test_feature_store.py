@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import feature_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import make_dataset
+from feature_store import (FEATURE_COLUMNS, FeatureStoreWriter, build_features, feature_store_path, load_features,
+                           open_features, write_features_from_frame)
+
+class TestFeatureStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'processed_data.csv')
+        self.data = make_dataset(1000)
+        self.data.to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_csv_is_converted_once_and_memory_mapped(self):
+        features = load_features(self.path)
+        self.assertEqual(features.X.dtype, np.float32)
+        self.assertEqual(features.X.shape, (1000, 5))
+        self.assertIsInstance(features.X.base, np.memmap)
+        csv = pd.read_csv(self.path)
+        np.testing.assert_array_equal(features.X, csv[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+        np.testing.assert_array_equal(features.y, csv['Usage (minutes)'].to_numpy())
+        np.testing.assert_array_equal(features['Month'], csv['Month'])
+
+        again = load_features(self.path)
+        self.assertEqual(again.content_hash, features.content_hash)
+        self.assertEqual(len(os.listdir(feature_store_path(self.path))), 2)  # one version plus current.json
+
+    def test_stale_store_is_rebuilt_and_old_versions_pruned(self):
+        first = load_features(self.path).content_hash
+        for seed in (1, 2):
+            time.sleep(0.01)
+            make_dataset(500, seed).to_csv(self.path, index=False)
+            features = load_features(self.path)
+            self.assertEqual(len(features), 500)
+        self.assertNotEqual(features.content_hash, first)
+        # The current and the previous version are kept for readers that still map them
+        versions = [name for name in os.listdir(feature_store_path(self.path)) if name != 'current.json']
+        self.assertEqual(len(versions), 2)
+
+    def test_frame_writer_matches_csv_conversion(self):
+        store = os.path.join(self.tmp.name, 'from_frame')
+        written = write_features_from_frame(self.data, store)
+        built = build_features(self.path, os.path.join(self.tmp.name, 'from_csv'), chunksize=128)
+        self.assertEqual(written['arrays']['features']['sha256'], built['arrays']['features']['sha256'])
+        self.assertIsNotNone(open_features(store, verify=True))
+
+    def test_writer_extends_the_current_version_in_place(self):
+        store = feature_store_path(self.path)
+        first = build_features(self.path, chunksize=128)
+        more = make_dataset(300, seed=1)
+
+        def extend(rows):
+            writer = FeatureStoreWriter.extend(store, expected_fingerprint=first['source']['fingerprint'])
+            writer.write(rows[FEATURE_COLUMNS].to_numpy(dtype=np.float32), rows['Usage (minutes)'].to_numpy(),
+                         rows['Date'].to_numpy(dtype='datetime64[ns]'))
+            return writer
+
+        # Rows written by an append that never published are invisible, and dropped by the next one
+        extend(more.iloc[:100]).abort()
+        self.assertEqual(len(open_features(store, verify=True)), 1000)
+        manifest = extend(more).publish()
+        self.assertEqual((manifest['directory'], manifest['rows']), (first['directory'], 1300))
+        self.assertEqual(manifest['arrays']['features']['segments'], [1000, 300])
+
+        features = open_features(store, verify=True)
+        expected = pd.concat([self.data, more], ignore_index=True)
+        np.testing.assert_array_equal(features.X, expected[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+        np.testing.assert_array_equal(features.dates, expected['Date'].to_numpy(dtype='datetime64[ns]'))
+        self.assertIsNone(FeatureStoreWriter.extend(store, expected_fingerprint='something else'))
+
+    def test_store_without_target_or_dates(self):
+        self.data[FEATURE_COLUMNS].to_csv(self.path, index=False)
+        features = load_features(self.path)
+        self.assertIsNone(features.y)
+        self.assertIsNone(features.dates)
+        self.assertNotIn('Usage (minutes)', features)
+
+    def test_store_is_used_when_csv_is_gone(self):
+        content_hash = load_features(self.path).content_hash
+        os.remove(self.path)
+        self.assertEqual(load_features(self.path).content_hash, content_hash)
+        with self.assertRaises(FileNotFoundError):
+            load_features(os.path.join(self.tmp.name, 'missing.csv'))
+
+    def test_chunks_and_frame_keep_row_positions(self):
+        features = load_features(self.path)
+        chunks = list(features.chunks(300))
+        self.assertEqual([len(chunk) for chunk in chunks], [300, 300, 300, 100])
+        frame = chunks[1].frame(include_target=True)
+        self.assertEqual(frame.index[0], 300)
+        self.assertEqual(list(frame.columns), FEATURE_COLUMNS + ['Usage (minutes)'])
+
+if __name__ == '__main__':
+    unittest.main()
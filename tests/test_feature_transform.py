@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import MinMaxScaler
+
+# Add parent directory to path so we can import feature_transform
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_transform import RAW_COLUMNS, FeatureTransform, attach_transform, model_transform
+from model_manager import ModelManager, publish_model
+from prediction_stats import FEATURE_COLUMNS
+
+def make_raw(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.column_stack([
+        rng.randint(0, 101, n),
+        rng.randint(1, 51, n),
+        rng.randint(0, 7, n),
+        rng.randint(1, 13, n),
+    ]).astype(np.float64)
+
+def reference_features(raw):
+    """Scaling and interaction as preprocessing did them with pandas and MinMaxScaler"""
+    data = pd.DataFrame(raw, columns=RAW_COLUMNS)
+    data[['Notifications', 'Times Opened']] = MinMaxScaler().fit_transform(data[['Notifications', 'Times Opened']])
+    data['Notifications_x_TimesOpened'] = data['Notifications'] * data['Times Opened']
+    return data[FEATURE_COLUMNS].to_numpy()
+
+class TestFeatureTransform(unittest.TestCase):
+    def test_matches_min_max_scaler_exactly(self):
+        raw = make_raw(1000)
+        transform = FeatureTransform.fit(raw)
+        np.testing.assert_array_equal(transform.transform(raw), reference_features(raw))
+
+        # A constant column is left unscaled apart from the offset, as in MinMaxScaler
+        raw[:, 1] = 7
+        np.testing.assert_array_equal(FeatureTransform.fit(raw).transform(raw), reference_features(raw))
+
+    def test_any_batch_size_and_output_buffer(self):
+        raw = make_raw(10)
+        transform = FeatureTransform.fit(raw)
+        expected = transform.transform(raw)
+        np.testing.assert_array_equal(transform.transform(raw[3]), expected[3:4])
+        self.assertEqual(transform.transform(raw[:0]).shape, (0, 5))
+        out = np.empty((10, 5))
+        self.assertIs(transform.transform(raw, out=out), out)
+        np.testing.assert_array_equal(out, expected)
+        with self.assertRaises(ValueError):
+            transform.transform(np.zeros((2, 5)))
+
+    def test_round_trip_and_identity_default(self):
+        transform = FeatureTransform.from_min_max([0, 1], [100, 50])
+        restored = FeatureTransform.from_dict(transform.to_dict())
+        raw = make_raw(20)
+        np.testing.assert_array_equal(restored.transform(raw), transform.transform(raw))
+
+        identity = model_transform(RandomForestRegressor())
+        self.assertTrue(identity.is_identity)
+        np.testing.assert_array_equal(identity.transform([[5, 10, 3, 6]]), [[5, 10, 3, 6, 50]])
+
+    def test_transform_is_served_from_the_compiled_artifact(self):
+        raw = make_raw(200)
+        transform = FeatureTransform.fit(raw)
+        X = transform.transform(raw)
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, raw[:, 0] * 2)
+        attach_transform(model, transform)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, 'model.pkl')
+            publish_model(model, model_path)
+            self.assertEqual(model_transform(joblib.load(model_path)).to_dict(), transform.to_dict())
+
+            manager = ModelManager(model_path)
+            manager.reload()
+            snapshot = manager.current
+            # Served from the mapped arrays, without unpickling the model
+            self.assertIsNone(snapshot._model)
+            self.assertTrue(snapshot.info()['feature_scaling'])
+            np.testing.assert_array_equal(snapshot.predict(snapshot.features(raw)), model.predict(X))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add parent directory to path so we can import hashing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hashing import content_key, file_fingerprint, sources_sha256
+
+class TestHashing(unittest.TestCase):
+    def test_content_key_is_stable_and_order_independent_for_dicts(self):
+        self.assertEqual(content_key('train', {'a': 1, 'b': None}), content_key('train', {'b': None, 'a': 1}))
+        self.assertNotEqual(content_key('train', {'a': 1}), content_key('train', {'a': 2}))
+        self.assertNotEqual(content_key('train', 'x'), content_key('preprocess', 'x'))
+
+    def test_sources_hash_follows_contents_not_timestamps(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('a.py', 'b.py')]
+            for path in paths:
+                with open(path, 'w') as f:
+                    f.write('x = 1\n')
+            before = sources_sha256(paths)
+            os.utime(paths[0], ns=(0, 0))
+            self.assertEqual(sources_sha256(reversed(paths)), before)
+            with open(paths[1], 'a') as f:
+                f.write('y = 2\n')
+            self.assertNotEqual(sources_sha256(paths), before)
+
+    def test_file_fingerprint_changes_with_the_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model.pkl')
+            with open(path, 'wb') as f:
+                f.write(b'old')
+            before = file_fingerprint(path)
+            with open(path, 'wb') as f:
+                f.write(b'new model')
+            self.assertNotEqual(file_fingerprint(path), before)
+            self.assertIsNone(file_fingerprint(os.path.join(tmp, 'missing.pkl')))
+
+if __name__ == '__main__':
+    unittest.main()
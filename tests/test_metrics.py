@@ -0,0 +1,110 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path so we can import metrics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry, Histogram, NULL_TIMER
+from profiler import SamplingProfiler
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_histogram_buckets_and_quantiles(self):
+        histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+        for value in (0.0005, 0.002, 0.003, 0.05, 5.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.quantile(0.5), 0.01)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry(buckets=(0.001, 0.01))
+        registry.record_request('/api/predict', 'POST', 200, 0.002)
+        registry.record_request('/api/predict', 'POST', 500, 0.0005)
+
+        text = registry.render()
+        self.assertIn('# TYPE app_request_duration_seconds histogram', text)
+        self.assertIn('app_requests_total{route="/api/predict",method="POST",status="200"} 1', text)
+        self.assertIn('app_request_errors_total{route="/api/predict",method="POST"} 1', text)
+        self.assertIn('app_request_duration_seconds_bucket{route="/api/predict",method="POST",le="0.001"} 1', text)
+        self.assertIn('app_request_duration_seconds_bucket{route="/api/predict",method="POST",le="+Inf"} 2', text)
+        self.assertIn('app_request_duration_seconds_count{route="/api/predict",method="POST"} 2', text)
+
+    def test_shared_dir_sums_every_worker(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Two registries stand in for two worker processes writing to the same directory
+            workers = [MetricsRegistry(buckets=(0.001, 0.01), shared_dir=tmp, flush_interval=60) for _ in range(2)]
+            workers[0].record_request('/api/predict', 'POST', 200, 0.002)
+            workers[1].record_request('/api/predict', 'POST', 200, 0.0005)
+            workers[1].record_request('/api/predict', 'POST', 200, 0.0005)
+            workers[1].flush()
+
+            for registry in workers:
+                text = registry.render()
+                self.assertIn('app_requests_total{route="/api/predict",method="POST",status="200"} 3', text)
+                self.assertIn('app_request_duration_seconds_bucket{route="/api/predict",method="POST",le="0.001"} 2',
+                              text)
+                self.assertIn('app_request_duration_seconds_count{route="/api/predict",method="POST"} 3', text)
+
+    def test_stage_timer_records_each_stage(self):
+        registry = MetricsRegistry()
+        timer = registry.timer('predict')
+        timer.mark('parse')
+        timer.mark('predict')
+        histograms = registry.snapshot()['histograms']
+        self.assertEqual(histograms[('app_stage_duration_seconds', (('route', 'predict'), ('stage', 'parse')))]['count'], 1)
+        self.assertEqual(histograms[('app_stage_duration_seconds', (('route', 'predict'), ('stage', 'predict')))]['count'], 1)
+
+    def test_disabled_registry_returns_null_timer(self):
+        registry = MetricsRegistry(enabled=False)
+        timer = registry.timer('predict')
+        self.assertIs(timer, NULL_TIMER)
+        timer.mark('parse')
+        self.assertEqual(registry.snapshot()['histograms'], {})
+
+    def test_disabled_registry_records_nothing(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = MetricsRegistry(enabled=False, shared_dir=tmp, flush_interval=60)
+            registry.record_request('/api/predict', 'POST', 500, 0.002)
+            registry.inc('app_cache_hits_total')
+            registry.observe('app_stage_duration_seconds', 0.001, route='predict', stage='parse')
+            snapshot = registry.snapshot()
+            self.assertEqual(snapshot['counters'], {})
+            self.assertEqual(snapshot['histograms'], {})
+            self.assertIsNone(registry._flusher)
+            self.assertEqual(os.listdir(tmp), [])
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_other_threads(self):
+        stop = threading.Event()
+
+        def busy_worker():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_worker, name='busy')
+        worker.start()
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        try:
+            time.sleep(0.1)
+        finally:
+            profiler.stop()
+            stop.set()
+            worker.join()
+
+        stats = profiler.stats()
+        self.assertFalse(stats['running'])
+        self.assertGreater(stats['samples'], 0)
+        self.assertIn('busy;', profiler.collapsed())
+        self.assertIn('busy_worker (test_metrics.py:', profiler.collapsed())
+
+if __name__ == '__main__':
+    unittest.main()
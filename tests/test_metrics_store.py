@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+
+# Add parent directory to path so we can import metrics_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics_store import MetricsStore
+
+def make_record(i):
+    return {'timestamp': f'2025-03-{1 + i // 1440:02d} {i // 60 % 24:02d}:{i % 60:02d}:00', 'mae': float(i), 'r2': 0.5}
+
+class TestMetricsStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'model_metrics.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_range_query_uses_index(self):
+        store = MetricsStore(self.path, index_block=256)
+        records = [make_record(i) for i in range(2000)]
+        for record in records[:1000]:
+            store.append(record)
+        store.append_many(records[1000:])
+
+        _, timestamps, offsets = store._read_index()
+        self.assertGreater(len(offsets), 100)
+        self.assertEqual(timestamps, sorted(timestamps))
+
+        start, end = records[1500]['timestamp'], records[1510]['timestamp']
+        self.assertEqual(store.read(start, end), records[1500:1511])
+        self.assertEqual(store.read(start=records[1995]['timestamp']), records[1995:])
+        self.assertEqual(store.read(end=records[2]['timestamp']), records[:3])
+        self.assertEqual(store.read(), records)
+        self.assertEqual(store.tail(3), records[-3:])
+
+    def test_out_of_order_append_is_compacted_into_order(self):
+        store = MetricsStore(self.path)
+        store.append(make_record(10))
+        store.append(make_record(5))
+        store.append(make_record(20))
+        self.assertEqual([r['mae'] for r in store.read()], [5.0, 10.0, 20.0])
+        self.assertEqual(store.read(start=make_record(6)['timestamp']), [make_record(10), make_record(20)])
+
+    def test_compaction_applies_retention_and_keeps_index_valid(self):
+        store = MetricsStore(self.path, index_block=128, retention_days=30)
+        store.append({'timestamp': '2000-01-01 00:00:00', 'mae': 1.0})
+        store.append({'mae': 2.0})  # stamped with the current time
+        store.compact()
+        records = store.read()
+        self.assertEqual([r['mae'] for r in records], [2.0])
+        self.assertIsNotNone(store._read_index())
+        self.assertEqual(store.read(start='2001-01-01 00:00:00'), records)
+
+    def test_concurrent_appends_do_not_interleave(self):
+        store = MetricsStore(self.path, compact_min_bytes=10 ** 9)
+
+        def writer(offset):
+            for i in range(100):
+                store.append({'timestamp': '2025-03-01 00:00:00', 'writer': offset, 'i': i, 'pad': 'x' * 500})
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 400)
+
+    def test_migrates_legacy_json_once(self):
+        legacy = os.path.join(self.tmp.name, 'model_metrics.json')
+        records = [make_record(i) for i in (3, 1, 2)]
+        with open(legacy, 'w') as f:
+            json.dump(records, f, indent=4)
+
+        store = MetricsStore(self.path)
+        self.assertEqual(store.migrate_json(legacy), 3)
+        self.assertEqual(store.migrate_json(legacy), 0)
+        self.assertEqual(store.read(), sorted(records, key=lambda r: r['timestamp']))
+        store.append(make_record(4))
+        self.assertEqual(len(store.read()), 4)
+
+if __name__ == '__main__':
+    unittest.main()
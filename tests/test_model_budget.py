@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# Add parent directory to path so we can import model_budget
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_budget import budget_violations, measure_serving_cost, serialized_bytes, trim_forest, trim_to_budget
+
+def fit_forest(n_estimators=20, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.rand(500, 5)
+    y = 60 * X[:, 0] + 10 * X[:, 2] + rng.normal(0, 1, 500)
+    return RandomForestRegressor(n_estimators=n_estimators, max_depth=6, random_state=seed).fit(X, y), X
+
+class TestModelBudget(unittest.TestCase):
+    def test_measures_latency_size_and_load_time(self):
+        model, X = fit_forest()
+        cost = measure_serving_cost(model, X, single_calls=50, batch_rows=200, batch_repeats=2)
+        for name in ('latency_single_p50_us', 'latency_single_p99_us', 'latency_batch_ms',
+                     'latency_batch_per_row_us', 'size_mb', 'compiled_size_mb', 'load_seconds'):
+            self.assertGreater(cost[name], 0, name)
+        self.assertLessEqual(cost['latency_single_p50_us'], cost['latency_single_p99_us'])
+        self.assertEqual(cost['n_trees'], 20)
+        self.assertAlmostEqual(cost['size_mb'], len(serialized_bytes(model)) / 1024 / 1024)
+
+    def test_trimmed_forest_is_the_mean_of_its_first_trees(self):
+        model, X = fit_forest()
+        trimmed = trim_forest(model, 5)
+        self.assertEqual(len(model.estimators_), 20)
+        self.assertEqual(trimmed.n_estimators, 5)
+        expected = np.mean([tree.predict(X) for tree in model.estimators_[:5]], axis=0)
+        np.testing.assert_allclose(trimmed.predict(X), expected)
+
+    def test_trim_to_budget_keeps_as_many_trees_as_fit(self):
+        model, X = fit_forest(40)
+        sizes = {n: len(serialized_bytes(trim_forest(model, n))) / 1024 / 1024 for n in (10, 11)}
+        budget = (sizes[10] + sizes[11]) / 2
+        trimmed, cost = trim_to_budget(model, X, max_size_mb=budget, single_calls=5, batch_rows=10, batch_repeats=1)
+        self.assertEqual(len(trimmed.estimators_), 10)
+        self.assertEqual(budget_violations(cost, max_size_mb=budget), [])
+        self.assertEqual(trim_to_budget(model, X, max_size_mb=1e-6, single_calls=5, batch_rows=10,
+                                        batch_repeats=1), (None, None))
+
+    def test_budget_violations(self):
+        cost = {'latency_single_p99_us': 120.0, 'size_mb': 3.0}
+        self.assertEqual(budget_violations(cost), [])
+        self.assertEqual(budget_violations(cost, max_p99_us=200, max_size_mb=5), [])
+        self.assertEqual(len(budget_violations(cost, max_p99_us=100, max_size_mb=1)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
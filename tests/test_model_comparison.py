@@ -0,0 +1,104 @@
+import unittest
+import sys
+import os
+import tempfile
+import joblib
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+
+# Add parent directory to path so we can import model_comparison
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import make_dataset
+from model_comparison import compare_versions, holdout_rows
+from prediction_stats import FEATURE_COLUMNS, load_model_metadata
+
+class TestModelComparison(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.data_path = os.path.join(root, 'processed_data.csv')
+        self.models_dir = os.path.join(root, 'versions')
+        self.cache_dir = os.path.join(root, 'cache')
+        self.output = os.path.join(root, 'model_comparison.json')
+        self.data = make_dataset(600)
+        self.data.to_csv(self.data_path, index=False)
+        os.makedirs(self.models_dir)
+        self.models = {}
+        for version in ('20240101_000000', '20240201_000000'):
+            self.add_version(version)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add_version(self, version):
+        seed = len(self.models)
+        model = RandomForestRegressor(n_estimators=5, max_depth=3 + seed, random_state=seed)
+        model.fit(self.data[FEATURE_COLUMNS], self.data['Usage (minutes)'])
+        joblib.dump(model, os.path.join(self.models_dir, f'model_{version}.pkl'))
+        self.models[version] = model
+
+    def compare(self, **kwargs):
+        kwargs.setdefault('n_jobs', 1)
+        return compare_versions(self.data_path, self.models_dir, cache_dir=self.cache_dir,
+                                output_path=self.output, **kwargs)
+
+    def test_metrics_match_a_full_prediction(self):
+        report = self.compare()
+        self.assertEqual(load_model_metadata(self.output), report)
+        self.assertEqual([v['version'] for v in report['versions']], sorted(self.models))
+        for entry in report['versions']:
+            predictions = self.models[entry['version']].predict(self.data[FEATURE_COLUMNS])
+            self.assertAlmostEqual(entry['mae'], mean_absolute_error(self.data['Usage (minutes)'], predictions),
+                                   places=9)
+            self.assertAlmostEqual(entry['r2'], r2_score(self.data['Usage (minutes)'], predictions), places=9)
+            self.assertFalse(entry['cached'])
+        self.assertEqual(report['dataset']['rows'], 600)
+
+    def test_only_new_versions_are_scored(self):
+        first = self.compare()
+        self.add_version('20240301_000000')
+        second = self.compare()
+        self.assertEqual([v['cached'] for v in second['versions']], [True, True, False])
+        self.assertEqual(second['versions'][0]['mae'], first['versions'][0]['mae'])
+
+        # A different dataset invalidates every cached result
+        make_dataset(500, seed=1).to_csv(self.data_path, index=False)
+        third = self.compare()
+        self.assertFalse(any(v['cached'] for v in third['versions']))
+        self.assertEqual(third['dataset']['rows'], 500)
+
+    def test_holdout_scores_only_the_fixed_split(self):
+        report = self.compare(holdout=True)
+        rows = holdout_rows(600)
+        self.assertEqual(report['dataset']['scope'], 'holdout')
+        self.assertEqual(report['versions'][0]['count'], len(rows))
+        holdout = self.data.iloc[rows]
+        model = self.models[report['versions'][0]['version']]
+        expected = mean_absolute_error(holdout['Usage (minutes)'], model.predict(holdout[FEATURE_COLUMNS]))
+        self.assertAlmostEqual(report['versions'][0]['mae'], expected, places=9)
+        # Full and holdout results are cached separately
+        self.assertFalse(any(v['cached'] for v in self.compare()['versions']))
+
+    def test_holdout_rows_keep_their_side_as_the_dataset_grows(self):
+        grown = holdout_rows(1000)
+        self.assertEqual(list(holdout_rows(600)), [row for row in grown if row < 600])
+        self.assertAlmostEqual(len(holdout_rows(100000)) / 100000, 0.2, places=2)
+
+    def test_unreadable_version_is_reported_not_cached(self):
+        with open(os.path.join(self.models_dir, 'model_20230101_000000.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        report = self.compare()
+        self.assertIn('error', report['versions'][0])
+        self.assertIn(report['best_mae'], self.models)
+        self.assertEqual([v['cached'] for v in self.compare()['versions']], [False, True, True])
+
+    def test_process_pool_matches_serial(self):
+        serial = self.compare()
+        parallel = compare_versions(self.data_path, self.models_dir, n_jobs=2,
+                                    cache_dir=os.path.join(self.tmp.name, 'other_cache'), output_path=None)
+        for a, b in zip(serial['versions'], parallel['versions']):
+            self.assertEqual((a['mae'], a['r2']), (b['mae'], b['r2']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# Add parent directory to path so we can import model_manager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_manager import ModelManager, WARMUP_ROWS, compiled_artifact_path
+from hashing import file_sha256
+
+def fit_model(seed):
+    rng = np.random.RandomState(seed)
+    X = rng.rand(100, 5)
+    y = rng.rand(100) * 100
+    return RandomForestRegressor(n_estimators=5, random_state=seed).fit(X, y)
+
+class TestModelManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tmp.name, 'model.pkl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_model(self, model):
+        joblib.dump(model, self.model_path)
+        # Make sure the fingerprint changes even on coarse-grained filesystems
+        stat = os.stat(self.model_path)
+        os.utime(self.model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+    def test_reload_swaps_only_when_file_changes(self):
+        first, second = fit_model(0), fit_model(1)
+        manager = ModelManager(self.model_path)
+        self.assertFalse(manager.reload())
+        self.assertIsNone(manager.current)
+
+        self.write_model(first)
+        self.assertTrue(manager.reload())
+        in_flight = manager.current
+        self.assertFalse(manager.reload())
+
+        self.write_model(second)
+        self.assertTrue(manager.reload())
+        # A request holding the old snapshot keeps predicting with the old model
+        self.assertTrue(np.array_equal(in_flight.predict(WARMUP_ROWS), first.predict(WARMUP_ROWS)))
+        self.assertTrue(np.array_equal(manager.current.predict(WARMUP_ROWS), second.predict(WARMUP_ROWS)))
+        self.assertNotEqual(in_flight.version, manager.current.version)
+        self.assertEqual(manager.status()['reloads'], 2)
+
+    def test_failed_reload_keeps_serving_previous_model(self):
+        manager = ModelManager(self.model_path)
+        self.write_model(fit_model(0))
+        manager.reload()
+        active = manager.current
+
+        with open(self.model_path, 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertFalse(manager.reload())
+        self.assertIs(manager.current, active)
+        self.assertEqual(manager.status()['failed_reloads'], 1)
+        self.assertIsNotNone(manager.status()['last_error'])
+
+    def test_file_replaced_while_loading_is_not_cached_under_the_old_hash(self):
+        import model_manager
+
+        self.write_model(fit_model(0))
+        original = model_manager.file_sha256
+
+        def hash_then_replace(path):
+            sha256 = original(path)
+            self.write_model(fit_model(1))
+            return sha256
+
+        model_manager.file_sha256 = hash_then_replace
+        try:
+            self.assertFalse(ModelManager(self.model_path).reload())
+        finally:
+            model_manager.file_sha256 = original
+        self.assertFalse(os.path.exists(os.path.dirname(compiled_artifact_path(self.model_path, 'x'))))
+
+    def test_compiled_cache_is_memory_mapped_and_skips_unpickling(self):
+        model = fit_model(0)
+        self.write_model(model)
+        ModelManager(self.model_path).reload()
+        first_artifact = compiled_artifact_path(self.model_path, file_sha256(self.model_path))
+        self.assertTrue(os.path.isdir(first_artifact))
+
+        manager = ModelManager(self.model_path)
+        manager.reload()
+        snapshot = manager.current
+        self.assertIsNone(snapshot._model)
+        self.assertIsInstance(snapshot.engine.threshold.base, np.memmap)
+        self.assertFalse(snapshot.engine.threshold.flags.writeable)
+        self.assertTrue(np.array_equal(snapshot.predict(WARMUP_ROWS), model.predict(WARMUP_ROWS)))
+        # The sklearn model is still available on demand
+        self.assertEqual(snapshot.model.n_estimators, model.n_estimators)
+
+        # A new model file gets its own artifact and the old one is removed
+        other = fit_model(1)
+        self.write_model(other)
+        manager.reload()
+        self.assertIsNotNone(manager.current._model)
+        self.assertTrue(np.array_equal(manager.current.predict(WARMUP_ROWS), other.predict(WARMUP_ROWS)))
+        self.assertTrue(os.path.isdir(compiled_artifact_path(self.model_path, file_sha256(self.model_path))))
+        self.assertFalse(os.path.exists(first_artifact))
+
+    def test_watcher_hot_swaps_new_model(self):
+        manager = ModelManager(self.model_path)
+        swaps = []
+        manager.add_listener(lambda new, old: swaps.append((new, old)))
+        self.write_model(fit_model(0))
+        manager.reload()
+        manager.start_watcher(interval=0.02)
+        try:
+            self.write_model(fit_model(1))
+            deadline = time.time() + 5
+            while len(swaps) < 2 and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            manager.stop_watcher()
+        self.assertEqual(len(swaps), 2)
+        self.assertIs(swaps[1][0], manager.current)
+
+if __name__ == '__main__':
+    unittest.main()
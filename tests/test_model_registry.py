@@ -0,0 +1,182 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# Add parent directory to path so we can import model_registry
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import (CANDIDATE, PRODUCTION, ModelCache, ModelRegistry, drift_reference_path, publish_version,
+                            version_path)
+from drift import DriftProfile
+from model_manager import ModelManager, WARMUP_ROWS
+from hashing import file_sha256
+
+def fit_model(seed, n_estimators=5):
+    rng = np.random.RandomState(seed)
+    return RandomForestRegressor(n_estimators=n_estimators, random_state=seed).fit(rng.rand(100, 5),
+                                                                                  rng.rand(100) * 100)
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.models_dir = os.path.join(self.tmp.name, 'versions')
+        self.registry_path = os.path.join(self.tmp.name, 'registry.json')
+        self.registry = ModelRegistry(self.registry_path, self.models_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def publish(self, version, seed=0, promote=True, **metadata):
+        return publish_version(fit_model(seed), version, registry_path=self.registry_path,
+                               models_dir=self.models_dir, promote=promote, **metadata)
+
+    def test_publish_records_metadata_and_promotes(self):
+        entry = self.publish('20240101_000000', params={'n_estimators': 5}, metrics={'test_r2': 0.5})
+        path = version_path('20240101_000000', self.models_dir)
+        self.assertEqual(entry['sha256'], file_sha256(path))
+        self.assertEqual(entry['size_bytes'], os.path.getsize(path))
+        self.assertEqual(entry['feature_schema']['n_features'], 5)
+        self.assertEqual(entry['n_estimators'], 5)
+        self.assertEqual(self.registry.get('20240101_000000')['metrics'], {'test_r2': 0.5})
+        self.assertEqual(self.registry.production()['version'], '20240101_000000')
+        self.assertEqual(self.registry.production_path(), os.path.abspath(path))
+
+        self.publish('20240201_000000', seed=1)
+        self.assertEqual([(e['version'], e['stage']) for e in self.registry.list_versions()],
+                         [('20240101_000000', CANDIDATE), ('20240201_000000', PRODUCTION)])
+        self.publish('20240301_000000', seed=2, promote=False)
+        self.assertEqual(self.registry.production()['version'], '20240201_000000')
+        self.assertEqual(len(self.registry.list_versions(stage=CANDIDATE)), 2)
+
+        self.registry.promote('20240101_000000')
+        self.assertEqual(self.registry.production()['version'], '20240101_000000')
+        self.assertEqual(len(self.registry.list_versions(stage=PRODUCTION)), 1)
+        with self.assertRaises(KeyError):
+            self.registry.promote('19990101_000000')
+
+    def test_drift_reference_is_kept_with_the_version(self):
+        reference = DriftProfile.fit({'Notifications': np.random.RandomState(0).rand(100)})
+        self.publish('20240101_000000', drift_reference=reference)
+        self.publish('20240201_000000', seed=1)
+        self.assertEqual(DriftProfile.load(drift_reference_path('20240101_000000', self.models_dir)).count, 100)
+        self.assertIsNone(DriftProfile.load(drift_reference_path('20240201_000000', self.models_dir)))
+        self.assertNotIn('drift_reference', self.registry.get('20240101_000000'))
+
+    def test_listing_never_loads_a_model(self):
+        self.publish('20240101_000000')
+        original = joblib.load
+        joblib.load = lambda *args, **kwargs: self.fail('a model was unpickled')
+        try:
+            registry = ModelRegistry(self.registry_path, self.models_dir)
+            self.assertEqual(len(registry.list_versions()), 1)
+            self.assertIsNotNone(registry.production_path())
+        finally:
+            joblib.load = original
+
+    def test_index_resolves_from_any_working_directory(self):
+        self.publish('20240101_000000')
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.models_dir)
+            self.assertTrue(os.path.exists(ModelRegistry(self.registry_path).production_path()))
+        finally:
+            os.chdir(cwd)
+
+    def test_scan_indexes_unregistered_pickles(self):
+        self.publish('20240101_000000')
+        joblib.dump(fit_model(3), version_path('20230101_000000', self.models_dir))
+        self.assertEqual(self.registry.scan(), ['20230101_000000'])
+        entry = self.registry.get('20230101_000000')
+        self.assertEqual((entry['stage'], entry['source'], entry['params']), (CANDIDATE, 'scan', None))
+        self.assertEqual(self.registry.scan(), [])
+
+        os.remove(version_path('20230101_000000', self.models_dir))
+        self.registry.scan()
+        self.assertIsNone(self.registry.get('20230101_000000'))
+        self.assertEqual(self.registry.production()['version'], '20240101_000000')
+
+    def test_cache_keeps_most_recently_used_versions(self):
+        for i, version in enumerate(('20240101_000000', '20240201_000000', '20240301_000000')):
+            self.publish(version, seed=i)
+        loads = []
+
+        def loader(path, entry):
+            loads.append(entry['version'])
+            return joblib.load(path)
+
+        cache = ModelCache(self.registry, max_models=2, loader=loader)
+        first = cache.get('20240101_000000')
+        self.assertIs(cache.get('20240101_000000'), first)
+        cache.get('20240201_000000')
+        cache.get('20240101_000000')
+        # The least recently used version is evicted
+        cache.get('20240301_000000')
+        self.assertEqual(cache.stats()['loaded'], ['20240101_000000', '20240301_000000'])
+        cache.get('20240201_000000')
+        self.assertEqual(loads, ['20240101_000000', '20240201_000000', '20240301_000000', '20240201_000000'])
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (2, 4))
+        with self.assertRaises(KeyError):
+            cache.get('19990101_000000')
+
+        # The default loader checks the file still has the registered contents
+        self.assertTrue(np.array_equal(ModelCache(self.registry).get('20240101_000000').predict(WARMUP_ROWS),
+                                       fit_model(0).predict(WARMUP_ROWS)))
+
+    def test_slow_load_does_not_block_cached_versions(self):
+        self.publish('20240101_000000', seed=0)
+        self.publish('20240201_000000', seed=1)
+        release = threading.Event()
+        loads = []
+
+        def loader(path, entry):
+            loads.append(entry['version'])
+            if entry['version'] == '20240201_000000':
+                release.wait(10)
+            return joblib.load(path)
+
+        cache = ModelCache(self.registry, max_models=2, loader=loader)
+        cached = cache.get('20240101_000000')
+        results = []
+        slow = [threading.Thread(target=lambda: results.append(cache.get('20240201_000000'))) for _ in range(2)]
+        for thread in slow:
+            thread.start()
+        while '20240201_000000' not in loads:
+            time.sleep(0.001)
+        # Served while the other version is still being loaded
+        self.assertIs(cache.get('20240101_000000'), cached)
+        release.set()
+        for thread in slow:
+            thread.join()
+        # Both callers got the one load
+        self.assertEqual(loads, ['20240101_000000', '20240201_000000'])
+        self.assertIs(results[0], results[1])
+        self.assertEqual(cache.stats()['loaded'], ['20240101_000000', '20240201_000000'])
+
+    def test_manager_follows_the_production_version(self):
+        fallback = os.path.join(self.tmp.name, 'model.pkl')
+        joblib.dump(fit_model(9), fallback)
+        manager = ModelManager(fallback, warmup_rounds=0,
+                               resolve_path=lambda: self.registry.production_path() or fallback)
+        self.assertTrue(manager.reload())
+        self.assertEqual(manager.current.path, fallback)
+
+        self.publish('20240101_000000', seed=0)
+        self.assertTrue(manager.reload())
+        self.assertTrue(np.array_equal(manager.current.predict(WARMUP_ROWS), fit_model(0).predict(WARMUP_ROWS)))
+        self.assertFalse(manager.reload())
+
+        self.publish('20240201_000000', seed=1)
+        self.assertTrue(manager.reload())
+        # Rolling back is a switch to another file, even though neither file changed
+        self.registry.promote('20240101_000000')
+        self.assertTrue(manager.reload())
+        self.assertEqual(manager.current.sha256, self.registry.production()['sha256'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Add parent directory to path so we can import model_search
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import make_dataset
+from model_search import MAX_BATCH_METRICS, log_rung, rung_sizes, sample_candidates, successive_halving
+
+SPACE = {'n_estimators': [5, 10, 20], 'max_depth': [2, 4, None], 'min_samples_split': [2, 10]}
+
+class RecordingClient:
+    def __init__(self):
+        self.batches = []
+
+    def log_batch(self, run_id, metrics=(), params=(), tags=()):
+        self.batches.append((run_id, list(metrics), list(params), list(tags)))
+
+class TestModelSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'processed_data.csv')
+        make_dataset(1500).to_csv(self.path, index=False)
+        self.train_rows = np.arange(1200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rung_sizes_halve_candidates_and_grow_rows(self):
+        self.assertEqual(rung_sizes(27, 9000, factor=3, min_resource=10), [(27, 1000), (9, 3000), (3, 9000)])
+        self.assertEqual(rung_sizes(27, 9000, factor=3, min_resource=2000), [(27, 2000), (9, 3000), (3, 9000)])
+        self.assertEqual(rung_sizes(1, 100), [(1, 100)])
+
+    def test_best_candidates_are_promoted(self):
+        candidates = sample_candidates(SPACE, n_candidates=9, random_state=0)
+        self.assertEqual(len({tuple(sorted(c.items(), key=str)) for c in candidates}), 9)
+        best, trials = successive_halving(self.path, self.train_rows, candidates, factor=3, min_resource=50,
+                                          n_jobs=1)
+        first = [t for t in trials if t['rung'] == 0]
+        last = [t for t in trials if t['rung'] == 1]
+        self.assertEqual(len(first), 9)
+        self.assertEqual(len(last), 3)
+        self.assertLess(first[0]['n_samples'], last[0]['n_samples'])
+        # The last rung holds exactly the three best first-rung candidates
+        self.assertEqual({t['trial'] for t in last}, {t['trial'] for t in first[:3]})
+        self.assertEqual(best, min(last, key=lambda t: t['val_mae'])['params'])
+
+    def test_process_pool_gives_the_same_trials(self):
+        candidates = sample_candidates(SPACE, n_candidates=4, random_state=1)
+        serial = successive_halving(self.path, self.train_rows, candidates, factor=2, min_resource=50, n_jobs=1)
+        parallel = successive_halving(self.path, self.train_rows, candidates, factor=2, min_resource=50, n_jobs=2)
+        self.assertEqual(serial[0], parallel[0])
+        strip = lambda trials: [{k: v for k, v in t.items() if k != 'fit_seconds'} for t in trials]
+        self.assertEqual(strip(serial[1]), strip(parallel[1]))
+
+    def test_each_rung_is_logged_in_one_batch_on_the_search_run(self):
+        candidates = sample_candidates(SPACE, n_candidates=3, random_state=0)
+        client = RecordingClient()
+        _, trials = successive_halving(self.path, self.train_rows, candidates, min_resource=50, n_jobs=1,
+                                       on_rung=lambda rung, results: log_rung(client, 'parent', rung, results))
+        n_rungs = trials[-1]['rung'] + 1
+        self.assertEqual([batch[0] for batch in client.batches], ['parent'] * n_rungs)
+        metrics = client.batches[0][1]
+        first = [t for t in trials if t['rung'] == 0]
+        self.assertEqual({(m.key, m.step) for m in metrics if m.key == 'rung_0_val_mae'},
+                         {('rung_0_val_mae', t['trial']) for t in first})
+        self.assertIn(('search_best_val_mae', 0, first[0]['val_mae']), {(m.key, m.step, m.value) for m in metrics})
+
+    def test_large_rung_is_split_into_batches_mlflow_accepts(self):
+        trials = [{'trial': i, 'val_mae': 1.0 + i, 'val_r2': 0.5, 'fit_seconds': 0.1} for i in range(400)]
+        client = RecordingClient()
+        log_rung(client, 'parent', 0, trials)
+        sizes = [len(batch[1]) for batch in client.batches]
+        self.assertEqual(sizes, [MAX_BATCH_METRICS, 3 * 400 + 2 - MAX_BATCH_METRICS])
+        keys = [m.key for batch in client.batches for m in batch[1]]
+        self.assertEqual(keys.count('rung_0_val_mae'), 400)
+        self.assertIn('search_best_val_mae', keys)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import sys
+import os
+import time
+
+# Add parent directory to path so we can import prediction_cache
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prediction_cache import PredictionCache
+
+class TestPredictionCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_size=2)
+        cache.put('v1', [1, 2], 10.0)
+        cache.put('v1', [3, 4], 20.0)
+        self.assertEqual(cache.get('v1', [1, 2]), 10.0)  # [1, 2] is now most recently used
+        cache.put('v1', [5, 6], 30.0)
+        self.assertIsNone(cache.get('v1', [3, 4]))
+        self.assertEqual(cache.get('v1', [1, 2]), 10.0)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_keys_include_model_version(self):
+        cache = PredictionCache()
+        cache.put('v1', [1, 2], 10.0)
+        self.assertIsNone(cache.get('v2', [1, 2]))
+        self.assertEqual(cache.get('v1', [1.0, 2.0]), 10.0)
+
+    def test_ttl_expiry(self):
+        cache = PredictionCache(ttl_seconds=0.01)
+        cache.put('v1', [1, 2], 10.0)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('v1', [1, 2]))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_clear_invalidates(self):
+        cache = PredictionCache()
+        cache.put('v1', [1, 2], 10.0)
+        cache.clear()
+        self.assertIsNone(cache.get('v1', [1, 2]))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import prediction_stats
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prediction_stats import (RunningRange, compute_prediction_range, load_model_metadata,
+                              save_model_metadata, FEATURE_COLUMNS)
+
+class TestRunningRange(unittest.TestCase):
+    def test_small_streams_are_exact(self):
+        values = np.random.RandomState(0).normal(50, 10, 1000)
+        running = RunningRange(sample_size=5000)
+        for chunk in np.array_split(values, 7):
+            running.update(chunk)
+        result = running.result()
+        self.assertEqual(result['count'], 1000)
+        self.assertTrue(result['percentiles_exact'])
+        self.assertEqual(result['min'], round(values.min(), 2))
+        self.assertEqual(result['max'], round(values.max(), 2))
+        self.assertAlmostEqual(result['avg'], round(values.mean(), 2))
+        self.assertEqual(result['p50'], round(np.percentile(values, 50), 2))
+
+    def test_large_streams_use_bounded_sample(self):
+        values = np.random.RandomState(1).uniform(0, 100, 200000)
+        running = RunningRange(sample_size=20000)
+        for chunk in np.array_split(values, 20):
+            running.update(chunk)
+        result = running.result()
+        self.assertFalse(result['percentiles_exact'])
+        self.assertEqual(result['count'], 200000)
+        self.assertAlmostEqual(result['p50'], 50, delta=2)
+        self.assertAlmostEqual(result['p95'], 95, delta=2)
+
+class TestComputePredictionRange(unittest.TestCase):
+    def test_chunked_range_matches_full_scoring(self):
+        rng = np.random.RandomState(0)
+        data = pd.DataFrame(rng.rand(1000, 5), columns=FEATURE_COLUMNS)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'processed_data.csv')
+            data.to_csv(path, index=False)
+            predict_fn = lambda X: np.asarray(X, dtype=np.float64).sum(axis=1) * 10
+            result = compute_prediction_range(predict_fn, path, chunksize=128)
+            # Models evaluate float32 inputs, which is how the feature store keeps them
+            full = predict_fn(pd.read_csv(path)[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+            self.assertEqual(result['min'], round(full.min(), 2))
+            self.assertEqual(result['max'], round(full.max(), 2))
+            self.assertEqual(result['avg'], round(full.mean(), 2))
+
+            meta_path = os.path.join(tmp, 'model_meta.json')
+            self.assertEqual(load_model_metadata(meta_path), {})
+            save_model_metadata(meta_path, {'prediction_range': result})
+            self.assertEqual(load_model_metadata(meta_path)['prediction_range'], result)
+
+if __name__ == '__main__':
+    unittest.main()
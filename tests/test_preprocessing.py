@@ -0,0 +1,156 @@
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+# Add parent directory to path so we can import preprocessing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_store import load_features
+from preprocessing import run_preprocessing
+
+APPS = ['Instagram', 'Netflix', 'WhatsApp', 'X']
+
+def make_raw(n, seed=0, start='2024-01-01', apps=APPS, notifications=(0, 100)):
+    rng = np.random.RandomState(seed)
+    data = pd.DataFrame({
+        'Date': pd.date_range(start, periods=n, freq='D').strftime('%Y-%m-%d'),
+        'App': rng.choice(apps, n),
+        'Usage (minutes)': rng.randint(1, 200, n),
+        'Notifications': rng.randint(notifications[0], notifications[1] + 1, n),
+        'Times Opened': rng.randint(1, 81, n),
+    })
+    # Pin the extremes in the first rows, so later rows stay inside the fitted scaling range
+    data.loc[0, ['Notifications', 'Times Opened']] = [notifications[0], 1]
+    data.loc[1, ['Notifications', 'Times Opened']] = [notifications[1], 80]
+    return data
+
+def preprocess_in_memory(raw_path, output_path):
+    """The original single-pass preprocessing, kept as the reference for the streamed versions"""
+    data = pd.read_csv(raw_path)
+    data['Date'] = pd.to_datetime(data['Date'])
+    data['DayOfWeek'] = data['Date'].dt.dayofweek
+    data['Month'] = data['Date'].dt.month
+    data = pd.get_dummies(data, columns=['App'], drop_first=True)
+    scaler = MinMaxScaler()
+    data[['Notifications', 'Times Opened']] = scaler.fit_transform(data[['Notifications', 'Times Opened']])
+    data['Previous_Day_Usage'] = data['Usage (minutes)'].shift(1)
+    data['Notifications_x_TimesOpened'] = data['Notifications'] * data['Times Opened']
+    data.to_csv(output_path, index=False)
+
+class TestPreprocessing(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.raw = os.path.join(root, 'screentime_analysis.csv')
+        self.output = os.path.join(root, 'processed_data.csv')
+        self.state = os.path.join(root, 'preprocess_state.json')
+        self.expected = os.path.join(root, 'expected.csv')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_preprocessing(self, **kwargs):
+        return run_preprocessing(self.raw, self.output, self.state, chunksize=37, **kwargs)
+
+    def assert_matches_in_memory(self):
+        preprocess_in_memory(self.raw, self.expected)
+        with open(self.output, 'rb') as f, open(self.expected, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+        expected = pd.read_csv(self.expected)
+        features = load_features(self.output)
+        np.testing.assert_array_equal(features.y, expected['Usage (minutes)'].to_numpy())
+        self.assertEqual(len(features), len(expected))
+
+    def append_raw(self, data):
+        data.to_csv(self.raw, mode='a', header=False, index=False)
+
+    def test_full_rebuild_matches_in_memory_preprocessing(self):
+        raw = make_raw(200)
+        raw.loc[5, 'Notifications'] = np.nan
+        pd.concat([raw, raw.iloc[:3]]).to_csv(self.raw, index=False)
+        result = self.run_preprocessing(full=True)
+        self.assertEqual(result['mode'], 'full')
+        self.assertEqual(result['rows'], 203)
+        self.assertEqual(result['nulls']['Notifications'], 1)
+        self.assertEqual(result['duplicates'], 3)
+        self.assert_matches_in_memory()
+
+    def test_incremental_append_matches_full_rebuild(self):
+        raw = make_raw(300)
+        raw.iloc[:200].to_csv(self.raw, index=False)
+        self.assertEqual(self.run_preprocessing()['mode'], 'full')
+
+        self.append_raw(raw.iloc[200:])
+        result = self.run_preprocessing()
+        self.assertEqual(result['mode'], 'incremental')
+        self.assertEqual(result['rows_added'], 100)
+        self.assertEqual(result['watermark'], str(pd.Timestamp(raw['Date'].iloc[-1])))
+        self.assert_matches_in_memory()
+
+        # Nothing new: nothing to do
+        self.assertEqual(self.run_preprocessing()['rows_added'], 0)
+
+    def test_lag_feature_crosses_run_boundary(self):
+        raw = make_raw(120)
+        raw.iloc[:100].to_csv(self.raw, index=False)
+        self.run_preprocessing()
+        self.append_raw(raw.iloc[100:])
+        self.run_preprocessing()
+        processed = pd.read_csv(self.output)
+        self.assertEqual(processed['Previous_Day_Usage'].iloc[100], raw['Usage (minutes)'].iloc[99])
+        self.assertTrue(np.isnan(processed['Previous_Day_Usage'].iloc[0]))
+
+    def test_falls_back_to_full_rebuild_when_scaling_changes(self):
+        make_raw(100).to_csv(self.raw, index=False)
+        self.run_preprocessing()
+        self.append_raw(make_raw(10, seed=1, start='2024-06-01', notifications=(150, 200)))
+        result = self.run_preprocessing()
+        self.assertEqual(result['mode'], 'full')
+        self.assertIn('scaling range', result['reason'])
+        self.assert_matches_in_memory()
+
+    def test_falls_back_to_full_rebuild_for_new_app(self):
+        make_raw(100).to_csv(self.raw, index=False)
+        self.run_preprocessing()
+        self.append_raw(make_raw(10, seed=1, start='2024-06-01', apps=['Facebook'], notifications=(10, 20)))
+        result = self.run_preprocessing()
+        self.assertEqual(result['mode'], 'full')
+        self.assert_matches_in_memory()
+
+    def test_rewritten_raw_file_triggers_full_rebuild(self):
+        make_raw(100).to_csv(self.raw, index=False)
+        self.run_preprocessing()
+        make_raw(100, seed=3).to_csv(self.raw, index=False)
+        result = self.run_preprocessing()
+        self.assertEqual(result['mode'], 'full')
+        self.assertEqual(result['reason'], 'the raw file was rewritten')
+        self.assert_matches_in_memory()
+
+    def test_interrupted_append_is_rolled_back(self):
+        raw = make_raw(150)
+        raw.iloc[:100].to_csv(self.raw, index=False)
+        self.run_preprocessing()
+        with open(self.output, 'a') as f:
+            f.write('2024-01-01,partial row')
+        self.append_raw(raw.iloc[100:])
+        self.assertEqual(self.run_preprocessing()['mode'], 'incremental')
+        self.assert_matches_in_memory()
+
+    def test_rewritten_processed_file_triggers_full_rebuild(self):
+        raw = make_raw(150)
+        raw.iloc[:100].to_csv(self.raw, index=False)
+        self.run_preprocessing()
+        # Another writer replaced the output with a longer file in its own schema
+        pd.concat([raw] * 3).to_csv(self.output, index=False)
+        self.append_raw(raw.iloc[100:])
+        result = self.run_preprocessing()
+        self.assertEqual(result['mode'], 'full')
+        self.assertIn('rewritten', result['reason'])
+        self.assert_matches_in_memory()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import unittest
+import sys
+import os
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+# Add parent directory to path so we can import retraining
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import make_dataset
+from drift import DriftProfile
+from metrics_store import MetricsStore
+from prediction_stats import FEATURE_COLUMNS, load_model_metadata
+from retraining import (choose_retrain_mode, job_in_progress, load_training_window, read_status,
+                        run_retraining, warm_start_forest)
+
+class TestWarmStart(unittest.TestCase):
+    def setUp(self):
+        self.data = make_dataset(500)
+        self.model = RandomForestRegressor(n_estimators=10, max_depth=5, random_state=0)
+        self.model.fit(self.data[FEATURE_COLUMNS], self.data['Usage (minutes)'])
+
+    def test_adds_trees_without_touching_original(self):
+        original_trees = list(self.model.estimators_)
+        candidate = warm_start_forest(self.model, self.data[FEATURE_COLUMNS], self.data['Usage (minutes)'], 5)
+        self.assertEqual(len(candidate.estimators_), 15)
+        self.assertEqual(candidate.n_estimators, 15)
+        self.assertFalse(candidate.warm_start)
+        self.assertEqual(len(self.model.estimators_), 10)
+        self.assertIs(self.model.estimators_[0], original_trees[0])
+
+    def test_replace_keeps_forest_size(self):
+        candidate = warm_start_forest(self.model, self.data[FEATURE_COLUMNS], self.data['Usage (minutes)'], 4,
+                                      replace_oldest=True)
+        self.assertEqual(len(candidate.estimators_), 10)
+        self.assertEqual(candidate.n_estimators, 10)
+        # The six newest original trees are kept, in order
+        np.testing.assert_array_equal(candidate.estimators_[0].tree_.threshold,
+                                      self.model.estimators_[4].tree_.threshold)
+        candidate.predict(self.data[FEATURE_COLUMNS])
+
+    def test_each_replace_round_grows_new_trees(self):
+        X, y = self.data[FEATURE_COLUMNS], self.data['Usage (minutes)']
+        first = warm_start_forest(self.model, X, y, 4, replace_oldest=True)
+        second = warm_start_forest(first, X, y, 4, replace_oldest=True)
+        # Same data and forest size, but the second round must not regrow the first round's trees
+        self.assertFalse(np.array_equal(first.estimators_[-1].tree_.threshold,
+                                        second.estimators_[-1].tree_.threshold))
+        self.assertNotEqual(first.estimators_[-1].random_state, second.estimators_[-1].random_state)
+
+class TestRetrainMode(unittest.TestCase):
+    def test_mode_follows_max_psi(self):
+        moderate = {'details': {'Notifications': {'psi': 0.3}, 'Month': {'psi': 0.1}}}
+        severe = {'details': {'Notifications': {'psi': 0.3}, 'Month': {'psi': 0.8}}}
+        self.assertEqual(choose_retrain_mode(moderate), ('warm_start', 0.3))
+        self.assertEqual(choose_retrain_mode(severe), ('full', 0.8))
+        self.assertEqual(choose_retrain_mode({'details': {}}), ('warm_start', 0.0))
+
+class TestTrainingWindow(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'processed_data.csv')
+        make_dataset(24 * 20).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_date_window(self):
+        window = load_training_window(self.path, window_days=5)
+        dates = pd.to_datetime(window['Date'])
+        self.assertEqual(dates.max() - dates.min(), pd.Timedelta(days=5))
+        self.assertEqual(len(window), 24 * 5 + 1)
+        # Row positions in the file are kept as the index
+        self.assertEqual(window.index[-1], 24 * 20 - 1)
+
+    def test_row_window(self):
+        window = load_training_window(self.path, window_rows=30)
+        self.assertEqual(len(window), 30)
+        self.assertEqual(list(window.index), list(range(24 * 20 - 30, 24 * 20)))
+
+class TestRunRetraining(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.paths = {
+            'model_path': os.path.join(root, 'model.pkl'),
+            'data_path': os.path.join(root, 'processed_data.csv'),
+            'status_path': os.path.join(root, 'retrain_status.json'),
+            'history_path': os.path.join(root, 'retrain_history.jsonl'),
+            'metadata_path': os.path.join(root, 'model_meta.json'),
+            'reference_path': os.path.join(root, 'drift_reference.json'),
+        }
+        old = make_dataset(600, seed=1)
+        # Recent data has a different relationship the old forest has not seen
+        new = make_dataset(600, seed=2, start=str(old['Date'].max() + pd.Timedelta(hours=1)))
+        new['Usage (minutes)'] += 40 * new['Times Opened']
+        pd.concat([old, new]).to_csv(self.paths['data_path'], index=False)
+
+        model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0)
+        model.fit(old[FEATURE_COLUMNS], old['Usage (minutes)'])
+        joblib.dump(model, self.paths['model_path'])
+        DriftProfile.fit(old[FEATURE_COLUMNS + ['Usage (minutes)']],
+                         metadata={'created_at': '2024-01-01 00:00:00'}).save(self.paths['reference_path'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_warm_start_publishes_and_records_history(self):
+        record = run_retraining('warm_start', new_trees=10, window_days=20, compare_full=True, severity=0.3,
+                                **self.paths)
+        self.assertTrue(record['accepted'])
+        self.assertLess(record['candidate']['mae'], record['previous']['mae'])
+        self.assertIn('seconds', record['full_retrain'])
+
+        self.assertEqual(len(joblib.load(self.paths['model_path']).estimators_), 20)
+        metadata = load_model_metadata(self.paths['metadata_path'])
+        self.assertEqual(metadata['retrain']['mode'], 'warm_start')
+        self.assertIn('prediction_range', metadata)
+        reference = DriftProfile.load(self.paths['reference_path'])
+        self.assertEqual(reference.count, 600 + record['window_rows'])
+        self.assertEqual(reference.metadata['model_sha256'], metadata['model_sha256'])
+
+        status = read_status(self.paths['status_path'])
+        self.assertEqual(status['state'], 'succeeded')
+        self.assertFalse(job_in_progress(status))
+        self.assertEqual(len(MetricsStore(self.paths['history_path']).read()), 1)
+
+    def test_full_retrain_is_only_published_if_it_passes_the_holdout_check(self):
+        import retraining
+
+        # Stands in for scripts/train.py with a candidate far worse than the current model
+        script = os.path.join(self.tmp.name, 'train.py')
+        with open(script, 'w') as f:
+            f.write('import sys, joblib, numpy as np\n'
+                    'from sklearn.ensemble import RandomForestRegressor\n'
+                    'model = RandomForestRegressor(n_estimators=2, max_depth=1, random_state=0)\n'
+                    'model.fit(np.zeros((10, %d)), np.arange(10) * 1000.0)\n'
+                    'joblib.dump(model, sys.argv[sys.argv.index("--candidate-path") + 1])\n' % len(FEATURE_COLUMNS))
+        with open(self.paths['model_path'], 'rb') as f:
+            published = f.read()
+        original = retraining.TRAIN_SCRIPT
+        retraining.TRAIN_SCRIPT = script
+        try:
+            record = run_retraining('full', window_days=20, **self.paths)
+        finally:
+            retraining.TRAIN_SCRIPT = original
+        self.assertFalse(record['accepted'])
+        self.assertGreater(record['candidate']['mae'], record['previous']['mae'])
+        with open(self.paths['model_path'], 'rb') as f:
+            self.assertEqual(f.read(), published)
+        self.assertFalse(os.path.exists(self.paths['metadata_path']))
+
+    def test_failure_is_recorded(self):
+        os.remove(self.paths['model_path'])
+        with self.assertRaises(OSError):
+            run_retraining('replace', **self.paths)
+        status = read_status(self.paths['status_path'])
+        self.assertEqual(status['state'], 'failed')
+        self.assertIn('error', status)
+
+class TestJobStatus(unittest.TestCase):
+    def test_running_job_detected_by_pid(self):
+        self.assertTrue(job_in_progress({'state': 'running', 'pid': os.getpid()}))
+        self.assertFalse(job_in_progress({'state': 'succeeded', 'pid': os.getpid()}))
+        self.assertFalse(job_in_progress({}))
+
+    def test_job_queued_before_launch_counts_until_it_times_out(self):
+        from datetime import datetime, timedelta
+
+        now = datetime.now()
+        self.assertTrue(job_in_progress({'state': 'queued', 'pid': None,
+                                         'queued_at': now.strftime('%Y-%m-%d %H:%M:%S')}))
+        self.assertFalse(job_in_progress({'state': 'queued', 'pid': None,
+                                          'queued_at': (now - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')}))
+
+    def test_queued_status_is_written_before_the_job_starts(self):
+        import retraining
+
+        with tempfile.TemporaryDirectory() as tmp:
+            status_path = os.path.join(tmp, 'retrain_status.json')
+            seen = []
+            original = retraining.subprocess.Popen
+
+            class FakePopen:
+                def __init__(self, args, **kwargs):
+                    seen.append(read_status(status_path)['state'])
+                    # A fast job reports itself before the launcher returns
+                    retraining.write_status(status_path, state='running', pid=4321)
+                    self.pid = 4321
+
+            retraining.subprocess.Popen = FakePopen
+            try:
+                status = retraining.start_retraining_job('warm_start', status_path=status_path,
+                                                         log_path=os.path.join(tmp, 'retrain.log'))
+            finally:
+                retraining.subprocess.Popen = original
+            self.assertEqual(seen, ['queued'])
+            self.assertEqual(status['pid'], 4321)
+            self.assertEqual(read_status(status_path)['state'], 'running')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add parent directory and dags/ to path so we can import the flow module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags'))
+
+try:
+    import screen_time_dag
+except ImportError:
+    screen_time_dag = None
+
+@unittest.skipIf(screen_time_dag is None, "prefect is not installed")
+class TestTrainCacheKey(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'feature_transform.py')
+        with open(self.source, 'w') as f:
+            f.write('SCALE = 1\n')
+        self.original_sources = screen_time_dag.TRAIN_SOURCES
+        screen_time_dag.TRAIN_SOURCES = [self.source]
+        self.parameters = {'data_key': 'a' * 64, 'params': {'n_estimators': 100, 'random_state': 42}}
+
+    def tearDown(self):
+        screen_time_dag.TRAIN_SOURCES = self.original_sources
+        self.tmp.cleanup()
+
+    def key(self, **parameters):
+        return screen_time_dag.train_cache_key(None, dict(self.parameters, **parameters))
+
+    def test_same_inputs_reuse_the_cached_model(self):
+        self.assertEqual(self.key(), self.key())
+        # Parameter order does not matter
+        self.assertEqual(self.key(params={'random_state': 42, 'n_estimators': 100}), self.key())
+
+    def test_data_params_and_code_each_change_the_key(self):
+        key = self.key()
+        self.assertNotEqual(self.key(data_key='b' * 64), key)
+        self.assertNotEqual(self.key(params={'n_estimators': 200, 'random_state': 42}), key)
+        with open(self.source, 'w') as f:
+            f.write('SCALE = 2\n')
+        self.assertNotEqual(self.key(), key)
+
+if __name__ == '__main__':
+    unittest.main()
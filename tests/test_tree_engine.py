@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+# Add parent directory to path so we can import tree_engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tree_engine import compile_forest, try_compile_forest
+
+class TestCompiledForest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(1)
+        scale = [100, 50, 6, 12, 5000]
+        cls.X_train = rng.rand(500, 5) * scale
+        cls.y_train = 0.01 * cls.X_train[:, 4] + rng.randn(500)
+        cls.X_test = rng.rand(1000, 5) * scale
+
+    def assert_matches_sklearn(self, model):
+        engine = compile_forest(model)
+        # Bit-for-bit equality, not approximate
+        self.assertTrue(np.array_equal(engine.predict(self.X_test), model.predict(self.X_test)))
+        self.assertTrue(np.array_equal(engine.predict(self.X_test[:1]), model.predict(self.X_test[:1])))
+        self.assertTrue(np.array_equal(engine.predict(self.X_test, chunk_size=97), model.predict(self.X_test)))
+
+    def test_random_forest(self):
+        model = RandomForestRegressor(n_estimators=25, max_depth=10, random_state=0)
+        self.assert_matches_sklearn(model.fit(self.X_train, self.y_train))
+
+    def test_extra_trees_and_single_tree(self):
+        self.assert_matches_sklearn(ExtraTreesRegressor(n_estimators=10, random_state=0).fit(self.X_train, self.y_train))
+        self.assert_matches_sklearn(DecisionTreeRegressor(max_depth=4).fit(self.X_train, self.y_train))
+
+    def test_dataframe_columns_are_reordered_by_name(self):
+        import pandas as pd
+        columns = ['Notifications', 'Times Opened', 'DayOfWeek', 'Month', 'Notifications_x_TimesOpened']
+        frame = pd.DataFrame(self.X_train, columns=columns)
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(frame, self.y_train)
+        engine = compile_forest(model)
+        shuffled = pd.DataFrame(self.X_test, columns=columns)[columns[::-1]]
+        self.assertTrue(np.array_equal(engine.predict(shuffled), model.predict(shuffled[columns])))
+
+    def test_unsupported_models_fall_back(self):
+        from sklearn.linear_model import LinearRegression
+        model = LinearRegression().fit(self.X_train, self.y_train)
+        with self.assertRaises(TypeError):
+            compile_forest(model)
+        self.assertIsNone(try_compile_forest(model))
+
+if __name__ == '__main__':
+    unittest.main()
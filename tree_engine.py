@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows per traversal pass; bounds the (n_trees, n_rows) node matrix for large batches
+DEFAULT_CHUNK_SIZE = 65536
+
+
+class CompiledForest:
+    """Array-backed inference engine for a fitted sklearn tree ensemble
+
+    All trees are flattened into contiguous arrays indexed by a global node id.
+    Leaves point to themselves, so a batch is evaluated for every tree at once
+    by stepping all (tree, row) cursors one level per iteration, `max_depth`
+    times, using flat `take` gathers. Inputs are cast to float32 and leaf
+    values are accumulated tree by tree before dividing by the number of
+    trees, exactly like sklearn, so the output is bit-for-bit identical to
+    `model.predict`.
+    """
+
+    def __init__(self, feature, threshold, children, value, missing_go_to_left, roots, max_depth,
+                 feature_names=None, n_features=None):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node] is the left child and children[2 * node + 1] the right child
+        self.children = children
+        self.value = value
+        self.missing_go_to_left = missing_go_to_left
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.n_features = n_features
+        self.n_trees = len(roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _as_matrix(self, X):
+        if hasattr(X, 'columns') and self.feature_names is not None:
+            X = X[self.feature_names]
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.n_features is not None and X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+        return X
+
+    def apply(self, X):
+        """Return the leaf node id reached in every tree, shape (n_trees, n_rows)"""
+        X = self._as_matrix(X)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        # Cursor i walks tree i // n_rows for row i % n_rows
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+        nodes = np.repeat(self.roots.astype(np.int64), n_rows)
+        check_missing = self.missing_go_to_left is not None and np.isnan(flat_X).any()
+
+        for _ in range(self.max_depth):
+            x = flat_X.take(row_offsets + self.feature.take(nodes))
+            # float32 inputs are compared against float64 thresholds, as in sklearn's tree code
+            go_right = ~(x <= self.threshold.take(nodes))
+            if check_missing:
+                go_right = np.where(np.isnan(x), ~self.missing_go_to_left.take(nodes), go_right)
+            nodes = self.children.take(2 * nodes + go_right)
+        return nodes.reshape(self.n_trees, n_rows)
+
+    def predict(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Average the leaf values over all trees for each row"""
+        X = self._as_matrix(X)
+        n_rows = X.shape[0]
+        if n_rows > chunk_size:
+            return np.concatenate([self.predict(X[start:start + chunk_size], chunk_size)
+                                   for start in range(0, n_rows, chunk_size)])
+
+        leaf_values = self.value.take(self.apply(X))
+        # Accumulate tree by tree in estimator order to reproduce sklearn's summation exactly
+        predictions = np.zeros(n_rows, dtype=np.float64)
+        for tree_values in leaf_values:
+            predictions += tree_values
+        predictions /= self.n_trees
+        return predictions
+
+
+    def save(self, path, **metadata):
+        """Write the compiled arrays as one .npy file each plus a manifest.json, into directory `path`
+
+        The directory is written under a temporary name and renamed into place,
+        so readers never see a partial artifact. Returns False if another
+        process already published `path`.
+        """
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        arrays = {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'children': self.children,
+            'value': self.value,
+            'roots': self.roots,
+        }
+        if self.missing_go_to_left is not None:
+            arrays['missing_go_to_left'] = self.missing_go_to_left
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump({
+                'arrays': sorted(arrays),
+                'max_depth': self.max_depth,
+                'n_features': self.n_features,
+                'feature_names': self.feature_names,
+                'metadata': metadata,
+            }, f, indent=4)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if os.path.isdir(path):
+                return False
+            raise
+        return True
+
+
+def load_compiled_forest(path, mmap=True):
+    """Load a CompiledForest written by CompiledForest.save; returns (engine, metadata)
+
+    With `mmap` the arrays are memory-mapped read-only, so every process that
+    loads the same artifact shares one copy of the tree data in the page cache.
+    """
+    with open(os.path.join(path, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    # np.asarray drops the np.memmap subclass (and its per-operation overhead) but keeps the mapping
+    arrays = {name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None,
+                                       allow_pickle=False))
+              for name in manifest['arrays']}
+    engine = CompiledForest(
+        feature=arrays['feature'],
+        threshold=arrays['threshold'],
+        children=arrays['children'],
+        value=arrays['value'],
+        missing_go_to_left=arrays.get('missing_go_to_left'),
+        roots=np.array(arrays['roots']),
+        max_depth=manifest['max_depth'],
+        feature_names=manifest['feature_names'],
+        n_features=manifest['n_features'],
+    )
+    return engine, manifest.get('metadata', {})
+
+
+def compile_forest(model):
+    """Flatten a fitted single-output tree regressor (or forest of them) into a CompiledForest"""
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        if hasattr(model, 'tree_'):
+            estimators = [model]
+        else:
+            raise TypeError(f"Cannot compile {type(model).__name__}: not a fitted tree ensemble")
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise TypeError("Only single-output regressors can be compiled")
+    if getattr(model, '_estimator_type', 'regressor') != 'regressor':
+        raise TypeError("Only regressors can be compiled")
+
+    features, thresholds, children, values, missing = [], [], [], [], []
+    roots = []
+    max_depth = 0
+    offset = 0
+    has_missing_field = True
+
+    for estimator in estimators:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.int64)
+        is_leaf = tree.children_left == -1
+
+        # Leaves loop back to themselves so extra traversal steps are no-ops
+        left = np.where(is_leaf, node_ids, tree.children_left) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right) + offset
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        children.append(np.column_stack([left, right]).ravel())
+        values.append(tree.value[:, 0, 0])
+
+        node_missing = getattr(tree, 'missing_go_to_left', None)
+        if node_missing is None:
+            has_missing_field = False
+        else:
+            missing.append(np.asarray(node_missing, dtype=bool))
+
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+        offset += tree.node_count
+
+    index_dtype = np.int32 if offset < np.iinfo(np.int32).max else np.int64
+    return CompiledForest(
+        feature=np.ascontiguousarray(np.concatenate(features), dtype=index_dtype),
+        threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+        children=np.ascontiguousarray(np.concatenate(children), dtype=index_dtype),
+        value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        missing_go_to_left=np.concatenate(missing) if has_missing_field else None,
+        roots=np.asarray(roots, dtype=index_dtype),
+        max_depth=max_depth,
+        feature_names=getattr(model, 'feature_names_in_', None),
+        n_features=getattr(model, 'n_features_in_', None),
+    )
+
+
+def try_compile_forest(model):
+    """Compile the model if it is a supported tree ensemble, otherwise return None"""
+    if model is None:
+        return None
+    try:
+        engine = compile_forest(model)
+        logger.info(f"Compiled {engine.n_trees} trees ({engine.n_nodes} nodes, depth {engine.max_depth})")
+        return engine
+    except Exception as e:
+        logger.warning(f"Falling back to model.predict, could not compile model: {str(e)}")
+        return None
+
+
+def make_predict_fn(model):
+    """Return the compiled engine's predict when possible, otherwise model.predict"""
+    engine = try_compile_forest(model)
+    return engine.predict if engine is not None else model.predict